@@ -0,0 +1,198 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Priority lanes, highest priority first
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = [INTERACTIVE, BATCH]
+
+
+class AdmissionRejected(Exception):
+    """Raised when an analysis cannot be admitted; carries a retry-after hint in seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, user, lane):
+        self.user = user
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+
+
+class AdmissionController:
+    """
+    Gate in front of the analysis pipeline.
+    At most `max_concurrent` runs execute at once and at most `per_user_limit` per user;
+    further requests wait in a bounded queue where the interactive lane is always served
+    before the batch lane. Requests are rejected straight away when the queue is full.
+    """
+
+    def __init__(self, max_concurrent=4, max_queued=16, per_user_limit=2, max_wait=300.0):
+        self._cond = threading.Condition()
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.per_user_limit = per_user_limit
+        self.max_wait = max_wait
+
+        self._running = 0
+        self._running_by_user = {}
+        self._lanes = {lane: deque() for lane in LANES}
+
+        # Observed behaviour, used for stats and retry-after hints
+        self._wait_times = deque(maxlen=500)
+        self._run_seconds = 120.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def configure(self, max_concurrent=None, max_queued=None, per_user_limit=None, max_wait=None):
+        """Change limits at runtime; waiting requests are re-evaluated immediately"""
+        with self._cond:
+            if max_concurrent is not None:
+                self.max_concurrent = max(1, int(max_concurrent))
+            if max_queued is not None:
+                self.max_queued = max(0, int(max_queued))
+            if per_user_limit is not None:
+                self.per_user_limit = max(1, int(per_user_limit))
+            if max_wait is not None:
+                self.max_wait = max(0.0, float(max_wait))
+            self._admit_waiters()
+            self._cond.notify_all()
+
+    def config(self):
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queued': self.max_queued,
+            'per_user_limit': self.per_user_limit,
+            'max_wait': self.max_wait
+        }
+
+    def _queued(self):
+        return sum(len(waiters) for waiters in self._lanes.values())
+
+    def _retry_after(self):
+        # Rough time until a slot frees up for the whole current backlog
+        backlog = self._queued() + 1
+        return max(1, int(self._run_seconds * backlog / self.max_concurrent))
+
+    def _user_has_capacity(self, user):
+        return user is None or self._running_by_user.get(user, 0) < self.per_user_limit
+
+    def _next_eligible(self):
+        """The waiter that should run next: highest lane first, FIFO within a lane"""
+        for lane in LANES:
+            for waiter in self._lanes[lane]:
+                if self._user_has_capacity(waiter.user):
+                    return waiter
+        return None
+
+    def _admit_waiters(self):
+        while self._running < self.max_concurrent:
+            waiter = self._next_eligible()
+            if waiter is None:
+                return
+            self._lanes[waiter.lane].remove(waiter)
+            self._start(waiter.user)
+            waiter.admitted = True
+            self._wait_times.append(time.monotonic() - waiter.enqueued_at)
+
+    def _start(self, user):
+        self._running += 1
+        self.admitted += 1
+        if user is not None:
+            self._running_by_user[user] = self._running_by_user.get(user, 0) + 1
+
+    def _finish(self, user, seconds):
+        with self._cond:
+            self._running -= 1
+            if user is not None:
+                remaining = self._running_by_user.get(user, 1) - 1
+                if remaining:
+                    self._running_by_user[user] = remaining
+                else:
+                    self._running_by_user.pop(user, None)
+            self._run_seconds = 0.8 * self._run_seconds + 0.2 * seconds
+            self._admit_waiters()
+            self._cond.notify_all()
+
+    def _reject(self, reason):
+        self.rejected += 1
+        raise AdmissionRejected(reason, self._retry_after())
+
+    def acquire(self, user=None, lane=INTERACTIVE, bounded=True):
+        """
+        Wait for a run slot.
+        Bounded requests are rejected when the queue is full or after waiting `max_wait` seconds;
+        unbounded ones (durable background jobs) wait as long as it takes.
+        """
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown admission lane: {lane}")
+
+        with self._cond:
+            if self._running < self.max_concurrent and self._user_has_capacity(user) \
+                    and self._next_eligible() is None:
+                self._start(user)
+                self._wait_times.append(0.0)
+                return
+
+            if bounded and self._queued() >= self.max_queued:
+                self._reject("Analysis queue is full")
+
+            waiter = _Waiter(user, lane)
+            self._lanes[lane].append(waiter)
+            deadline = waiter.enqueued_at + self.max_wait if bounded else None
+            while not waiter.admitted:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    self._lanes[lane].remove(waiter)
+                    self._reject("Timed out waiting for an analysis slot")
+                self._cond.wait(timeout)
+
+    def release(self, user=None, seconds=None):
+        self._finish(user, seconds if seconds is not None else self._run_seconds)
+
+    @contextmanager
+    def admit(self, user=None, lane=INTERACTIVE, bounded=True):
+        """Context manager holding a run slot for the duration of the block"""
+        self.acquire(user=user, lane=lane, bounded=bounded)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user=user, seconds=time.monotonic() - started)
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._wait_times)
+            return {
+                'running': self._running,
+                'queue_depth': {lane: len(waiters) for lane, waiters in self._lanes.items()},
+                'running_users': len(self._running_by_user),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'wait_seconds': {
+                    'samples': len(waits),
+                    'mean': round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    'p95': round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+                    'max': round(waits[-1], 3) if waits else 0.0
+                },
+                'estimated_run_seconds': round(self._run_seconds, 1),
+                'config': self.config()
+            }
+
+
+def create_admission_controller():
+    """Build the admission controller from environment configuration"""
+    return AdmissionController(
+        max_concurrent=int(os.environ.get('PESTEL_MAX_CONCURRENT_RUNS', 4)),
+        max_queued=int(os.environ.get('PESTEL_MAX_QUEUED_RUNS', 16)),
+        per_user_limit=int(os.environ.get('PESTEL_MAX_RUNS_PER_USER', 2)),
+        max_wait=float(os.environ.get('PESTEL_MAX_QUEUE_WAIT', 300))
+    )
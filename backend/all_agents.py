@@ -1,26 +1,63 @@
 import os
 import json
+import threading
 import concurrent.futures
-from typing import Annotated, Dict, Any, List
+from dataclasses import dataclass
+from typing import Annotated, Dict, Any, List, Optional
 from typing_extensions import TypedDict
 
 # Import from tavily_functions.py
 from tavily_functions import (
-    query_llm, tavily_search, summarize_extracted_content, 
-    report_llm, final_report_llm, make_serializable
+    tavily_search, summarize_extracted_content, get_model_router,
+    invoke_llm, invoke_routed, stream_llm, json_mode, structured_query_llm, cacheable_prompt
 )
+from model_router import QUERY, REPORT, FINAL_REPORT, JSON_STREAMING_PROVIDERS, prompt_tokens
+from metrics import timed_node, record_context_tokens, record_cache
+from usage import record_context_encoding
+from context_encoder import encode_context, encode_form, count_tokens
+from context_selection import select_context
+from content_store import store_items, resolve_items, release_items
+from score import PESTEL_FACTORS
+from report_stream import current_report_listener, publish_report_events, publish_report
+from report_cache import get_report_cache, report_cache_key, fingerprint
+from query_prefetch import start_speculation, take_speculation
+from report_digest import FINAL_REPORT_INPUT, report_digests
+from report_fanout import REPORT_MODE, FINAL_REPORT_MODE, generate_fanout_report, generate_sectioned_final_report
 
 from prompts import report_schema, final_report_schema
 
-# Import OpenAI for final report generation
-from langchain_openai import ChatOpenAI
-
 # LangGraph imports
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
 
-report_llm = report_llm.with_structured_output(report_schema)
-final_report_llm = final_report_llm.with_structured_output(final_report_schema)
+# Output schema of each report kind
+REPORT_SCHEMAS = {REPORT: report_schema, FINAL_REPORT: final_report_schema}
+
+def invoke_report_llm(kind, prompt, node, report_key):
+    """
+    Generate a structured report on the model the router picks (see model_router); returns
+    (report, candidate). When the run has a report listener, the answer is streamed and its
+    fields are published as they complete (see report_stream); a call that fails over
+    republishes its fields from the start. Otherwise it is one blocking call.
+    """
+    schema = REPORT_SCHEMAS[kind]
+    router = get_model_router()
+
+    def generate(candidate):
+        streaming = current_report_listener.get() is not None
+        if streaming and candidate.provider in JSON_STREAMING_PROVIDERS:
+            return stream_llm(
+                router.client(candidate, f"{kind}_json", lambda base: json_mode(base, schema)), prompt, node,
+                candidate.model, on_value=lambda path, value: publish_report_events(report_key, path, value)
+            )
+        llm = router.client(
+            candidate, f"{kind}_structured", lambda base: base.with_structured_output(schema, include_raw=True)
+        )
+        report = invoke_llm(llm, prompt, node, candidate.model)
+        if streaming:
+            publish_report(report_key, report)
+        return report
+
+    return router.run(kind, node, prompt_tokens(prompt), generate)
 
 # Define a merge function for reports
 def merge_reports(existing_reports: Dict[str, Any], new_reports: Dict[str, Any]) -> Dict[str, Any]:
@@ -40,26 +77,37 @@ def merge_completed_reports(existing: List[str], new: List[str]) -> List[str]:
     """Merge completed reports lists, removing duplicates."""
     return list(set(existing + new))
 
-# Define the enhanced state for langraph with isolated message queues for each dimension
+@dataclass(frozen=True)
+class UserForm:
+    """The processed form of a run, parsed once: `raw` is the JSON text used in prompts"""
+    raw: str
+    data: Dict[str, Any]
+
+    @classmethod
+    def from_dict(cls, processed_form_data):
+        return cls(raw=json.dumps(processed_form_data), data=processed_form_data)
+
+# Define the enhanced state for langraph. It stays small: page contents live in the run's
+# content store (see content_store.py) and the state only holds references to them
 class State(TypedDict):
-    # Main message queue for the entry point and final result
-    messages: Annotated[list, add_messages]
-    
-    # Separate message queues for each PESTEL dimension
-    political_messages: Annotated[list, add_messages]
-    economic_messages: Annotated[list, add_messages]
-    social_messages: Annotated[list, add_messages]
-    technological_messages: Annotated[list, add_messages]
-    environmental_messages: Annotated[list, add_messages]
-    legal_messages: Annotated[list, add_messages]
-    
-    # Data from web scraping for each dimension
-    political_data: Annotated[List[Dict[str, Any]], "Political web search results"]
-    economic_data: Annotated[List[Dict[str, Any]], "Economic web search results"]
-    social_data: Annotated[List[Dict[str, Any]], "Social web search results"]
-    technological_data: Annotated[List[Dict[str, Any]], "Technological web search results"]
-    environmental_data: Annotated[List[Dict[str, Any]], "Environmental web search results"]
-    legal_data: Annotated[List[Dict[str, Any]], "Legal web search results"]
+    # The user's form, for every node
+    form: UserForm
+    
+    # Search queries generated for each PESTEL dimension
+    political_queries: Optional[Dict[str, Any]]
+    economic_queries: Optional[Dict[str, Any]]
+    social_queries: Optional[Dict[str, Any]]
+    technological_queries: Optional[Dict[str, Any]]
+    environmental_queries: Optional[Dict[str, Any]]
+    legal_queries: Optional[Dict[str, Any]]
+    
+    # References to the web pages found for each dimension (raw extractions, then summaries)
+    political_data: Annotated[List[Dict[str, Any]], "Political web page references"]
+    economic_data: Annotated[List[Dict[str, Any]], "Economic web page references"]
+    social_data: Annotated[List[Dict[str, Any]], "Social web page references"]
+    technological_data: Annotated[List[Dict[str, Any]], "Technological web page references"]
+    environmental_data: Annotated[List[Dict[str, Any]], "Environmental web page references"]
+    legal_data: Annotated[List[Dict[str, Any]], "Legal web page references"]
     
     # Dictionary to store all reports with merge annotation
     reports: Annotated[Dict[str, Any], merge_reports]
@@ -68,801 +116,389 @@ class State(TypedDict):
     completed_reports: Annotated[List[str], merge_completed_reports]
     
 
-######################## POLITICAL AGENT FUNCTIONS ########################
-
-def political_format_query(state: State):
-    """Generate search queries for political analysis"""
-    # Parse user form to extract the specific political factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
+######################## SHARED DIMENSION FUNCTIONS ########################
+
+# PESTEL dimensions, each with its own branch of four nodes in the graph
+DIMENSIONS = PESTEL_FACTORS
+
+# Report layout requested from the analyst of each dimension
+REPORT_SECTIONS = {
+    "political": [
+        "Executive Summary of Political Landscape",
+        "Key Political Factors Analysis (focusing ONLY on the factors selected by the user)",
+        "Political Risks and Opportunities",
+        "Regional/International Political Dynamics",
+        "Political Scenario Analysis (3-5 potential outcomes)",
+        "Political Action Recommendations",
+    ],
+    "economic": [
+        "Executive Summary of Economic Landscape",
+        "Key Economic Indicators Analysis (focusing ONLY on the factors selected by the user)",
+        "Economic Risks and Opportunities",
+        "Market Dynamics and Economic Trends",
+        "Economic Scenario Analysis (3-5 potential outcomes)",
+        "Economic Action Recommendations",
+    ],
+    "social": [
+        "Executive Summary of Social Landscape",
+        "Key Social Indicators Analysis (focusing ONLY on the factors selected by the user)",
+        "Social Risks and Opportunities",
+        "Consumer Behavior and Social Trends",
+        "Social Scenario Analysis (3-5 potential outcomes)",
+        "Social Strategy Recommendations",
+    ],
+    "technological": [
+        "Executive Summary of Technological Landscape",
+        "Key Technological Developments Analysis (focusing ONLY on the factors selected by the user)",
+        "Technological Risks and Opportunities",
+        "Innovation Trends and Technological Disruption",
+        "Technological Scenario Analysis (3-5 potential outcomes)",
+        "Technological Strategy Recommendations",
+    ],
+    "environmental": [
+        "Executive Summary of Environmental Landscape",
+        "Key Environmental Regulations Analysis (focusing ONLY on the factors selected by the user)",
+        "Environmental Risks and Opportunities",
+        "Sustainability Trends and Green Initiatives",
+        "Environmental Scenario Analysis (3-5 potential outcomes)",
+        "Environmental Strategy Recommendations",
+    ],
+    "legal": [
+        "Executive Summary of Legal Landscape",
+        "Key Legal Frameworks Analysis (focusing ONLY on the factors selected by the user)",
+        "Legal Risks and Compliance Opportunities",
+        "Regulatory Trends and Legal Developments",
+        "Legal Scenario Analysis (3-5 potential outcomes)",
+        "Legal Strategy Recommendations",
+    ],
+}
+
+def parse_user_form(state: State):
+    """Return the raw user form string and its parsed dictionary"""
+    return state['form'].raw, state['form'].data
+
+def get_selected_factors(user_form, dimension):
+    """Factors of a dimension the user marked as important"""
+    factors = user_form.get(f"{dimension}_factors", {})
+    return [factor for factor, is_selected in factors.items() if is_selected == "true"]
+
+def format_factors(selected_factors):
+    return "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
+
+def generate_search_queries(dimension, user_form_str, user_form):
+    """Ask the query LLM for up to 5 tagged search queries covering the selected factors"""
+    selected_factors_text = format_factors(get_selected_factors(user_form, dimension))
+    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
     
-    # Check if political analysis is required
-    political_factors = user_form.get("political_factors", {})
-    selected_factors = [factor for factor, is_selected in political_factors.items() if is_selected == "true"]
+    # Instructions first and identical for every run of the dimension (a cacheable prefix),
+    # the user's selections after them
+    instructions = f"""
+    You are a search query writer specializing in {dimension.upper()} factors for PESTEL analysis.
     
-    if not selected_factors:
-        print("No political factors selected by user, skipping political analysis")
-        # Skip the political flow and mark it as completed
-        current_completed = state.get('completed_reports', [])
-        current_completed.append('political_report')
-        
-        return {
-            'political_data': [],
-            'completed_reports': current_completed,
-            'reports': state.get('reports', {})
-        }
+    Write up to 5 search queries that will help retrieve articles focusing ONLY on the {dimension.upper()} factors 
+    that the user has specifically selected as important (listed in the request).
     
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
+    Each query must be tagged as either "general" (for broad context) or "news" (for recent developments).
     
-    prompt = f"""
-    You are a search query writer specializing in POLITICAL factors for PESTEL analysis.
+    Include both the industry and geographical focus in each query for relevance.
+    Do not include any years in your queries.
+    Focus ONLY on the {dimension} factors the user has selected as important.
+    """
     
-    Write up to 5 search queries that will help retrieve articles focusing ONLY on the following POLITICAL factors 
-    that the user has specifically selected as important:
+    request = f"""
+    Selected {dimension.upper()} factors:
     {selected_factors_text}
     
-    Each query must be tagged as either "general" (for broad context) or "news" (for recent developments).
-    
     User form: {user_form_str}
     
     Additional notes from user:
     {additional_notes}
-    
-    Include both the industry and geographical focus in each query for relevance.
-    Do not include any years in your queries.
-    Focus ONLY on the political factors the user has selected as important.
     """
     
-    search_queries = query_llm.invoke(prompt)
-    
-    print("Political search queries generated!")
-    return {'political_messages': [json.dumps(search_queries)]}
+    prompt = cacheable_prompt(instructions, request)
+    search_queries, _ = invoke_routed(
+        QUERY, prompt, f"{dimension}_format_query", variant="query_structured", wrap=structured_query_llm
+    )
+    return search_queries
 
-def political_search(state: State):
-    """Perform web search for political factors"""
-    queries = json.loads(state['political_messages'][-1].content)
-    results = tavily_search(queries)
-
-    ### TESTING ###
-    # with open("final_state.json",'r') as f :
-    #     file_content = json.loads(f.read())
-    #     results = file_content['political_data']
-
-    print("Political web scraping completed!")
-    return {'political_data': results}
-
-def political_summarize(state: State):
-    """Summarize political search results"""
-    results = state['political_data']
-    summarized_data = summarize_extracted_content(results)
-
-    ### TESTING ###
-    # summarized_data = results
-    
-    print("Political results summarized!")
-    return {'political_data': summarized_data}
-
-def political_report(state: State):
-    """Generate political analysis report"""
-    # Parse user form to extract the specific political factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    political_factors = user_form.get("political_factors", {})
-    selected_factors = [factor for factor, is_selected in political_factors.items() if is_selected == "true"]
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
+def generate_dimension_report(dimension, user_form, data):
+    """Generate the structured report of one dimension from its summarized web data"""
+    selected_factors = get_selected_factors(user_form, dimension)
+    selected_factors_text = format_factors(selected_factors)
     additional_notes = user_form.get("additional_notes", "No additional notes provided.")
+    article = "an" if dimension[0] in "aeiou" else "a"
+    sections = "\n    ".join(f"{i}. {section}" for i, section in enumerate(REPORT_SECTIONS[dimension], 1))
+    form_text = encode_form(user_form)
+    
+    # Keep the pages that cover the selected factors best, within the context budget
+    selected_data, selection_stats = select_context(data, selected_factors)
+    context, context_stats = encode_context(selected_data)
+    print(f"{dimension.title()} context selection: {selection_stats['selected']} of "
+          f"{selection_stats['candidates']} pages ({selection_stats['irrelevant']} match no selected factor)"
+          + (f"; no evidence for {', '.join(selection_stats['uncovered_factors'])}"
+             if selection_stats['uncovered_factors'] else ""))
+    
+    # Compare with the previous layout: the form dict and page list interpolated as Python reprs
+    original_tokens = count_tokens(str(user_form)) + count_tokens(str(data))
+    encoded_tokens = count_tokens(form_text) + context_stats['tokens']
+    record_context_tokens(original_tokens, encoded_tokens)
+    record_context_encoding(f"{dimension}_report", original_tokens, encoded_tokens)
+    print(f"{dimension.title()} report context: {encoded_tokens} tokens instead of {original_tokens} "
+          f"({context_stats['sources']} sources, {context_stats['duplicates']} duplicates merged, "
+          f"{context_stats['dropped']} dropped by the budget)")
+    
+    # Role, format and rules first: they only depend on the dimension, so every run shares
+    # them as a cacheable prefix. The selections, business context and web context follow.
+    instructions = f"""
+    You are {article} {dimension.upper()} analyst specializing in PESTEL framework analysis. Generate a comprehensive 
+    {dimension.title()} Report (minimum 1,500 words) based on the user's industry and provided context.
+    
+    Focus SPECIFICALLY ONLY on the {dimension.upper()} factors selected by the user (listed in the request).
+    
+    FORMAT:
+    {sections}
     
-    prompt = f"""
-    You are a POLITICAL analyst specializing in PESTEL framework analysis. Generate a comprehensive 
-    Political Report (minimum 1,500 words) based on the user's industry and provided context.
+    Provide actionable {dimension} intelligence with detailed examples from the provided context.
+    Only analyze the {dimension} factors that the user has specifically selected as important.
+    """
     
-    Focus SPECIFICALLY ONLY on the following POLITICAL factors selected by the user:
+    request = f"""
+    Selected {dimension.upper()} factors:
     {selected_factors_text}
     
     Additional notes from user:
     {additional_notes}
     
-    FORMAT:
-    1. Executive Summary of Political Landscape
-    2. Key Political Factors Analysis (focusing ONLY on the factors selected by the user)
-    3. Political Risks and Opportunities
-    4. Regional/International Political Dynamics
-    5. Political Scenario Analysis (3-5 potential outcomes)
-    6. Political Action Recommendations
-    
-    User Query: {user_form}
-    Context: {state['political_data']}
+    Business context:
+{form_text}
     
-    Provide actionable political intelligence with detailed examples from the provided context.
-    Only analyze the political factors that the user has specifically selected as important.
+    Context (sources found by the queries listed first):
+{context}
     """
     
-    political_report = report_llm.invoke(prompt)
-    # print(political_report)
-    print("Political Report Generated")
+    # Identical inputs (same form fields, notes and web context) give the same prompt: reuse the report.
+    # The prompt version follows the instructions and the output schema, so editing either invalidates it.
+    # Only reports of the route's primary model are cached, so a failover answer is not reused later.
+    report_cache = get_report_cache()
+    primary_model = get_model_router().primary(REPORT)
+    if report_cache is not None:
+        cache_key = report_cache_key(
+            dimension, selected_factors, user_form.get("industry"), user_form.get("geographical_focus"),
+            # Fan-out prompts draw their own context from all pages, so all of them are fingerprinted
+            form_text, additional_notes, json.dumps(data, sort_keys=True) if REPORT_MODE == "fanout" else context,
+            primary_model.key,
+            prompt_version=fingerprint(REPORT_MODE + instructions + json.dumps(report_schema, sort_keys=True))[:16]
+        )
+        report = report_cache.get(cache_key)
+        record_cache("dimension_report", report is not None)
+        if report is not None:
+            print(f"{dimension.title()} Report served from the report cache")
+            publish_report(f"{dimension}_report", report)
+            return report
+
+    report = None
+    if REPORT_MODE == "fanout" and len(selected_factors) > 1:
+        try:
+            report, candidates = generate_fanout_report(
+                dimension, selected_factors, additional_notes, form_text, data, REPORT_SECTIONS[dimension]
+            )
+        except Exception as e:
+            print(f"{dimension.title()} fan-out report failed ({str(e)}), generating it in a single call")
+    if report is None:
+        prompt = cacheable_prompt(instructions, request)
+        report, candidate = invoke_report_llm(REPORT, prompt, f"{dimension}_report", f"{dimension}_report")
+        candidates = [candidate]
+    if report_cache is not None and all(candidate == primary_model for candidate in candidates):
+        report_cache.put(cache_key, dimension, report)
+    print(f"{dimension.title()} Report Generated")
+    return report
+
+def format_query_node(state: State, dimension):
+    """Generate search queries for a dimension, or mark it completed if no factors were selected"""
+    user_form_str, user_form = parse_user_form(state)
+    
+    if not get_selected_factors(user_form, dimension):
+        print(f"No {dimension} factors selected by user, skipping {dimension} analysis")
+        # Skip the flow and mark it as completed
+        return {
+            f'{dimension}_data': [],
+            'completed_reports': [f'{dimension}_report']
+        }
+    
+    # Template searches run while the query model thinks (speculative mode only)
+    start_speculation(dimension, user_form, get_selected_factors(user_form, dimension))
+    search_queries = generate_search_queries(dimension, user_form_str, user_form)
+    
+    print(f"{dimension.title()} search queries generated!")
+    return {f'{dimension}_queries': search_queries}
+
+def search_node(state: State, dimension):
+    """Perform web search for a dimension's queries; page contents go to the run's content store"""
+    queries = state.get(f'{dimension}_queries')
+    prefetched = take_speculation(dimension, queries)
+    if not queries:
+        return {f'{dimension}_data': []}
+    
+    results = tavily_search(queries, node=f"{dimension}_search", prefetched=prefetched)
+    
+    print(f"{dimension.title()} web scraping completed!")
+    return {f'{dimension}_data': store_items(results)}
+
+def summarize_node(state: State, dimension):
+    """Summarize a dimension's search results, replacing the raw pages with their summaries"""
+    refs = state[f'{dimension}_data']
+    summarized_data = summarize_extracted_content(resolve_items(refs), node=f"{dimension}_summarize")
+    release_items(refs)
     
-    current_reports = state.get('reports', {})
-    political_report = json.dumps(make_serializable(political_report))
-    current_reports['political_report'] = political_report
+    print(f"{dimension.title()} results summarized!")
+    return {f'{dimension}_data': store_items(summarized_data)}
+
+def report_node(state: State, dimension):
+    """Generate a dimension's analysis report and mark it completed for synchronization"""
+    _, user_form = parse_user_form(state)
+    report_key = f'{dimension}_report'
     
-    # Mark this report as completed for synchronization
-    current_completed = state.get('completed_reports', [])
-    current_completed.append('political_report')
+    if not get_selected_factors(user_form, dimension):
+        return {'completed_reports': [report_key]}
     
+    report = generate_dimension_report(dimension, user_form, resolve_items(state[f'{dimension}_data']))
     return {
-        'reports': current_reports,
-        'completed_reports': current_completed
+        'reports': {report_key: report},
+        'completed_reports': [report_key]
     }
 
 
+######################## POLITICAL AGENT FUNCTIONS ########################
+
+def political_format_query(state: State):
+    """Generate search queries for political analysis"""
+    return format_query_node(state, "political")
+
+def political_search(state: State):
+    """Perform web search for political factors"""
+    return search_node(state, "political")
+
+def political_summarize(state: State):
+    """Summarize political search results"""
+    return summarize_node(state, "political")
+
+def political_report(state: State):
+    """Generate political analysis report"""
+    return report_node(state, "political")
+
+
 ######################## ECONOMIC AGENT FUNCTIONS ########################
 
 def economic_format_query(state: State):
     """Generate search queries for economic analysis"""
-    # Parse user form to extract the specific economic factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    # Check if economic analysis is required
-    economic_factors = user_form.get("economic_factors", {})
-    selected_factors = [factor for factor, is_selected in economic_factors.items() if is_selected == "true"]
-    
-    if not selected_factors:
-        print("No economic factors selected by user, skipping economic analysis")
-        # Skip the economic flow and mark it as completed
-        current_completed = state.get('completed_reports', [])
-        current_completed.append('economic_report')
-        
-        return {
-            'economic_data': [],
-            'completed_reports': current_completed,
-            'reports': state.get('reports', {})
-        }
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
-    
-    prompt = f"""
-    You are a search query writer specializing in ECONOMIC factors for PESTEL analysis.
-    
-    Write up to 5 search queries that will help retrieve articles focusing ONLY on the following ECONOMIC factors 
-    that the user has specifically selected as important:
-    {selected_factors_text}
-    
-    Each query must be tagged as either "general" (for broad context) or "news" (for recent developments).
-    
-    User form: {user_form_str}
-    
-    Additional notes from user:
-    {additional_notes}
-    
-    Include both the industry and geographical focus in each query for relevance.
-    Do not include any years in your queries.
-    Focus ONLY on the economic factors the user has selected as important.
-    """
-    
-    search_queries = query_llm.invoke(prompt)
-    
-    print("Economic search queries generated!")
-    return {'economic_messages': [json.dumps(search_queries)]}
+    return format_query_node(state, "economic")
 
 def economic_search(state: State):
     """Perform web search for economic factors"""
-    queries = json.loads(state['economic_messages'][-1].content)
-    results = tavily_search(queries)
-
-    ### TESTING ###
-    # with open("final_state.json",'r') as f :
-    #     file_content = json.loads(f.read())
-    #     results = file_content['economic_data']
-
-    print("Economic web scraping completed!")
-    return {'economic_data': results}
+    return search_node(state, "economic")
 
 def economic_summarize(state: State):
     """Summarize economic search results"""
-    results = state['economic_data']
-    summarized_data = summarize_extracted_content(results)
-
-    ### TESTING ###
-    # summarized_data = results
-
-    print("Economic results summarized!")
-    return {'economic_data': summarized_data}
+    return summarize_node(state, "economic")
 
 def economic_report(state: State):
     """Generate economic analysis report"""
-    # Parse user form to extract the specific economic factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    economic_factors = user_form.get("economic_factors", {})
-    selected_factors = [factor for factor, is_selected in economic_factors.items() if is_selected == "true"]
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
-    
-    prompt = f"""
-    You are an ECONOMIC analyst specializing in PESTEL framework analysis. Generate a comprehensive 
-    Economic Report (minimum 1,500 words) based on the user's industry and provided context.
-    
-    Focus SPECIFICALLY ONLY on the following ECONOMIC factors selected by the user:
-    {selected_factors_text}
-    
-    Additional notes from user:
-    {additional_notes}
-    
-    FORMAT:
-    1. Executive Summary of Economic Landscape
-    2. Key Economic Indicators Analysis (focusing ONLY on the factors selected by the user)
-    3. Economic Risks and Opportunities
-    4. Market Dynamics and Economic Trends
-    5. Economic Scenario Analysis (3-5 potential outcomes)
-    6. Economic Action Recommendations
-    
-    User Query: {user_form}
-    Context: {state['economic_data']}
-    
-    Provide actionable economic intelligence with detailed examples from the provided context.
-    Only analyze the economic factors that the user has specifically selected as important.
-    """
-    
-    economic_report = report_llm.invoke(prompt)
-    # print(economic_report)
-
-    print("Economic Report Generated")
-    
-    current_reports = state.get('reports', {})
-    current_reports['economic_report'] = json.dumps(make_serializable(economic_report))
-    
-    # Mark this report as completed for synchronization
-    current_completed = state.get('completed_reports', [])
-    current_completed.append('economic_report')
-    
-    return {
-        'reports': current_reports,
-        'completed_reports': current_completed
-    }
+    return report_node(state, "economic")
 
 
 ######################## SOCIAL AGENT FUNCTIONS ########################
 
 def social_format_query(state: State):
     """Generate search queries for social analysis"""
-    # Parse user form to extract the specific social factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    # Check if social analysis is required
-    social_factors = user_form.get("social_factors", {})
-    selected_factors = [factor for factor, is_selected in social_factors.items() if is_selected == "true"]
-    
-    if not selected_factors:
-        print("No social factors selected by user, skipping social analysis")
-        # Skip the social flow and mark it as completed
-        current_completed = state.get('completed_reports', [])
-        current_completed.append('social_report')
-        
-        return {
-            'social_data': [],
-            'completed_reports': current_completed,
-            'reports': state.get('reports', {})
-        }
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
-    
-    prompt = f"""
-    You are a search query writer specializing in SOCIAL factors for PESTEL analysis.
-    
-    Write up to 5 search queries that will help retrieve articles focusing ONLY on the following SOCIAL factors 
-    that the user has specifically selected as important:
-    {selected_factors_text}
-    
-    Each query must be tagged as either "general" (for broad context) or "news" (for recent developments).
-    
-    User form: {user_form_str}
-    
-    Additional notes from user:
-    {additional_notes}
-    
-    Include both the industry and geographical focus in each query for relevance.
-    Do not include any years in your queries.
-    Focus ONLY on the social factors the user has selected as important.
-    """
-    
-    search_queries = query_llm.invoke(prompt)
-    
-    print("Social search queries generated!")
-    return {'social_messages': [json.dumps(search_queries)]}
+    return format_query_node(state, "social")
 
 def social_search(state: State):
     """Perform web search for social factors"""
-    queries = json.loads(state['social_messages'][-1].content)
-    results = tavily_search(queries)
-
-    ### TESTING ###
-    # with open("final_state.json",'r') as f :
-    #     file_content = json.loads(f.read())
-    #     results = file_content['social_data']
-    
-    print("Social web scraping completed!")
-    return {'social_data': results}
+    return search_node(state, "social")
 
 def social_summarize(state: State):
     """Summarize social search results"""
-    results = state['social_data']
-    summarized_data = summarize_extracted_content(results)
-
-    ### TESTING ###
-    # summarized_data = results
-
-    print("Social results summarized!")
-    return {'social_data': summarized_data}
+    return summarize_node(state, "social")
 
 def social_report(state: State):
     """Generate social analysis report"""
-    # Parse user form to extract the specific social factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    social_factors = user_form.get("social_factors", {})
-    selected_factors = [factor for factor, is_selected in social_factors.items() if is_selected == "true"]
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
-    
-    prompt = f"""
-    You are a SOCIAL analyst specializing in PESTEL framework analysis. Generate a comprehensive 
-    Social Report (minimum 1,500 words) based on the user's industry and provided context.
-    
-    Focus SPECIFICALLY ONLY on the following SOCIAL factors selected by the user:
-    {selected_factors_text}
-    
-    Additional notes from user:
-    {additional_notes}
-    
-    FORMAT:
-    1. Executive Summary of Social Landscape
-    2. Key Social Indicators Analysis (focusing ONLY on the factors selected by the user)
-    3. Social Risks and Opportunities
-    4. Consumer Behavior and Social Trends
-    5. Social Scenario Analysis (3-5 potential outcomes)
-    6. Social Strategy Recommendations
-    
-    User Query: {user_form}
-    Context: {state['social_data']}
-    
-    Provide actionable social intelligence with detailed examples from the provided context.
-    Only analyze the social factors that the user has specifically selected as important.
-    """
-    
-    social_report = report_llm.invoke(prompt)
-    # print(social_report)
-    print("Social Report Generated")
-    
-    current_reports = state.get('reports', {})
-    current_reports['social_report'] = json.dumps(make_serializable(social_report))
-    
-    # Mark this report as completed for synchronization
-    current_completed = state.get('completed_reports', [])
-    current_completed.append('social_report')
-    
-    return {
-        'reports': current_reports,
-        'completed_reports': current_completed
-    }
+    return report_node(state, "social")
+
 
 ######################## TECHNOLOGICAL AGENT FUNCTIONS ########################
 
 def technological_format_query(state: State):
     """Generate search queries for technological analysis"""
-    # Parse user form to extract the specific technological factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    # Check if technological analysis is required
-    technological_factors = user_form.get("technological_factors", {})
-    selected_factors = [factor for factor, is_selected in technological_factors.items() if is_selected == "true"]
-    
-    if not selected_factors:
-        print("No technological factors selected by user, skipping technological analysis")
-        # Skip the technological flow and mark it as completed
-        current_completed = state.get('completed_reports', [])
-        current_completed.append('technological_report')
-        
-        return {
-            'technological_data': [],
-            'completed_reports': current_completed,
-            'reports': state.get('reports', {})
-        }
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
-    
-    prompt = f"""
-    You are a search query writer specializing in TECHNOLOGICAL factors for PESTEL analysis.
-    
-    Write up to 5 search queries that will help retrieve articles focusing ONLY on the following TECHNOLOGICAL factors 
-    that the user has specifically selected as important:
-    {selected_factors_text}
-    
-    Each query must be tagged as either "general" (for broad context) or "news" (for recent developments).
-    
-    User form: {user_form_str}
-    
-    Additional notes from user:
-    {additional_notes}
-    
-    Include both the industry and geographical focus in each query for relevance.
-    Do not include any years in your queries.
-    Focus ONLY on the technological factors the user has selected as important.
-    """
-    
-    search_queries = query_llm.invoke(prompt)
-    
-    print("Technological search queries generated!")
-    return {'technological_messages': [json.dumps(search_queries)]}
+    return format_query_node(state, "technological")
 
 def technological_search(state: State):
     """Perform web search for technological factors"""
-    queries = json.loads(state['technological_messages'][-1].content)
-    results = tavily_search(queries)
-
-    ### TESTING ###
-    # with open("final_state.json",'r') as f :
-    #     file_content = json.loads(f.read())
-    #     results = file_content['technological_data']
-
-    print("Technological web scraping completed!")
-    return {'technological_data': results}
+    return search_node(state, "technological")
 
 def technological_summarize(state: State):
     """Summarize technological search results"""
-    results = state['technological_data']
-    summarized_data = summarize_extracted_content(results)
-
-    ### TESTING ###
-    # summarized_data = results
-
-    print("Technological results summarized!")
-    return {'technological_data': summarized_data}
+    return summarize_node(state, "technological")
 
 def technological_report(state: State):
     """Generate technological analysis report"""
-    # Parse user form to extract the specific technological factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    technological_factors = user_form.get("technological_factors", {})
-    selected_factors = [factor for factor, is_selected in technological_factors.items() if is_selected == "true"]
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
-    
-    prompt = f"""
-    You are a TECHNOLOGICAL analyst specializing in PESTEL framework analysis. Generate a comprehensive 
-    Technological Report (minimum 1,500 words) based on the user's industry and provided context.
-    
-    Focus SPECIFICALLY ONLY on the following TECHNOLOGICAL factors selected by the user:
-    {selected_factors_text}
-    
-    Additional notes from user:
-    {additional_notes}
-    
-    FORMAT:
-    1. Executive Summary of Technological Landscape
-    2. Key Technological Developments Analysis (focusing ONLY on the factors selected by the user)
-    3. Technological Risks and Opportunities
-    4. Innovation Trends and Technological Disruption
-    5. Technological Scenario Analysis (3-5 potential outcomes)
-    6. Technological Strategy Recommendations
-    
-    User Query: {user_form}
-    Context: {state['technological_data']}
-    
-    Provide actionable technological intelligence with detailed examples from the provided context.
-    Only analyze the technological factors that the user has specifically selected as important.
-    """
-    
-    technological_report = report_llm.invoke(prompt)
-    # print(technological_report)
-    print("Technological Report Generated")
-    
-    current_reports = state.get('reports', {})
-    current_reports['technological_report'] = json.dumps(make_serializable(technological_report))
-    
-    # Mark this report as completed for synchronization
-    current_completed = state.get('completed_reports', [])
-    current_completed.append('technological_report')
-    
-    return {
-        'reports': current_reports,
-        'completed_reports': current_completed
-    }
+    return report_node(state, "technological")
+
 
 ######################## ENVIRONMENTAL AGENT FUNCTIONS ########################
 
 def environmental_format_query(state: State):
     """Generate search queries for environmental analysis"""
-    # Parse user form to extract the specific environmental factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    # Check if environmental analysis is required
-    environmental_factors = user_form.get("environmental_factors", {})
-    selected_factors = [factor for factor, is_selected in environmental_factors.items() if is_selected == "true"]
-    
-    if not selected_factors:
-        print("No environmental factors selected by user, skipping environmental analysis")
-        # Skip the environmental flow and mark it as completed
-        current_completed = state.get('completed_reports', [])
-        current_completed.append('environmental_report')
-        
-        return {
-            'environmental_data': [],
-            'completed_reports': current_completed,
-            'reports': state.get('reports', {})
-        }
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
-    
-    prompt = f"""
-    You are a search query writer specializing in ENVIRONMENTAL factors for PESTEL analysis.
-    
-    Write up to 5 search queries that will help retrieve articles focusing ONLY on the following ENVIRONMENTAL factors 
-    that the user has specifically selected as important:
-    {selected_factors_text}
-    
-    Each query must be tagged as either "general" (for broad context) or "news" (for recent developments).
-    
-    User form: {user_form_str}
-    
-    Additional notes from user:
-    {additional_notes}
-    
-    Include both the industry and geographical focus in each query for relevance.
-    Do not include any years in your queries.
-    Focus ONLY on the environmental factors the user has selected as important.
-    """
-    
-    search_queries = query_llm.invoke(prompt)
-    
-    print("Environmental search queries generated!")
-    return {'environmental_messages': [json.dumps(search_queries)]}
-
+    return format_query_node(state, "environmental")
 
 def environmental_search(state: State):
     """Perform web search for environmental factors"""
-    queries = json.loads(state['environmental_messages'][-1].content)
-    results = tavily_search(queries)
-
-    ### TESTING ###
-    # with open("final_state.json",'r') as f :
-    #     file_content = json.loads(f.read())
-    #     results = file_content['environmental_data']
-
-    print("Environmental web scraping completed!")
-    return {'environmental_data': results}
+    return search_node(state, "environmental")
 
 def environmental_summarize(state: State):
     """Summarize environmental search results"""
-    results = state['environmental_data']
-    summarized_data = summarize_extracted_content(results)
-
-    ### TESTING ###
-    # summarized_data = results
-
-    print("Environmental results summarized!")
-    return {'environmental_data': summarized_data}
+    return summarize_node(state, "environmental")
 
 def environmental_report(state: State):
     """Generate environmental analysis report"""
-    # Parse user form to extract the specific environmental factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    environmental_factors = user_form.get("environmental_factors", {})
-    selected_factors = [factor for factor, is_selected in environmental_factors.items() if is_selected == "true"]
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
-    
-    prompt = f"""
-    You are an ENVIRONMENTAL analyst specializing in PESTEL framework analysis. Generate a comprehensive 
-    Environmental Report (minimum 1,500 words) based on the user's industry and provided context.
-    
-    Focus SPECIFICALLY ONLY on the following ENVIRONMENTAL factors selected by the user:
-    {selected_factors_text}
-    
-    Additional notes from user:
-    {additional_notes}
-    
-    FORMAT:
-    1. Executive Summary of Environmental Landscape
-    2. Key Environmental Regulations Analysis (focusing ONLY on the factors selected by the user)
-    3. Environmental Risks and Opportunities
-    4. Sustainability Trends and Green Initiatives
-    5. Environmental Scenario Analysis (3-5 potential outcomes)
-    6. Environmental Strategy Recommendations
-    
-    User Query: {user_form}
-    Context: {state['environmental_data']}
-    
-    Provide actionable environmental intelligence with detailed examples from the provided context.
-    Only analyze the environmental factors that the user has specifically selected as important.
-    """
-    
-    environmental_report = report_llm.invoke(prompt)
-    # print(environmental_report)
-    print("Environmental Report Generated")
-    
-    current_reports = state.get('reports', {})
-    current_reports['environmental_report'] = json.dumps(make_serializable(environmental_report))
-    
-    # Mark this report as completed for synchronization
-    current_completed = state.get('completed_reports', [])
-    current_completed.append('environmental_report')
-    
-    return {
-        'reports': current_reports,
-        'completed_reports': current_completed
-    }
+    return report_node(state, "environmental")
 
 
 ######################## LEGAL AGENT FUNCTIONS ########################
 
 def legal_format_query(state: State):
     """Generate search queries for legal analysis"""
-    # Parse user form to extract the specific legal factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    # Check if legal analysis is required
-    legal_factors = user_form.get("legal_factors", {})
-    selected_factors = [factor for factor, is_selected in legal_factors.items() if is_selected == "true"]
-    
-    if not selected_factors:
-        print("No legal factors selected by user, skipping legal analysis")
-        # Skip the legal flow and mark it as completed
-        current_completed = state.get('completed_reports', [])
-        current_completed.append('legal_report')
-        
-        return {
-            'legal_data': [],
-            'completed_reports': current_completed,
-            'reports': state.get('reports', {})
-        }
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
-    
-    prompt = f"""
-    You are a search query writer specializing in LEGAL factors for PESTEL analysis.
-    
-    Write up to 5 search queries that will help retrieve articles focusing ONLY on the following LEGAL factors 
-    that the user has specifically selected as important:
-    {selected_factors_text}
-    
-    Each query must be tagged as either "general" (for broad context) or "news" (for recent developments).
-    
-    User form: {user_form_str}
-    
-    Additional notes from user:
-    {additional_notes}
-    
-    Include both the industry and geographical focus in each query for relevance.
-    Do not include any years in your queries.
-    Focus ONLY on the legal factors the user has selected as important.
-    """
-    
-    search_queries = query_llm.invoke(prompt)
-    
-    print("Legal search queries generated!")
-    return {'legal_messages': [json.dumps(search_queries)]}
+    return format_query_node(state, "legal")
 
 def legal_search(state: State):
     """Perform web search for legal factors"""
-    queries = json.loads(state['legal_messages'][-1].content)
-    results = tavily_search(queries)
-
-    ### TESTING ###
-    # with open("final_state.json",'r') as f :
-    #     file_content = json.loads(f.read())
-    #     results = file_content['legal_data']
-
-    print("Legal web scraping completed!")
-    return {'legal_data': results}
+    return search_node(state, "legal")
 
 def legal_summarize(state: State):
     """Summarize legal search results"""
-    results = state['legal_data']
-    summarized_data = summarize_extracted_content(results)
-
-    ### TESTING ###
-    # summarized_data = results
-
-    print("Legal results summarized!")
-    return {'legal_data': summarized_data}
+    return summarize_node(state, "legal")
 
 def legal_report(state: State):
     """Generate legal analysis report"""
-    # Parse user form to extract the specific legal factors selected by the user
-    user_form_str = state['messages'][0].content
-    user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
-    
-    legal_factors = user_form.get("legal_factors", {})
-    selected_factors = [factor for factor, is_selected in legal_factors.items() if is_selected == "true"]
-    
-    # Format the selected factors for the prompt
-    selected_factors_text = "\n".join([f"- {factor.replace('_', ' ').title()}" for factor in selected_factors])
-    additional_notes = user_form.get("additional_notes", "No additional notes provided.")
-    
-    prompt = f"""
-    You are a LEGAL analyst specializing in PESTEL framework analysis. Generate a comprehensive 
-    Legal Report (minimum 1,500 words) based on the user's industry and provided context.
-    
-    Focus SPECIFICALLY ONLY on the following LEGAL factors selected by the user:
-    {selected_factors_text}
-    
-    Additional notes from user:
-    {additional_notes}
-    
-    FORMAT:
-    1. Executive Summary of Legal Landscape
-    2. Key Legal Frameworks Analysis (focusing ONLY on the factors selected by the user)
-    3. Legal Risks and Compliance Opportunities
-    4. Regulatory Trends and Legal Developments
-    5. Legal Scenario Analysis (3-5 potential outcomes)
-    6. Legal Strategy Recommendations
-    
-    User Query: {user_form}
-    Context: {state['legal_data']}
-    
-    Provide actionable legal intelligence with detailed examples from the provided context.
-    Only analyze the legal factors that the user has specifically selected as important.
-    """
-    
-    legal_report = report_llm.invoke(prompt)
-    # print(legal_report)
-    print("Legal Report Generated")
-    
-    current_reports = state.get('reports', {})
-    current_reports['legal_report'] = json.dumps(make_serializable(legal_report))
-    
-    # Mark this report as completed for synchronization
-    current_completed = state.get('completed_reports', [])
-    current_completed.append('legal_report')
-    
-    return {
-        'reports': current_reports,
-        'completed_reports': current_completed
-    }
+    return report_node(state, "legal")
+
 
 ######################## FINAL REPORT GENERATION ########################
 
-def generate_final_report(state: State):
-    """Generate the final comprehensive PESTEL report"""
-    user_form_str = state['messages'][0].content
+def report_prompt_text(reports, dimension):
+    """A dimension's report as embedded in the final report prompt"""
+    report = reports.get(f'{dimension}_report')
+    if report is None:
+        return f"Not available - User did not select any {dimension} factors for analysis"
+    return report if isinstance(report, str) else json.dumps(report)
+
+def build_final_report(user_form_str, reports):
+    """Synthesize the individual dimension reports into the final comprehensive PESTEL report"""
     user_form = json.loads(user_form_str) if isinstance(user_form_str, str) else user_form_str
     additional_notes = user_form.get("additional_notes", "No additional notes provided.")
     
-    prompt = f"""
+    # Static instructions first (shared by every run as a cacheable prefix), then the
+    # user's notes and the reports
+    instructions = """
     You are a strategic business consultant specializing in comprehensive PESTEL analysis. 
     Your task is to synthesize the individual PESTEL reports into one cohesive, 
     strategic final report (minimum 3,000 words).
@@ -872,9 +508,6 @@ def generate_final_report(state: State):
     IMPORTANT: Focus only on the dimensions for which reports are available. Some dimensions 
     might not have reports if the user did not select any factors for those dimensions.
     
-    Additional notes from user:
-    {additional_notes}
-    
     FORMAT YOUR ANALYSIS AS FOLLOWS:
     
     # COMPREHENSIVE PESTEL ANALYSIS
@@ -917,120 +550,101 @@ def generate_final_report(state: State):
     ## Conclusion
     [Final observations on the overall business environment]
     
-    INDIVIDUAL REPORTS:
-    - Political Report: {state['reports'].get('political_report', 'Not available - User did not select any political factors for analysis')}
-    - Economic Report: {state['reports'].get('economic_report', 'Not available - User did not select any economic factors for analysis')}
-    - Social Report: {state['reports'].get('social_report', 'Not available - User did not select any social factors for analysis')}
-    - Technological Report: {state['reports'].get('technological_report', 'Not available - User did not select any technological factors for analysis')}
-    - Environmental Report: {state['reports'].get('environmental_report', 'Not available - User did not select any environmental factors for analysis')}
-    - Legal Report: {state['reports'].get('legal_report', 'Not available - User did not select any legal factors for analysis')}
-    
     Create a seamless, non-repetitive report that efficiently synthesizes insights 
     from all dimensions while maintaining coherence and strategic focus.
     Only include sections for dimensions where the user selected factors for analysis.
     """
     
-    final_report = final_report_llm.invoke(prompt)
+    report_texts = {dimension: report_prompt_text(reports, dimension) for dimension in DIMENSIONS}
+    reports_heading = "INDIVIDUAL REPORTS"
+    if FINAL_REPORT_INPUT == "digest":
+        # Digests of the available reports instead of the reports, within the digest budget
+        digests = report_digests(reports, DIMENSIONS)
+        original_tokens = sum(count_tokens(report_texts[dimension]) for dimension in digests)
+        encoded_tokens = sum(count_tokens(digest) for digest in digests.values())
+        record_context_tokens(original_tokens, encoded_tokens, stage="final_digest")
+        record_context_encoding("generate_final_report", original_tokens, encoded_tokens)
+        print(f"Final report inputs: {encoded_tokens} tokens of digests instead of {original_tokens} "
+              f"({len(digests)} reports)")
+        report_texts.update(digests)
+        reports_heading = "INDIVIDUAL REPORT DIGESTS (executive summary, factors with key indicators, top risks and opportunities)"
+    
+    request = f"""
+    Additional notes from user:
+    {additional_notes}
+    
+    {reports_heading}:
+    - Political Report: {report_texts['political']}
+    - Economic Report: {report_texts['economic']}
+    - Social Report: {report_texts['social']}
+    - Technological Report: {report_texts['technological']}
+    - Environmental Report: {report_texts['environmental']}
+    - Legal Report: {report_texts['legal']}
+    """
+    
+    final_report = None
+    if FINAL_REPORT_MODE == "sectioned":
+        dimension_reports = {
+            dimension: report_texts[dimension]
+            for dimension in DIMENSIONS if reports.get(f'{dimension}_report') is not None
+        }
+        try:
+            final_report, _ = generate_sectioned_final_report(dimension_reports, additional_notes, encode_form(user_form))
+        except Exception as e:
+            print(f"Sectioned final report failed ({str(e)}), generating it in a single call")
+    if final_report is None:
+        prompt = cacheable_prompt(instructions, request)
+        final_report, _ = invoke_report_llm(FINAL_REPORT, prompt, "generate_final_report", "final_report")
     # final_report = "Final Report"
     print("Final Comprehensive PESTEL Report Generated")
-    final_report = json.dumps(make_serializable(final_report))
+    return final_report
+
+def generate_final_report(state: State):
+    """Generate the final comprehensive PESTEL report"""
+    final_report = build_final_report(state['form'].raw, state['reports'])
     # Return a dictionary with the final report
-    return {
-        'reports': {'final_report': final_report},
-        'messages': [final_report]
-    }
+    return {'reports': {'final_report': final_report}}
 
 ######################## GRAPH CONSTRUCTION ########################
 
-def build_pestel_graph():
-    """Build the complete PESTEL analysis workflow graph"""
+# Node functions of each dimension's branch, in execution order
+DIMENSION_NODES = {
+    "political": [political_format_query, political_search, political_summarize, political_report],
+    "economic": [economic_format_query, economic_search, economic_summarize, economic_report],
+    "social": [social_format_query, social_search, social_summarize, social_report],
+    "technological": [technological_format_query, technological_search, technological_summarize, technological_report],
+    "environmental": [environmental_format_query, environmental_search, environmental_summarize, environmental_report],
+    "legal": [legal_format_query, legal_search, legal_summarize, legal_report],
+}
+
+def build_pestel_graph(dimensions=None):
+    """
+    Build the PESTEL analysis workflow graph.
+    By default every dimension gets a branch; passing `dimensions` builds branches only
+    for those, so reports of the others can be supplied in the initial state.
+    """
+    dimensions = DIMENSIONS if dimensions is None else dimensions
     graph_builder = StateGraph(State)
-    
-    # Add nodes for each PESTEL dimension
-    # Political dimension
-    graph_builder.add_node("political_format_query", political_format_query)
-    graph_builder.add_node("political_search", political_search)
-    graph_builder.add_node("political_summarize", political_summarize)
-    graph_builder.add_node("political_report", political_report)
-
-    # Economic dimension
-    graph_builder.add_node("economic_format_query", economic_format_query)
-    graph_builder.add_node("economic_search", economic_search)
-    graph_builder.add_node("economic_summarize", economic_summarize)
-    graph_builder.add_node("economic_report", economic_report)
-
-    # Social dimension
-    graph_builder.add_node("social_format_query", social_format_query)
-    graph_builder.add_node("social_search", social_search)
-    graph_builder.add_node("social_summarize", social_summarize)
-    graph_builder.add_node("social_report", social_report)
-
-    # Technological dimension
-    graph_builder.add_node("technological_format_query", technological_format_query)
-    graph_builder.add_node("technological_search", technological_search)
-    graph_builder.add_node("technological_summarize", technological_summarize)
-    graph_builder.add_node("technological_report", technological_report)
-
-    # Environmental dimension
-    graph_builder.add_node("environmental_format_query", environmental_format_query)
-    graph_builder.add_node("environmental_search", environmental_search)
-    graph_builder.add_node("environmental_summarize", environmental_summarize)
-    graph_builder.add_node("environmental_report", environmental_report)
-
-    # Legal dimension
-    graph_builder.add_node("legal_format_query", legal_format_query)
-    graph_builder.add_node("legal_search", legal_search)
-    graph_builder.add_node("legal_summarize", legal_summarize)
-    graph_builder.add_node("legal_report", legal_report)
 
     # Final report generation
-    graph_builder.add_node("generate_final_report", generate_final_report)
-
-    # Add edges from START to each dimension's query formatter
-    graph_builder.add_edge(START, "political_format_query")
-    graph_builder.add_edge(START, "economic_format_query")
-    graph_builder.add_edge(START, "social_format_query")
-    graph_builder.add_edge(START, "technological_format_query")
-    graph_builder.add_edge(START, "environmental_format_query")
-    graph_builder.add_edge(START, "legal_format_query")
-
-    # Add edges for political flow with isolated message queue
-    graph_builder.add_edge("political_format_query", "political_search")
-    graph_builder.add_edge("political_search", "political_summarize")
-    graph_builder.add_edge("political_summarize", "political_report")
-
-    # Add edges for economic flow with isolated message queue
-    graph_builder.add_edge("economic_format_query", "economic_search")
-    graph_builder.add_edge("economic_search", "economic_summarize")
-    graph_builder.add_edge("economic_summarize", "economic_report")
-
-    # Add edges for social flow with isolated message queue
-    graph_builder.add_edge("social_format_query", "social_search")
-    graph_builder.add_edge("social_search", "social_summarize")
-    graph_builder.add_edge("social_summarize", "social_report")
-
-    # Add edges for technological flow with isolated message queue
-    graph_builder.add_edge("technological_format_query", "technological_search")
-    graph_builder.add_edge("technological_search", "technological_summarize")
-    graph_builder.add_edge("technological_summarize", "technological_report")
-
-    # Add edges for environmental flow with isolated message queue
-    graph_builder.add_edge("environmental_format_query", "environmental_search")
-    graph_builder.add_edge("environmental_search", "environmental_summarize")
-    graph_builder.add_edge("environmental_summarize", "environmental_report")
-
-    # Add edges for legal flow with isolated message queue
-    graph_builder.add_edge("legal_format_query", "legal_search")
-    graph_builder.add_edge("legal_search", "legal_summarize")
-    graph_builder.add_edge("legal_summarize", "legal_report")
-
-    # Add synchronization pattern using report completion checks
-    graph_builder.add_edge("political_report", "generate_final_report")
-    graph_builder.add_edge("economic_report", "generate_final_report")
-    graph_builder.add_edge("social_report", "generate_final_report")
-    graph_builder.add_edge("technological_report", "generate_final_report")
-    graph_builder.add_edge("environmental_report", "generate_final_report")
-    graph_builder.add_edge("legal_report", "generate_final_report")
+    graph_builder.add_node("generate_final_report", timed_node("generate_final_report", generate_final_report))
+
+    if not dimensions:
+        graph_builder.add_edge(START, "generate_final_report")
+
+    for dimension in dimensions:
+        # Add the nodes of the dimension, chained with its isolated message queue
+        node_names = []
+        for node_fn in DIMENSION_NODES[dimension]:
+            graph_builder.add_node(node_fn.__name__, timed_node(node_fn.__name__, node_fn))
+            node_names.append(node_fn.__name__)
+
+        graph_builder.add_edge(START, node_names[0])
+        for source, target in zip(node_names, node_names[1:]):
+            graph_builder.add_edge(source, target)
+
+        # Synchronization: the final report waits for every report node
+        graph_builder.add_edge(node_names[-1], "generate_final_report")
 
     # Add edge from final report to END
     graph_builder.add_edge("generate_final_report", END)
@@ -1039,3 +653,16 @@ def build_pestel_graph():
     
     return graph
 
+
+# Compiled graphs hold no per-run state, so one graph per set of dimensions is shared by all runs
+_compiled_graphs = {}
+_compiled_graphs_lock = threading.Lock()
+
+def get_pestel_graph(dimensions=None):
+    """Return the compiled workflow for `dimensions` (see build_pestel_graph), compiling it once"""
+    dimensions = DIMENSIONS if dimensions is None else dimensions
+    key = tuple(dimension for dimension in DIMENSIONS if dimension in dimensions)
+    with _compiled_graphs_lock:
+        if key not in _compiled_graphs:
+            _compiled_graphs[key] = build_pestel_graph(list(key))
+        return _compiled_graphs[key]
@@ -1,19 +1,99 @@
 # Flask imports
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 
-from all_agents import build_pestel_graph
-from tavily_functions import make_serializable
-from score import calculate_scores_direct  # Import the new scoring function
+import time
+import threading
+
+from pipeline import (
+    preprocess_form, run_analysis_coalesced, run_reanalysis, run_news_refresh,
+    analysis_flight, result_store, admission, warm_up
+)
+from admission import AdmissionRejected, LANES, INTERACTIVE, BATCH
+import metrics
+import json_codec
+from jobs import create_job_pool, SUCCEEDED, FAILED
 
-import json
-import datetime
 import os
 
+class FastJSONProvider(DefaultJSONProvider):
+    """Serialize responses with json_codec (orjson when installed) instead of the stdlib encoder"""
+
+    def dumps(self, obj, **kwargs):
+        return json_codec.dumps_str(obj)
+
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+
 # Flask application setup
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)  # Enable CORS for cross-origin requests
 
+# Background workers for the asynchronous job API
+job_pool = create_job_pool(
+    # Jobs are already durably queued, so they wait for a slot in the batch lane instead of being rejected
+    lambda processed_form_data, on_stage: run_analysis_coalesced(
+        processed_form_data, on_stage=on_stage, lane=BATCH, bounded=False
+    )
+)
+
+def start_background_workers():
+    """Start this process's job workers and workflow warm-up"""
+    job_pool.start()
+
+    # The LLM/search stack is loaded lazily; warm it up in the background so the server
+    # accepts requests immediately and the first analysis does not pay for the imports
+    if os.environ.get('PESTEL_WARMUP', '1') == '1':
+        threading.Thread(target=warm_up, name="pestel-warmup", daemon=True).start()
+
+# Threads do not survive fork: under the preloading server (gunicorn.conf.py)
+# each worker starts them after it is forked
+if os.environ.get('PESTEL_PRELOAD') != '1':
+    start_background_workers()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        metrics.http_request_seconds.observe(
+            time.perf_counter() - started,
+            endpoint=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
+def _admission_rejected(e, what):
+    """429 response for a request the admission controller turned away; `what` names it in the log"""
+    print(f"{what} rejected: {e.reason}")
+    response = jsonify({
+        'success': False,
+        'error': e.reason,
+        'retry_after': e.retry_after
+    })
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+@app.route('/health', methods=['GET'])
+def health():
+    """
+    Liveness probe; answers without loading the analysis workflow
+    """
+    return jsonify({'status': 'ok'})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint, aggregated across all backend processes on this host
+    """
+    return Response(metrics.registry.render(), mimetype=metrics.CONTENT_TYPE)
+
 @app.route('/submit-analysis', methods=['POST'])
 def submit_analysis():
     """
@@ -30,148 +110,27 @@ def submit_analysis():
                 'error': "No form data received"
             }), 400
         
-        # General preprocessing: convert all boolean values in PESTEL factor categories to "true"/"false" strings
-        processed_form_data = form_data.copy()
-        factor_categories = [
-            "political_factors",
-            "economic_factors",
-            "social_factors",
-            "technological_factors",
-            "environmental_factors",
-            "legal_factors"
-        ]
-        for category in factor_categories:
-            if category in processed_form_data and isinstance(processed_form_data[category], dict):
-                for key, value in processed_form_data[category].items():
-                    if isinstance(value, bool):
-                        processed_form_data[category][key] = str(value).lower()
+        processed_form_data = preprocess_form(form_data)
 
         # print("\n\n\n")
         # print(processed_form_data)
-        
-        # Build the PESTEL analysis graph
-        pestel_graph = build_pestel_graph()
-        
-        # Initialize the state with the form data and empty message queues
-        initial_state = {
-            'messages': [json.dumps(processed_form_data)],
-            'political_messages': [],
-            'economic_messages': [],
-            'social_messages': [],
-            'technological_messages': [],
-            'environmental_messages': [],
-            'legal_messages': [],
-            'political_data': [],
-            'economic_data': [],
-            'social_data': [],
-            'technological_data': [],
-            'environmental_data': [],
-            'legal_data': [],
-            'reports': {},
-            'completed_reports': []
-        }
-        
-        # Run the PESTEL analysis workflow
-        print("Starting PESTEL analysis workflow for submitted form data...")
-        result = pestel_graph.invoke(initial_state)
-
-        ### TESTING ###
-        # output_filename = "../test/output_20250516_161305.json"
-        # with open(output_filename, 'r', encoding='utf-8') as f:
-        #     result = json.loads(f.read())
-        
-        # Prepare serializable result
-        serializable_result = make_serializable(result)
 
-        ### TESTING ###
-        # with open("submit_analysis_response.json", 'r', encoding='utf-8') as f:
-        #     file_content = json.loads(f.read())
-        #     response_data = file_content
-        
-        # Save the results to output.json for debugging/record keeping
-        # output_filename = f"../test/output_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        # with open(output_filename, 'w', encoding='utf-8') as f:
-        #     json.dump(serializable_result, f, indent=4)
-        
-        # Parse all reports from JSON strings to Python dictionaries
-        parsed_reports = {}
-        reports = serializable_result.get('reports', {})
-        
-        # Process individual reports
-        for report_key, report_value in reports.items():
-            if report_key != 'final_report' and report_value:
-                try:
-                    # Parse the JSON string into a Python dictionary
-                    if isinstance(report_value, str):
-                        parsed_reports[report_key] = json.loads(report_value)
-                    else:
-                        parsed_reports[report_key] = report_value
-                except json.JSONDecodeError:
-                    print(f"Error parsing {report_key} as JSON")
-                    parsed_reports[report_key] = report_value
-        
-        # Parse the final report separately
-        final_report = reports.get('final_report', '')
-        if final_report and isinstance(final_report, str):
-            try:
-                parsed_final_report = json.loads(final_report)
-            except json.JSONDecodeError:
-                print("Error parsing final_report as JSON")
-                parsed_final_report = final_report
-        else:
-            parsed_final_report = final_report
-        
-        # Calculate PESTEL similarity and impact scores
-        print("Starting PESTEL scoring calculation...")
-        try:
-            pestel_scores = calculate_scores_direct(processed_form_data, parsed_reports)
-            print(f"PESTEL scoring completed successfully. Calculated scores for {len(pestel_scores)} factors.")
-        except Exception as e:
-            print(f"Error calculating PESTEL scores: {str(e)}")
-            pestel_scores = {}
-        
-        # Extract news data from each factor's data arrays
-        news_data = {}
-        factor_data_keys = [
-            'political_data', 'economic_data', 'social_data', 
-            'technological_data', 'environmental_data', 'legal_data'
-        ]
-        
-        for data_key in factor_data_keys:
-            news_key = data_key.replace('_data', '_news')
-            news_data[news_key] = []
-            
-            data_array = serializable_result.get(data_key, [])
-            for item in data_array:
-                if isinstance(item, dict) and 'title' in item and 'url' in item:
-                    news_data[news_key].append({
-                        'title': item['title'],
-                        'url': item['url']
-                    })
-        
+        lane = request.headers.get('X-Priority', request.args.get('priority', INTERACTIVE))
+        if lane not in LANES:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown priority lane: {lane}"
+            }), 400
 
-        # with open("backend_response.json", 'r', encoding='utf-8') as f:
-        #     response_data = json.loads(f.read())
-
-        # Structure the response according to the expected format
-        response_data = {
-            'success': True,
-            'individual_reports': parsed_reports,
-            'report': parsed_final_report,
-            'news': news_data,
-            'pestel_scores': pestel_scores,
-            'timestamp': datetime.datetime.now().isoformat()
-        }
-        
-        ### TESTING ###
-        # with open("backend_response.json", 'w', encoding='utf-8') as f:
-        #     json.dump(response_data, f, indent=4)
+        # Run the PESTEL analysis workflow and scoring, sharing identical in-flight runs
+        response_data = run_analysis_coalesced(processed_form_data, lane=lane)
 
-        print(f"PESTEL analysis complete!")
-        
         # print(response_data)
 
         return jsonify(response_data)
+
+    except AdmissionRejected as e:
+        return _admission_rejected(e, "Analysis")
         
     except Exception as e:
         import traceback
@@ -182,6 +141,348 @@ def submit_analysis():
             'error': str(e)
         }), 500
 
+@app.route('/batch-analysis', methods=['POST'])
+def submit_batch_analysis():
+    """
+    Analyze many forms at once, sharing search, extraction and summarization
+    between forms with the same industry and geography
+    """
+    try:
+        forms = (request.json or {}).get('forms')
+        if not forms or not isinstance(forms, list):
+            return jsonify({
+                'success': False,
+                'error': "Expected a non-empty 'forms' list"
+            }), 400
+
+        max_forms = int(os.environ.get('PESTEL_MAX_BATCH_FORMS', 50))
+        if len(forms) > max_forms:
+            return jsonify({
+                'success': False,
+                'error': f"A batch may contain at most {max_forms} forms"
+            }), 400
+
+        from batch import run_batch
+
+        processed_forms = [preprocess_form(form) for form in forms]
+
+        # Shared retrieval and each form's analysis take their own run slots in the batch lane
+        response_data = run_batch(processed_forms)
+
+        return jsonify(response_data)
+
+    except AdmissionRejected as e:
+        return _admission_rejected(e, "Batch analysis")
+
+    except Exception as e:
+        import traceback
+        print(f"Error processing batch analysis: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Enqueue form data for background PESTEL analysis and return the job id immediately
+    """
+    form_data = request.json
+
+    if not form_data:
+        return jsonify({
+            'success': False,
+            'error': "No form data received"
+        }), 400
+
+    job_id, coalesced = job_pool.submit(preprocess_form(form_data))
+    if coalesced:
+        print(f"Submission attached to identical job {job_id}")
+    else:
+        print(f"Job {job_id} queued")
+
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': job_pool.store.get(job_id)['status'],
+        'coalesced': coalesced
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Return the status and per-stage progress of an analysis job
+    """
+    job = job_pool.store.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f"Job {job_id} not found"
+        }), 404
+
+    return jsonify({'success': True, **job})
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    Return the final analysis response of a finished job
+    """
+    job = job_pool.store.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f"Job {job_id} not found"
+        }), 404
+
+    if job['status'] == FAILED:
+        return jsonify({
+            'success': False,
+            'status': job['status'],
+            'error': job['error']
+        }), 500
+
+    if job['status'] != SUCCEEDED:
+        return jsonify({
+            'success': False,
+            'status': job['status'],
+            'error': "Job has not finished yet"
+        }), 409
+
+    # Sent as stored: the result was serialized once when the job finished
+    return Response(job_pool.store.get_result(job_id, raw=True), mimetype='application/json')
+
+@app.route('/jobs/<job_id>/sections', methods=['GET'])
+def get_job_sections(job_id):
+    """
+    Return the report sections a running job has produced so far. Pass `after` (the number
+    of sections already received) to get only the new ones; once the job has finished,
+    fetch its result instead.
+    """
+    after = request.args.get('after', 0, type=int)
+    sections = job_pool.store.get_sections(job_id, after=max(after, 0))
+    if sections is None:
+        return jsonify({
+            'success': False,
+            'error': f"Job {job_id} not found"
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'status': job_pool.store.get(job_id)['status'],
+        'sections': sections,
+        'next': max(after, 0) + len(sections)
+    })
+
+@app.route('/stats/coalescing', methods=['GET'])
+def coalescing_stats():
+    """
+    Report how many submissions were served by an identical in-flight analysis
+    """
+    return jsonify({
+        'success': True,
+        'analyses': analysis_flight.stats(),
+        'jobs': {
+            'coalesced_submissions': job_pool.coalesced
+        }
+    })
+
+@app.route('/analyses', methods=['GET'])
+def list_analyses():
+    """
+    List stored analyses, newest first, optionally filtered by industry, geography or form hash
+    """
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': "limit and offset must be integers"
+        }), 400
+
+    analyses = result_store.list(
+        industry=request.args.get('industry'),
+        geography=request.args.get('geography'),
+        form_hash=request.args.get('form_hash'),
+        limit=limit,
+        offset=offset
+    )
+    return jsonify({'success': True, 'analyses': analyses})
+
+def _stored_response(analysis_id):
+    record = result_store.get(analysis_id)
+    return record['response'] if record else None
+
+def _analysis_not_found(analysis_id):
+    return jsonify({
+        'success': False,
+        'error': f"Analysis {analysis_id} not found"
+    }), 404
+
+@app.route('/analyses/<analysis_id>', methods=['GET'])
+def get_analysis(analysis_id):
+    """
+    Return a stored analysis response without re-running the pipeline
+    """
+    response_data = _stored_response(analysis_id)
+    if response_data is None:
+        return _analysis_not_found(analysis_id)
+    return jsonify(response_data)
+
+@app.route('/analyses/<analysis_id>/reports/<dimension>', methods=['GET'])
+def get_analysis_report(analysis_id, dimension):
+    """
+    Return one dimension report (e.g. "political") or the "final" report of a stored analysis
+    """
+    response_data = _stored_response(analysis_id)
+    if response_data is None:
+        return _analysis_not_found(analysis_id)
+
+    if dimension == 'final':
+        report = response_data.get('report')
+    else:
+        report = response_data.get('individual_reports', {}).get(f"{dimension}_report")
+
+    if not report:
+        return jsonify({
+            'success': False,
+            'error': f"No {dimension} report in analysis {analysis_id}"
+        }), 404
+
+    return jsonify({'success': True, 'analysis_id': analysis_id, 'dimension': dimension, 'report': report})
+
+@app.route('/analyses/<analysis_id>/reanalyze', methods=['POST'])
+def reanalyze(analysis_id):
+    """
+    Re-run a stored analysis for a modified form, recomputing only the dimensions whose inputs changed
+    """
+    try:
+        form_data = request.json
+        if not form_data:
+            return jsonify({
+                'success': False,
+                'error': "No form data received"
+            }), 400
+
+        processed_form_data = preprocess_form(form_data)
+        with admission.admit(user=processed_form_data.get('email'), lane=INTERACTIVE):
+            response_data = run_reanalysis(analysis_id, processed_form_data)
+        return jsonify(response_data)
+
+    except KeyError:
+        return _analysis_not_found(analysis_id)
+
+    except AdmissionRejected as e:
+        return _admission_rejected(e, "Re-analysis")
+
+    except Exception as e:
+        import traceback
+        print(f"Error processing re-analysis: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/analyses/<analysis_id>/refresh', methods=['POST'])
+def refresh_analysis(analysis_id):
+    """
+    Refresh a stored analysis by re-running only its news queries and regenerating the reports
+    """
+    try:
+        record = result_store.get(analysis_id)
+        if record is None:
+            return _analysis_not_found(analysis_id)
+
+        lane = request.headers.get('X-Priority', request.args.get('priority', BATCH))
+        if lane not in LANES:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown priority lane: {lane}"
+            }), 400
+
+        with admission.admit(user=record['form'].get('email'), lane=lane):
+            response_data = run_news_refresh(analysis_id)
+        return jsonify(response_data)
+
+    except KeyError:
+        return _analysis_not_found(analysis_id)
+
+    except AdmissionRejected as e:
+        return _admission_rejected(e, "Refresh")
+
+    except Exception as e:
+        import traceback
+        print(f"Error refreshing analysis: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/analyses/<analysis_id>/news', methods=['GET'])
+def get_analysis_news(analysis_id):
+    """
+    Return only the news list of a stored analysis
+    """
+    response_data = _stored_response(analysis_id)
+    if response_data is None:
+        return _analysis_not_found(analysis_id)
+    return jsonify({'success': True, 'analysis_id': analysis_id, 'news': response_data.get('news', {})})
+
+@app.route('/admin/admission', methods=['GET'])
+def admission_stats():
+    """
+    Report admission queue depth, wait times and the current limits, plus the number of
+    queued background jobs
+    """
+    return jsonify({
+        'success': True,
+        **admission.stats(),
+        'jobs': {'queued': job_pool.store.queue_depth()}
+    })
+
+@app.route('/admin/admission', methods=['PUT'])
+def configure_admission():
+    """
+    Update admission limits at runtime (max_concurrent, max_queued, per_user_limit, max_wait)
+    """
+    settings = request.json or {}
+    try:
+        admission.configure(
+            max_concurrent=settings.get('max_concurrent'),
+            max_queued=settings.get('max_queued'),
+            per_user_limit=settings.get('per_user_limit'),
+            max_wait=settings.get('max_wait')
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': f"Invalid admission settings: {str(e)}"
+        }), 400
+    return jsonify({'success': True, 'config': admission.config()})
+
+@app.route('/admin/routing', methods=['GET'])
+def routing_stats():
+    """
+    Report the model routes with their latency SLOs, per-model latency and error statistics,
+    degraded models and the most recent routing decisions
+    """
+    from tavily_functions import get_model_router
+
+    return jsonify({'success': True, **get_model_router().stats()})
+
+@app.route('/admin/search-cache', methods=['GET'])
+def search_cache_stats():
+    """Report the size of the search cache, its searches in flight and how lookups were served"""
+    from search_cache import get_search_cache
+
+    search_cache = get_search_cache()
+    if search_cache is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({'success': True, 'enabled': True, **search_cache.stats()})
+
 # Replace the if __name__ == "__main__" block with this simplified version
 if __name__ == "__main__":
     import sys
@@ -190,4 +491,4 @@ if __name__ == "__main__":
     port = int(os.environ.get('PORT', 8080))
     
     # Run the Flask server by default when script is executed
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
\ No newline at end of file
@@ -0,0 +1,220 @@
+import os
+import re
+import json
+
+from all_agents import (
+    DIMENSIONS, get_selected_factors, generate_search_queries,
+    generate_dimension_report, build_final_report
+)
+from tavily_functions import search_query, extract_pages, summarize_extracted_content
+from pipeline import finish_analysis, parallel_map, run_context, admission
+from admission import AdmissionRejected, BATCH
+from usage import UsageLedger, current_ledger
+
+# Tavily extract accepts at most 20 URLs per call
+EXTRACT_BATCH_SIZE = 20
+
+# Forms whose report, final report and scoring stages run at the same time
+BATCH_WORKERS = int(os.environ.get('PESTEL_BATCH_WORKERS', 4))
+
+# Parallel Tavily / query LLM calls during shared retrieval
+RETRIEVAL_WORKERS = int(os.environ.get('PESTEL_BATCH_RETRIEVAL_WORKERS', 8))
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+
+def retrieval_group_key(processed_form_data):
+    """Forms with the same industry and geography share their web research"""
+    return _normalize(processed_form_data.get('industry')), _normalize(processed_form_data.get('geographical_focus'))
+
+
+def query_key(q):
+    return _normalize(q['query']), q['tag']
+
+
+def merged_group_form(forms, dimension):
+    """
+    A representative form for generating one group's queries for a dimension:
+    the first form, with the union of the group's selected factors and all distinct notes.
+    """
+    merged = dict(forms[0])
+    factors = {}
+    for form in forms:
+        for factor, is_selected in form.get(f"{dimension}_factors", {}).items():
+            if is_selected == "true" or factor not in factors:
+                factors[factor] = is_selected
+    merged[f"{dimension}_factors"] = factors
+
+    notes = []
+    for form in forms:
+        note = form.get("additional_notes")
+        if note and note not in notes:
+            notes.append(note)
+    if notes:
+        merged["additional_notes"] = " | ".join(notes)
+    return merged
+
+
+def shared_retrieval(groups):
+    """
+    Run query generation, search, extraction and summarization once for the whole batch.
+    Returns the summarized pages and the search queries per (group key, dimension),
+    and retrieval statistics.
+    """
+    # 1. One query generation per group and dimension
+    query_tasks = [
+        (key, dimension, merged_group_form(forms, dimension))
+        for key, forms in groups.items()
+        for dimension in DIMENSIONS
+        if any(get_selected_factors(form, dimension) for form in forms)
+    ]
+    generated = parallel_map(
+        lambda task: generate_search_queries(task[1], json.dumps(task[2]), task[2]),
+        query_tasks, RETRIEVAL_WORKERS
+    )
+
+    # 2. Deduplicate queries across the whole batch
+    unique_queries = {}
+    queries_by_branch = {}
+    requested_queries = 0
+    for (key, dimension, _), search_queries in zip(query_tasks, generated):
+        branch_queries = []
+        for q in search_queries.get('search_queries', []):
+            requested_queries += 1
+            k = query_key(q)
+            unique_queries.setdefault(k, q)
+            if k not in branch_queries:
+                branch_queries.append(k)
+        queries_by_branch[(key, dimension)] = branch_queries
+
+    # 3. Search each distinct query once
+    query_list = list(unique_queries)
+    search_results = dict(zip(query_list, parallel_map(
+        lambda k: search_query(unique_queries[k], node="batch_search"), query_list, RETRIEVAL_WORKERS
+    )))
+
+    # 4. Extract each distinct URL once
+    pages = {}
+    requested_urls = 0
+    for k in query_list:
+        for item in search_results[k]:
+            requested_urls += 1
+            if item['url'] not in pages:
+                q = unique_queries[k]
+                pages[item['url']] = {'query': q['query'], 'tag': q['tag'], 'url': item['url'], 'title': item['title']}
+    urls = list(pages)
+    chunks = [urls[i:i + EXTRACT_BATCH_SIZE] for i in range(0, len(urls), EXTRACT_BATCH_SIZE)]
+    extracted = {}
+    for chunk_result in parallel_map(lambda chunk: extract_pages(chunk, node="batch_search"), chunks, RETRIEVAL_WORKERS):
+        extracted.update(chunk_result)
+
+    # 5. Summarize each extracted page once
+    to_summarize = [dict(pages[url], content=extracted[url]) for url in urls if url in extracted]
+    summaries = {page['url']: page for page in summarize_extracted_content(to_summarize, node="batch_summarize")}
+    # Near-duplicate pages were summarized through their cluster's representative
+    pages_by_url = dict(summaries)
+    near_duplicates = 0
+    for page in summaries.values():
+        for alternate in page.get('alternate_urls', []):
+            if alternate['url'] not in pages_by_url:
+                pages_by_url[alternate['url']] = page
+                near_duplicates += 1
+
+    # 6. Assemble each branch's data from the shared pages, in query order
+    data_by_branch = {}
+    search_queries_by_branch = {
+        branch: {'search_queries': [unique_queries[k] for k in branch_queries]}
+        for branch, branch_queries in queries_by_branch.items()
+    }
+    for branch, branch_queries in queries_by_branch.items():
+        data, seen = [], set()
+        for k in branch_queries:
+            for item in search_results[k]:
+                page = pages_by_url.get(item['url'])
+                if page is not None and page['url'] not in seen:
+                    seen.add(page['url'])
+                    data.append(dict(page))
+        data_by_branch[branch] = data
+
+    stats = {
+        'groups': len(groups),
+        'query_generations': len(query_tasks),
+        'requested_queries': requested_queries,
+        'unique_queries': len(unique_queries),
+        'requested_urls': requested_urls,
+        'unique_urls': len(urls),
+        'summarized_pages': len(summaries),
+        'near_duplicate_pages': near_duplicates
+    }
+    return data_by_branch, search_queries_by_branch, stats
+
+
+def analyze_form_with_shared_data(processed_form_data, data_by_branch, search_queries_by_branch):
+    """Run only the report, final report and scoring stages of one form, as a run of its own"""
+    with run_context() as ledger:
+        key = retrieval_group_key(processed_form_data)
+        result = {f"{dimension}_data": data_by_branch.get((key, dimension), []) for dimension in DIMENSIONS}
+
+        dimensions = [d for d in DIMENSIONS if get_selected_factors(processed_form_data, d)]
+        reports = dict(zip(
+            [f"{dimension}_report" for dimension in dimensions],
+            parallel_map(
+                lambda d: generate_dimension_report(d, processed_form_data, result[f"{d}_data"]),
+                dimensions, len(DIMENSIONS)
+            )
+        ))
+        reports['final_report'] = build_final_report(json.dumps(processed_form_data), reports)
+        result['reports'] = reports
+
+        # Keep the shared queries with the record so the analysis can be refreshed later
+        snapshot = {
+            'data': {dimension: result[f"{dimension}_data"] for dimension in DIMENSIONS},
+            'queries': {dimension: search_queries_by_branch.get((key, dimension)) for dimension in DIMENSIONS}
+        }
+        return finish_analysis(processed_form_data, result, ledger, snapshot=snapshot)
+
+
+def run_batch(processed_forms):
+    """
+    Analyze many preprocessed forms, sharing retrieval between forms with the same
+    industry and geography. Returns one response per form, in order.
+    """
+    groups = {}
+    for form in processed_forms:
+        groups.setdefault(retrieval_group_key(form), []).append(form)
+    print(f"Starting batch PESTEL analysis of {len(processed_forms)} forms in {len(groups)} retrieval groups...")
+
+    # Shared retrieval holds one run slot; AdmissionRejected rejects the whole batch
+    shared_ledger = UsageLedger()
+    ledger_token = current_ledger.set(shared_ledger)
+    try:
+        with admission.admit(user=processed_forms[0].get('email'), lane=BATCH):
+            data_by_branch, search_queries_by_branch, stats = shared_retrieval(groups)
+    finally:
+        current_ledger.reset(ledger_token)
+    print(f"Batch retrieval done: {stats['unique_queries']}/{stats['requested_queries']} queries and "
+          f"{stats['unique_urls']}/{stats['requested_urls']} URLs after deduplication")
+
+    def analyze(form):
+        # Each form is a full report/final report/scoring run, so it takes its own slot and
+        # counts against the global and per-user limits like any other analysis
+        try:
+            with admission.admit(user=form.get('email'), lane=BATCH):
+                return analyze_form_with_shared_data(form, data_by_branch, search_queries_by_branch)
+        except AdmissionRejected as e:
+            print(f"Batch form rejected: {e.reason}")
+            return {'success': False, 'error': e.reason, 'retry_after': e.retry_after}
+        except Exception as e:
+            print(f"Error analyzing batch form: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+    results = parallel_map(analyze, processed_forms, BATCH_WORKERS)
+
+    return {
+        'success': True,
+        'results': results,
+        'retrieval': stats,
+        'shared_usage': shared_ledger.summary()
+    }
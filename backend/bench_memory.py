@@ -0,0 +1,116 @@
+"""
+Per-worker memory benchmark for the multi-process server (gunicorn.conf.py).
+
+Starts gunicorn with preloading off and then on, waits for /health and for the workers
+to finish warming up, and reports each worker's memory:
+
+    rss  resident pages, shared ones included
+    uss  pages private to the worker (what killing it would free)
+    pss  rss with each shared page divided among the processes sharing it
+
+With preload-and-fork the workers' uss and pss drop because the LLM stack and the
+compiled graph live in pages shared with the master.
+
+    python bench_memory.py --workers 4 --settle 20
+
+Requires psutil (Linux for uss/pss).
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import urllib.request
+
+import psutil
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MB = 1024 * 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_health(port, process, timeout):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"No response from /health within {timeout}s")
+
+
+def memory_mb(process):
+    info = process.memory_full_info()
+    return {
+        'rss': info.rss / MB,
+        'uss': getattr(info, 'uss', 0) / MB,
+        'pss': getattr(info, 'pss', 0) / MB
+    }
+
+
+def measure(preload, workers, settle, timeout=120.0):
+    """Memory of the master and each worker once the server is up and warmed"""
+    port = free_port()
+    env = dict(
+        os.environ, PORT=str(port), PESTEL_WORKERS=str(workers),
+        PESTEL_PRELOAD="1" if preload else "0", PESTEL_WARMUP="1"
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_health(port, process, timeout)
+        # Workers warm up in the background when not preloaded
+        time.sleep(settle)
+        master = psutil.Process(process.pid)
+        return memory_mb(master), [memory_mb(child) for child in master.children()]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def report(label, master, workers):
+    print(f"\n{label}")
+    print(f"{'process':>10} {'rss MB':>9} {'uss MB':>9} {'pss MB':>9}")
+    print(f"{'master':>10} {master['rss']:>9.1f} {master['uss']:>9.1f} {master['pss']:>9.1f}")
+    for i, worker in enumerate(workers):
+        print(f"{f'worker {i}':>10} {worker['rss']:>9.1f} {worker['uss']:>9.1f} {worker['pss']:>9.1f}")
+    if workers:
+        mean = {key: sum(worker[key] for worker in workers) / len(workers) for key in ('rss', 'uss', 'pss')}
+        print(f"{'mean':>10} {mean['rss']:>9.1f} {mean['uss']:>9.1f} {mean['pss']:>9.1f}")
+    total_pss = master['pss'] + sum(worker['pss'] for worker in workers)
+    print(f"Total PSS: {total_pss:.1f} MB")
+    return total_pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-worker memory with and without preload-and-fork")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--settle", type=float, default=20.0, help="Seconds to wait for warm-up after startup")
+    args = parser.parse_args()
+
+    totals = {}
+    for preload in (False, True):
+        label = "Preload-and-fork" if preload else "Each worker loads its own copy"
+        master, workers = measure(preload, args.workers, args.settle)
+        totals[preload] = report(label, master, workers)
+
+    saved = totals[False] - totals[True]
+    print(f"\nPreloading saves {saved:.1f} MB of total PSS "
+          f"({saved / totals[False] * 100 if totals[False] else 0:.0f}%) with {args.workers} workers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Model routing simulation against local stub providers (no API keys needed).
+
+Runs report calls through a ModelRouter whose candidates are StubChatModels, a primary
+and a faster fallback, and changes the primary's behaviour along the way:
+
+    from call --slow-from   the primary answers in --slow-latency seconds (above the SLO)
+    from call --fail-from   every call to the primary fails
+
+Each routing decision and the resulting latency are printed: the switch to the fallback
+once the primary's observed latency exceeds the SLO, the primary being probed again when
+its statistics go stale, the failover when it errors, and its circuit opening.
+
+    python bench_routing.py --calls 16 --slo 0.5
+"""
+import time
+import argparse
+
+from model_router import ModelRouter, REPORT
+from prompts import report_schema
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate latency-aware model routing with stub providers")
+    parser.add_argument("--calls", type=int, default=16)
+    parser.add_argument("--slo", type=float, default=0.5)
+    parser.add_argument("--primary-latency", type=float, default=0.2)
+    parser.add_argument("--fallback-latency", type=float, default=0.05)
+    parser.add_argument("--slow-from", type=int, default=3)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--fail-from", type=int, default=10)
+    parser.add_argument("--stale-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    router = ModelRouter(
+        routes={REPORT: [
+            {"provider": "stub", "model": "primary", "latency": args.primary_latency, "jitter": 0.02},
+            {"provider": "stub", "model": "fallback", "latency": args.fallback_latency, "jitter": 0.01},
+        ]},
+        slos={REPORT: args.slo},
+        failure_threshold=2,
+        cooldown=30.0,
+        stale_after=args.stale_after
+    )
+    primary = router.client(router.primary(REPORT))
+    prompt = [("system", "Write the report."), ("human", "Context " * 2000)]
+
+    def generate(candidate):
+        llm = router.client(candidate, "structured", lambda base: base.with_structured_output(report_schema))
+        return llm.invoke(prompt)
+
+    for call in range(args.calls):
+        if call == args.slow_from:
+            primary.behaviour['latency'] = args.slow_latency
+        if call == args.fail_from:
+            primary.behaviour['error_rate'] = 1.0
+        started = time.perf_counter()
+        report, candidate = router.run(REPORT, f"call_{call}", 4000, generate)
+        print(f"call {call}: served by {candidate.key} in {time.perf_counter() - started:.2f}s "
+              f"({len(report['factors_analysis'])} factor analyses)")
+        time.sleep(0.2)
+
+    for kind, candidates in router.stats()['routes'].items():
+        for candidate in candidates:
+            print(f"{kind} {candidate['model']}: {candidate['calls']} calls, {candidate['errors']} errors, "
+                  f"avg {candidate['avg_seconds']}s, degraded={candidate['degraded']}")
+
+
+if __name__ == "__main__":
+    main()
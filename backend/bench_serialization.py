@@ -0,0 +1,142 @@
+"""
+Serialization benchmark over a stored workflow state (test/output_20250516_161305.json).
+
+Compares the cost of turning a finished state into the HTTP response and the stored
+record with the previous approach and the current one:
+
+    before  each report node dumps its report to a JSON string, the whole state (message
+            queues and page contents included) is walked by make_serializable, every
+            report is parsed back, and the response and the record are encoded with the
+            stdlib encoder (Flask's default sorts keys)
+    after   reports stay dicts and pages are references into the run's content store;
+            the response and the record are encoded once each with json_codec (orjson
+            when installed)
+
+    python bench_serialization.py --iterations 50
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+import json_codec
+from content_store import ContentStore, current_content, store_items
+from pipeline import parse_reports, extract_news, retrieval_snapshot, DIMENSIONS
+
+SAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test", "output_20250516_161305.json"
+)
+
+
+class _Message:
+    """Stand-in for a LangChain message, which has a `dict` method and `model_dump`"""
+
+    def __init__(self, content):
+        self.content = content
+
+    def dict(self):
+        return self.model_dump()
+
+    def model_dump(self):
+        return {'content': self.content, 'type': 'human'}
+
+
+def legacy_make_serializable(obj):
+    # The walk finish_analysis used to run over the whole state
+    if hasattr(obj, "dict"):
+        try:
+            return obj.model_dump()
+        except Exception:
+            return str(obj)
+    elif isinstance(obj, dict):
+        return {k: legacy_make_serializable(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [legacy_make_serializable(item) for item in obj]
+    else:
+        return obj
+
+
+def load_states():
+    """
+    The sample as the workflow used to produce it (message objects, page contents in the
+    state) and as it does now (parsed queries, page references); reports are dicts in both
+    """
+    with open(SAMPLE_PATH, 'r', encoding='utf-8') as f:
+        legacy = json.load(f)
+    for key in ['messages'] + [f'{dimension}_messages' for dimension in DIMENSIONS]:
+        legacy[key] = [_Message(message['content']) for message in legacy.get(key, [])]
+    legacy['reports'] = {
+        key: json.loads(report) if isinstance(report, str) else report
+        for key, report in legacy['reports'].items()
+    }
+
+    state = {'reports': legacy['reports']}
+    for dimension in DIMENSIONS:
+        messages = legacy[f'{dimension}_messages']
+        state[f'{dimension}_queries'] = json.loads(messages[-1].content) if messages else None
+        state[f'{dimension}_data'] = store_items(legacy.get(f'{dimension}_data', []))
+    return legacy, state
+
+
+def build_response(reports, final_report, news):
+    return {'success': True, 'individual_reports': reports, 'report': final_report, 'news': news}
+
+
+def before(state):
+    # Report nodes: native report -> JSON string in the state
+    state = dict(state, reports={key: json.dumps(report) for key, report in state['reports'].items()})
+    serializable = legacy_make_serializable(state)
+    reports, final_report = parse_reports(serializable['reports'])
+    response = build_response(reports, final_report, extract_news(serializable))
+    snapshot = {'data': {d: serializable.get(f'{d}_data', []) for d in DIMENSIONS}}
+    body = json.dumps(response, sort_keys=True)
+    record = json.dumps({'response': response, **snapshot}, ensure_ascii=False).encode('utf-8')
+    return len(body) + len(record)
+
+
+def after(state):
+    reports, final_report = parse_reports(state['reports'])
+    response = build_response(reports, final_report, extract_news(state))
+    snapshot = retrieval_snapshot(state)
+    body = json_codec.dumps(response)
+    record = json_codec.dumps({'response': response, **snapshot})
+    return len(body) + len(record)
+
+
+def timed(fn, state, iterations):
+    fn(state)
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn(state)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure state-to-response serialization cost")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    current_content.set(ContentStore())
+    legacy, state = load_states()
+    print(f"Sample: {os.path.getsize(SAMPLE_PATH) / 1024:.0f} KB state, "
+          f"encoder: {'orjson' if json_codec.orjson is not None else 'json (orjson not installed)'}")
+
+    before_ms = timed(before, legacy, args.iterations)
+    after_ms = timed(after, state, args.iterations)
+    print(f"before: {before_ms:.2f} ms per analysis (median of {args.iterations})")
+    print(f"after:  {after_ms:.2f} ms per analysis ({before_ms / after_ms:.1f}x faster)")
+
+    if json_codec.orjson is not None:
+        orjson, json_codec.orjson = json_codec.orjson, None
+        try:
+            stdlib_ms = timed(after, state, args.iterations)
+        finally:
+            json_codec.orjson = orjson
+        print(f"after, stdlib encoder: {stdlib_ms:.2f} ms per analysis")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Cold-start benchmark for the PESTEL backend.
+
+Default mode starts `python app.py` in a fresh process and measures the time until
+/health answers (time to first request), over several runs:
+
+    python bench_startup.py --runs 5
+
+--importtime runs `python -X importtime -c "import app"` and lists the imports with
+the largest cumulative cost, to find what is still loaded eagerly:
+
+    python bench_startup.py --importtime --top 25
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_request(timeout=60.0, warmup=False):
+    """Seconds from process start until /health returns 200"""
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG="0", PESTEL_WARMUP="1" if warmup else "0")
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"app.py exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"No response from /health within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def import_times(top):
+    """Parse `-X importtime` output into (cumulative microseconds, module), largest first"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=BACKEND_DIR, env=dict(os.environ, PESTEL_WARMUP="0"),
+        capture_output=True, text=True
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"
+        _, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), module.strip()))
+    rows.sort(reverse=True)
+    return rows[:top], completed.returncode
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure PESTEL backend cold start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", action="store_true", help="Enable the background warm-up while measuring")
+    parser.add_argument("--importtime", action="store_true", help="Show the slowest imports of `import app`")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.importtime:
+        rows, returncode = import_times(args.top)
+        if returncode != 0:
+            print(f"`import app` failed with code {returncode}")
+        print(f"{'cumulative ms':>14}  module")
+        for cumulative_us, module in rows:
+            print(f"{cumulative_us / 1000:>14.1f}  {module}")
+        return
+
+    samples = []
+    for i in range(args.runs):
+        seconds = time_to_first_request(warmup=args.warmup)
+        samples.append(seconds)
+        print(f"Run {i + 1}: {seconds * 1000:.0f} ms")
+    print(f"Time to first request over {len(samples)} runs: "
+          f"median {statistics.median(samples) * 1000:.0f} ms, "
+          f"min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Per-run side-store for web page content.
+
+The graph state only carries compact references to pages ({query, tag, url, title,
+hash, tokens}); the page text (raw extractions, then summaries) lives here, keyed by
+content hash, for the duration of one analysis. Nodes resolve references when they
+need the text, and raw extractions are dropped as soon as they are summarized.
+"""
+import hashlib
+import threading
+import contextvars
+
+# Rough characters per token of English web text, for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Store of the analysis running in the current context (None outside a run)
+current_content = contextvars.ContextVar("pestel_content_store", default=None)
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ContentStore:
+    """Thread-safe, reference-counted page contents of one analysis"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contents = {}
+        self._refcounts = {}
+
+    def put(self, item):
+        """Store an item's content; returns its reference (the item without content, plus hash and tokens)"""
+        content = item.get('content') or ""
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+        with self._lock:
+            self._contents[digest] = content
+            self._refcounts[digest] = self._refcounts.get(digest, 0) + 1
+        ref = {key: value for key, value in item.items() if key != 'content'}
+        ref['hash'] = digest
+        ref['tokens'] = estimate_tokens(content)
+        return ref
+
+    def resolve(self, ref):
+        """The full item a reference points to"""
+        item = {key: value for key, value in ref.items() if key not in ('hash', 'tokens')}
+        with self._lock:
+            item['content'] = self._contents[ref['hash']]
+        return item
+
+    def release(self, ref):
+        """Drop a reference; the content is freed once nothing refers to it"""
+        with self._lock:
+            remaining = self._refcounts.get(ref['hash'], 0) - 1
+            if remaining > 0:
+                self._refcounts[ref['hash']] = remaining
+            else:
+                self._refcounts.pop(ref['hash'], None)
+                self._contents.pop(ref['hash'], None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._contents),
+                'characters': sum(len(content) for content in self._contents.values())
+            }
+
+
+def current_store():
+    store = current_content.get()
+    if store is None:
+        raise RuntimeError("No content store is set for this analysis run")
+    return store
+
+
+def store_items(items):
+    """Move a list of full items into the current run's store; returns their references"""
+    store = current_store()
+    return [store.put(item) for item in items]
+
+
+def resolve_items(refs):
+    """Full items of a list of references from the current run's store"""
+    store = current_store()
+    return [store.resolve(ref) for ref in refs]
+
+
+def release_items(refs):
+    store = current_store()
+    for ref in refs:
+        store.release(ref)
@@ -0,0 +1,158 @@
+"""
+Compact rendering of web research and form data for the report prompts.
+
+Summarized pages are rendered as a query list followed by numbered sources:
+
+    Queries:
+    Q1 [general] EV subsidies Europe
+    Q2 [news] EV tax credit changes Europe
+
+    Sources:
+    S1 (Q1, Q2) Page title | https://example.com/page
+    <summary text>
+
+Pages found by several queries (same URL or same summary) appear once, query strings
+appear once, and no dictionary keys or quoting are repeated per page. Sources are added
+in order until the token budget is reached; the source that does not fit is cut at a
+word boundary and the rest are dropped, so the same input always gives the same prompt.
+"""
+import os
+import hashlib
+import threading
+
+from content_store import estimate_tokens, CHARS_PER_TOKEN
+
+# Token budget of the web context in each dimension report prompt
+REPORT_CONTEXT_TOKENS = int(os.environ.get('PESTEL_REPORT_CONTEXT_TOKENS', 10000))
+
+# A source is only cut to fit when at least this many tokens of it would remain
+MIN_TRUNCATED_TOKENS = 100
+
+# Tokenizer of the report models; falls back to a character estimate without tiktoken
+TOKENIZER_ENCODING = "o200k_base"
+
+FORM_SKIPPED_FIELDS = {"email", "additional_notes"}
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _tokenizer():
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception:
+                    # Not installed, or the encoding files cannot be fetched
+                    _encoding = False
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _tokenizer()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def truncate_tokens(text, max_tokens):
+    """Longest word-boundary prefix of `text` within `max_tokens`"""
+    cut = text[:max_tokens * CHARS_PER_TOKEN]
+    while cut and count_tokens(cut) > max_tokens:
+        cut = cut[:int(len(cut) * 0.9)]
+    if len(cut) < len(text):
+        cut = cut.rsplit(None, 1)[0] if " " in cut else cut
+        cut = cut.rstrip() + " ..."
+    return cut
+
+
+def encode_context(items, budget=REPORT_CONTEXT_TOKENS):
+    """
+    Render summarized pages ({query, tag, url, title, content}) within `budget` tokens.
+    Returns the text and statistics: tokens, sources included / truncated / dropped, duplicates.
+    """
+    query_ids = {}
+    sources = []
+    by_key = {}
+    duplicates = 0
+    for item in items:
+        query = item.get('query')
+        if query and query not in query_ids:
+            query_ids[query] = (f"Q{len(query_ids) + 1}", item.get('tag'))
+        content = (item.get('content') or "").strip()
+        content_key = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        url = item.get('url') or ""
+        source = (by_key.get(url) if url else None) or by_key.get(content_key)
+        if source is not None:
+            duplicates += 1
+        else:
+            source = {'title': item.get('title') or "", 'url': url, 'content': content, 'queries': []}
+            sources.append(source)
+            by_key[content_key] = source
+            if url:
+                by_key[url] = source
+        if query and query_ids[query][0] not in source['queries']:
+            source['queries'].append(query_ids[query][0])
+
+    lines = ["Queries:"]
+    for query, (query_id, tag) in query_ids.items():
+        lines.append(f"{query_id} [{tag}] {query}" if tag else f"{query_id} {query}")
+    header = "\n".join(lines) + "\n\nSources:"
+    used = count_tokens(header)
+
+    blocks = []
+    truncated = 0
+    for i, source in enumerate(sources, 1):
+        label = f"S{i}" + (f" ({', '.join(source['queries'])})" if source['queries'] else "")
+        heading = f"{label} {source['title']} | {source['url']}"
+        block = f"{heading}\n{source['content']}"
+        tokens = count_tokens(block) + 1
+        if used + tokens <= budget:
+            blocks.append(block)
+            used += tokens
+            continue
+        remaining = budget - used - count_tokens(heading) - 2
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            block = f"{heading}\n{truncate_tokens(source['content'], remaining)}"
+            blocks.append(block)
+            used += count_tokens(block) + 1
+            truncated = 1
+        break
+
+    text = header + "\n" + "\n\n".join(blocks) if blocks else "No web research available."
+    return text, {
+        'tokens': count_tokens(text),
+        'sources': len(blocks),
+        'truncated': truncated,
+        'dropped': len(sources) - len(blocks),
+        'duplicates': duplicates
+    }
+
+
+def _form_lines(value, prefix):
+    if isinstance(value, dict):
+        lines = []
+        for key, nested in value.items():
+            lines.extend(_form_lines(nested, f"{prefix}.{key}" if prefix else key))
+        return lines
+    if isinstance(value, list):
+        value = "; ".join(str(entry) for entry in value)
+    if value in (None, ""):
+        return []
+    return [f"{prefix}: {value}"]
+
+
+def encode_form(user_form):
+    """
+    The business context of a form as `key: value` lines. Factor selections are left out:
+    report prompts list the selected factors of their dimension separately.
+    """
+    lines = []
+    for key, value in user_form.items():
+        if key in FORM_SKIPPED_FIELDS or key.endswith("_factors"):
+            continue
+        lines.extend(_form_lines(value, key))
+    return "\n".join(lines)
@@ -0,0 +1,149 @@
+"""
+Relevance-ranked selection of the summarized pages that go into a report prompt.
+
+Each page is scored against each factor the user selected with BM25 (computed here over
+the dimension's own pages, no external service). Pages are then packed greedily into the
+context token budget in rounds: every round gives each factor its best remaining page
+that still fits, so every selected factor gets evidence before any factor gets a second
+page. Pages that match none of the factors are left out.
+"""
+import re
+import math
+
+from context_encoder import REPORT_CONTEXT_TOKENS, count_tokens
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Tokens of the source heading and separators the encoder adds to each page
+SOURCE_OVERHEAD_TOKENS = 8
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "factors", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "to", "with"
+}
+
+# Extra terms for factor keys whose names alone rarely appear in page text
+FACTOR_EXPANSIONS = {
+    "r_and_d_activity": "research development innovation",
+    "weather": "climate extreme temperature",
+    "automation": "automated robotics",
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _stem(word):
+    if len(word) > 4:
+        if word.endswith("ies"):
+            return word[:-3] + "y"
+        if word.endswith("xes"):
+            return word[:-2]
+        if word.endswith("s") and not word.endswith("ss"):
+            return word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [_stem(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def factor_terms(factor):
+    """Query terms of a factor key, e.g. "tax_regulations" -> ["tax", "regulation"]"""
+    return tokenize(f"{factor.replace('_', ' ')} {FACTOR_EXPANSIONS.get(factor, '')}")
+
+
+def bm25_scores(documents, queries):
+    """BM25 score of every tokenized document for every tokenized query: scores[doc][query]"""
+    n = len(documents)
+    if n == 0:
+        return []
+    average_length = sum(len(doc) for doc in documents) / n or 1.0
+    frequencies = []
+    document_frequency = {}
+    for doc in documents:
+        counts = {}
+        for term in doc:
+            counts[term] = counts.get(term, 0) + 1
+        frequencies.append(counts)
+        for term in counts:
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    idf = {
+        term: math.log((n - df + 0.5) / (df + 0.5) + 1.0)
+        for term, df in document_frequency.items()
+    }
+    scores = []
+    for doc, counts in zip(documents, frequencies):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / average_length)
+        row = []
+        for query in queries:
+            score = 0.0
+            for term in set(query):
+                tf = counts.get(term, 0)
+                if tf:
+                    score += idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            row.append(score)
+        scores.append(row)
+    return scores
+
+
+def select_context(items, factors, budget=REPORT_CONTEXT_TOKENS):
+    """
+    Choose and order the summarized pages ({query, tag, url, title, content}) for a report
+    prompt. Returns the selected items (all items of a page found by several queries are
+    kept together) and selection statistics.
+    """
+    # One candidate per page; items of the same URL share its score and cost
+    groups = {}
+    for item in items:
+        groups.setdefault(item.get('url') or id(item), []).append(item)
+    pages = list(groups.values())
+    stats = {'candidates': len(pages), 'selected': len(pages), 'irrelevant': 0, 'uncovered_factors': []}
+    if not pages or not factors:
+        return items, stats
+
+    documents = [tokenize(f"{group[0].get('title') or ''} {group[0].get('content') or ''}") for group in pages]
+    scores = bm25_scores(documents, [factor_terms(factor) for factor in factors])
+    if not any(score for row in scores for score in row):
+        # Nothing matches the factor names (e.g. pages in another language): keep the search order
+        return items, stats
+
+    costs = [
+        count_tokens(f"{group[0].get('title') or ''} {group[0].get('url') or ''}\n{group[0].get('content') or ''}")
+        + SOURCE_OVERHEAD_TOKENS
+        for group in pages
+    ]
+    queries = {item.get('query') for item in items if item.get('query')}
+    used = sum(count_tokens(query) + 4 for query in queries) + SOURCE_OVERHEAD_TOKENS
+
+    # Pages relevant to each factor, best first (ties keep the search order)
+    ranked = [
+        sorted((page for page in range(len(pages)) if scores[page][f] > 0), key=lambda page: -scores[page][f])
+        for f in range(len(factors))
+    ]
+
+    selected, chosen = [], set()
+    while True:
+        progress = False
+        for f, candidates in enumerate(ranked):
+            for page in candidates:
+                if page in chosen or used + costs[page] > budget:
+                    continue
+                chosen.add(page)
+                selected.append(page)
+                used += costs[page]
+                progress = True
+                break
+        if not progress:
+            break
+
+    # A factor is covered by any selected page relevant to it, whichever factor's turn packed it
+    covered = [any(scores[page][f] > 0 for page in selected) for f in range(len(factors))]
+    stats.update({
+        'selected': len(selected),
+        'irrelevant': sum(1 for row in scores if not any(row)),
+        'uncovered_factors': [factor for factor, is_covered in zip(factors, covered) if not is_covered]
+    })
+    return [item for page in selected for item in pages[page]], stats
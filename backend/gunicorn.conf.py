@@ -0,0 +1,67 @@
+"""
+Gunicorn configuration for serving the PESTEL backend with several worker processes.
+
+    cd backend && gunicorn -c gunicorn.conf.py app:app
+
+Preload-and-fork: the master imports the application once, loads the LLM/search SDKs,
+compiles the workflow graph and the prompt schemas, then freezes its heap (gc.freeze)
+and forks the workers. Workers share those pages copy-on-write instead of each importing
+and compiling everything again. Freezing moves the preloaded objects out of the
+collector's generations, so collections in a worker never write to them and do not
+turn shared pages into private copies. Threads (job workers, warm-up, metrics flusher)
+are started in each worker after fork. bench_memory.py compares per-worker memory with
+preloading on and off.
+
+Settings:
+    PORT                    listen port (8080)
+    PESTEL_WORKERS          worker processes (4)
+    PESTEL_THREADS          request threads per worker (8)
+    PESTEL_WORKER_TIMEOUT   seconds before a silent worker is restarted (900)
+    PESTEL_PRELOAD          1 to preload in the master (default), 0 to load in each worker
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get('PESTEL_WORKERS', 4))
+worker_class = "gthread"
+threads = int(os.environ.get('PESTEL_THREADS', 8))
+timeout = int(os.environ.get('PESTEL_WORKER_TIMEOUT', 900))
+preload_app = os.environ.get('PESTEL_PRELOAD', '1') == '1'
+
+# Read by app.py: with preloading, threads are started in post_fork rather than at import
+os.environ['PESTEL_PRELOAD'] = '1' if preload_app else '0'
+
+if preload_app:
+    # No collections while the master loads: everything allocated until the fork is
+    # frozen anyway, and collecting in between only leaves holes in the shared pages
+    gc.disable()
+
+
+def on_starting(server):
+    """Runs in the master at startup: a new server starts its metrics from zero"""
+    from metrics import registry
+
+    registry.clear_directory()
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before the workers are forked"""
+    if not preload_app:
+        return
+    from pipeline import warm_up
+    import batch  # loaded lazily by /batch-analysis; preload it to share it too
+
+    warm_up()
+    gc.freeze()
+    # Later allocations of the master are its own; frozen objects are never collected
+    gc.enable()
+    server.log.info(f"Preloaded workflow, {gc.get_freeze_count()} objects frozen for copy-on-write sharing")
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    import app
+
+    app.start_background_workers()
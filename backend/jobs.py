@@ -0,0 +1,320 @@
+import os
+import json
+import uuid
+import sqlite3
+import datetime
+import threading
+import traceback
+from contextlib import closing
+
+import json_codec
+from pipeline import PIPELINE_STAGES, form_hash
+from report_stream import report_listener
+
+# Job lifecycle states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def _now():
+    return datetime.datetime.now().isoformat()
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """
+    Durable local job queue backed by SQLite.
+    Every operation opens its own connection so the store can be shared between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    form TEXT NOT NULL,
+                    form_hash TEXT,
+                    progress TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    owner_pid INTEGER,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            """)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'form_hash' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN form_hash TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_form_hash ON jobs (form_hash, status)")
+            # Report sections streamed by running jobs, in arrival order
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_sections (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    section TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                )
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, processed_form_data):
+        """
+        Store a new queued job and return (job_id, coalesced).
+        A form identical to a queued or running job attaches to that job instead.
+        """
+        key = form_hash(processed_form_data)
+        progress = {'completed_stages': [], 'total_stages': len(PIPELINE_STAGES)}
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE form_hash = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                (key, QUEUED, RUNNING)
+            ).fetchone()
+            if row is not None:
+                conn.execute("COMMIT")
+                return row['id'], True
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, status, form, form_hash, progress, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(processed_form_data), key, json.dumps(progress), _now())
+            )
+            conn.execute("COMMIT")
+            return job_id, False
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def claim_next(self):
+        """Atomically move the oldest queued job to running and return it, or None"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, form FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, owner_pid = ? WHERE id = ?",
+                (RUNNING, _now(), os.getpid(), row['id'])
+            )
+            conn.execute("COMMIT")
+            return row['id'], json.loads(row['form'])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def record_stage(self, job_id, stage):
+        """Append a finished stage to the job's progress"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None:
+                progress = json.loads(row['progress'])
+                if stage not in progress['completed_stages']:
+                    progress['completed_stages'].append(stage)
+                progress['current_stage'] = stage
+                conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def record_section(self, job_id, event):
+        """Append a report section streamed while the job runs (see report_stream)"""
+        section = json_codec.dumps_str(event)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO job_sections (job_id, seq, section) "
+                "SELECT ?, COUNT(*), ? FROM job_sections WHERE job_id = ?",
+                (job_id, section, job_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def get_sections(self, job_id, after=0):
+        """Report sections streamed so far, from position `after`; None for an unknown job"""
+        with closing(self._connect()) as conn:
+            if conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone() is None:
+                return None
+            rows = conn.execute(
+                "SELECT section FROM job_sections WHERE job_id = ? AND seq >= ? ORDER BY seq", (job_id, after)
+            ).fetchall()
+        return [json_codec.loads(row['section']) for row in rows]
+
+    def _clear_sections(self, conn, job_id):
+        conn.execute("DELETE FROM job_sections WHERE job_id = ?", (job_id,))
+
+    def complete(self, job_id, result):
+        # The streamed sections are superseded by the result
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+                (SUCCEEDED, json_codec.dumps_str(result), _now(), job_id)
+            )
+            self._clear_sections(conn, job_id)
+
+    def fail(self, job_id, error):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (FAILED, error, _now(), job_id)
+            )
+            self._clear_sections(conn, job_id)
+
+    def requeue_interrupted(self):
+        """Put jobs left running by a process that no longer exists back on the queue"""
+        progress = json.dumps({'completed_stages': [], 'total_stages': len(PIPELINE_STAGES)})
+        requeued = 0
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT id, owner_pid FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            for row in rows:
+                if row['owner_pid'] is not None and _process_alive(row['owner_pid']):
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = NULL, owner_pid = NULL, progress = ? "
+                    "WHERE id = ? AND status = ?",
+                    (QUEUED, progress, row['id'], RUNNING)
+                )
+                self._clear_sections(conn, row['id'])
+                requeued += 1
+        return requeued
+
+    def get(self, job_id):
+        """Return the job status document (without the result), or None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, status, progress, error, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['progress'] = json.loads(job['progress'])
+        return job
+
+    def get_result(self, job_id, raw=False):
+        """Return the job's result, or None; `raw` returns the stored JSON text to send as-is"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row['result'] is None:
+            return None
+        return row['result'] if raw else json_codec.loads(row['result'])
+
+    def queue_depth(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+
+class JobWorkerPool:
+    """
+    Bounded pool of background threads that run queued analyses.
+    `runner(processed_form_data, on_stage)` must return the response dictionary.
+    Report sections are streamed into the job while it runs (see report_stream).
+    """
+
+    def __init__(self, store, runner, num_workers=2, poll_interval=2.0):
+        self.store = store
+        self.runner = runner
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._coalesced_lock = threading.Lock()
+        self.coalesced = 0
+
+    def start(self):
+        if self._threads:
+            return
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            print(f"Requeued {requeued} interrupted analysis job(s)")
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._work, name=f"pestel-job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"Started {self.num_workers} analysis job worker(s)")
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def submit(self, processed_form_data):
+        """Queue an analysis; returns (job_id, coalesced)"""
+        job_id, coalesced = self.store.enqueue(processed_form_data)
+        if coalesced:
+            # Submissions arrive on concurrent request threads
+            with self._coalesced_lock:
+                self.coalesced += 1
+        else:
+            self._wakeup.set()
+        return job_id, coalesced
+
+    def _work(self):
+        while not self._stopping.is_set():
+            claimed = self.store.claim_next()
+            if claimed is None:
+                # Other processes may enqueue into the same database, so poll as well as wait
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, processed_form_data = claimed
+            print(f"Job {job_id} started")
+            try:
+                with report_listener(lambda event: self.store.record_section(job_id, event)):
+                    result = self.runner(
+                        processed_form_data,
+                        on_stage=lambda stage: self.store.record_stage(job_id, stage)
+                    )
+                self.store.complete(job_id, result)
+                print(f"Job {job_id} completed")
+            except Exception as e:
+                print(f"Job {job_id} failed: {str(e)}")
+                print(traceback.format_exc())
+                self.store.fail(job_id, str(e))
+
+
+def create_job_pool(runner):
+    """Build the job pool from environment configuration"""
+    db_path = os.environ.get('PESTEL_JOB_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs.db'))
+    num_workers = int(os.environ.get('PESTEL_JOB_WORKERS', 2))
+    return JobWorkerPool(JobStore(db_path), runner, num_workers=num_workers)
@@ -0,0 +1,40 @@
+"""
+JSON encoding used at the boundaries of the backend: HTTP responses, the result store
+and the job store. Analyses travel through the pipeline as native dicts and lists and
+are serialized once here. orjson is used when installed (several times faster on the
+large report documents); otherwise the standard library encoder.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def _default(obj):
+    # Pydantic / LangChain objects that slipped into a document
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Serialize to UTF-8 encoded JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps_str(obj):
+    """Serialize to a JSON string"""
+    return dumps(obj).decode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
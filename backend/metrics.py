@@ -0,0 +1,408 @@
+"""
+Minimal Prometheus-format metrics for the PESTEL backend.
+
+Updates are a dictionary write under a lock, so instrumenting the hot path is cheap.
+To support several worker processes, each process periodically writes a snapshot of
+its registry to PESTEL_METRICS_DIR; the process answering /metrics merges its live
+values with the snapshots of the other live processes. When a worker exits, its
+counters and histograms are folded into a persisted aggregate of exited processes, so
+totals never go down while the server runs; its gauges are dropped.
+"""
+import os
+import fcntl
+import atexit
+import json
+import time
+import bisect
+import tempfile
+import functools
+import threading
+
+# Latency buckets in seconds, sized for HTTP calls through multi-minute pipeline runs
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+FLUSH_INTERVAL = 5.0
+
+METRICS_DIR = os.environ.get('PESTEL_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'pestel_metrics'))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.touch()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.touch()
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts plus +Inf, then sum
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+        self.registry.touch()
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self, directory=METRICS_DIR):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.directory = directory
+        self._flusher_pid = None
+        self._dirty = False
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    # Multi-process support
+
+    def touch(self):
+        self._dirty = True
+        # Threads do not survive fork, so each process starts its own flusher on first use
+        if self._flusher_pid != os.getpid():
+            self._start_flusher()
+
+    def _start_flusher(self):
+        with self.lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        # Values recorded since the last periodic flush would otherwise be lost on exit
+        atexit.register(self._flush_at_exit)
+        thread = threading.Thread(target=self._flush_loop, name="pestel-metrics-flush", daemon=True)
+        thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if self._dirty:
+                try:
+                    self.flush()
+                except OSError as e:
+                    print(f"Error writing metrics snapshot: {str(e)}")
+
+    def clear_directory(self):
+        """Remove the snapshots and exited-process aggregate left by a previous server run"""
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if filename.startswith(("metrics_", "exited_processes")):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+    def _flush_at_exit(self):
+        if self._flusher_pid == os.getpid():
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.directory, f"metrics_{pid}.json")
+
+    def snapshot(self):
+        with self.lock:
+            self._dirty = False
+            return {
+                name: [[list(key), value] for key, value in metric.values.items()]
+                for name, metric in self.metrics.items()
+            }
+
+    def flush(self):
+        """Write this process's values for other processes to merge"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _aggregate_path(self):
+        return os.path.join(self.directory, "exited_processes.json")
+
+    def _read_json(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _fold_exited(self, pid, path):
+        """Add an exited process's counters and histograms to the aggregate, then drop its snapshot"""
+        with open(os.path.join(self.directory, "exited_processes.lock"), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            snapshot = self._read_json(path)
+            if snapshot is None:
+                # Already folded by another process
+                return
+            aggregate = {}
+            _merge(aggregate, self._read_json(self._aggregate_path()) or {}, self.metrics)
+            _merge(aggregate, snapshot, self.metrics, gauges=False)
+            tmp_path = f"{self._aggregate_path()}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({name: [[list(key), value] for key, value in entries.items()]
+                           for name, entries in aggregate.items()}, f)
+            os.replace(tmp_path, self._aggregate_path())
+            os.remove(path)
+
+    def _other_snapshots(self):
+        """Snapshots of the other live processes, then the aggregate of exited ones"""
+        if not os.path.isdir(self.directory):
+            return []
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith("metrics_") and filename.endswith(".json")):
+                continue
+            try:
+                pid = int(filename[len("metrics_"):-len(".json")])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            path = os.path.join(self.directory, filename)
+            if not _process_alive(pid):
+                try:
+                    self._fold_exited(pid, path)
+                except OSError as e:
+                    print(f"Error folding metrics of exited process {pid}: {str(e)}")
+                continue
+            snapshot = self._read_json(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        aggregate = self._read_json(self._aggregate_path())
+        if aggregate is not None:
+            snapshots.append(aggregate)
+        return snapshots
+
+    def collect(self):
+        """Merge the live values of this process with the snapshots of the others"""
+        merged = {name: {tuple(key): value for key, value in entries}
+                  for name, entries in self.snapshot().items()}
+        for snapshot in self._other_snapshots():
+            _merge(merged, snapshot, self.metrics)
+        return merged
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        merged = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(merged.get(name, {}).items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(list(metric.buckets) + ["+Inf"], value[0]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels + [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {value[1]}")
+                    lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(merged, snapshot, metrics, gauges=True):
+    """Add a snapshot's values into `merged` ({name: {key: value}}); gauges only when `gauges`"""
+    for name, entries in snapshot.items():
+        metric = metrics.get(name)
+        if metric is None or (metric.kind == "gauge" and not gauges):
+            continue
+        target = merged.setdefault(name, {})
+        for key, value in entries:
+            key = tuple(key)
+            if metric.kind == "histogram":
+                if key not in target:
+                    target[key] = [list(value[0]), value[1]]
+                else:
+                    target[key][0] = [a + b for a, b in zip(target[key][0], value[0])]
+                    target[key][1] += value[1]
+            else:
+                target[key] = target.get(key, 0) + value
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_request_seconds = registry.histogram(
+    "pestel_http_request_duration_seconds", "HTTP request latency", ["endpoint", "method", "status"]
+)
+node_seconds = registry.histogram(
+    "pestel_node_duration_seconds", "Latency of each PESTEL graph node", ["node"]
+)
+tavily_calls = registry.counter(
+    "pestel_tavily_calls_total", "Tavily API calls", ["operation", "status"]
+)
+tavily_seconds = registry.histogram(
+    "pestel_tavily_duration_seconds", "Tavily API call latency", ["operation"]
+)
+llm_seconds = registry.histogram(
+    "pestel_llm_duration_seconds", "LLM call latency", ["model", "node"]
+)
+llm_first_value_seconds = registry.histogram(
+    "pestel_llm_first_value_seconds", "Time until a streamed LLM answer delivered its first complete field",
+    ["model", "node"]
+)
+llm_routes = registry.counter(
+    "pestel_llm_routed_calls_total", "LLM calls by call kind, model chosen by the router and outcome",
+    ["kind", "model", "outcome"]
+)
+llm_tokens = registry.counter(
+    "pestel_llm_tokens_total", "LLM tokens used (prompt, completion, reasoning, cached)", ["model", "type"]
+)
+prompt_cache_tokens = registry.counter(
+    "pestel_llm_prompt_cache_tokens_total",
+    "Prompt tokens per node, served from the provider's prompt cache (hit) or not (miss)", ["node", "cache"]
+)
+cache_requests = registry.counter(
+    "pestel_cache_requests_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"]
+)
+context_tokens = registry.counter(
+    "pestel_report_context_tokens_total",
+    "Report prompt context tokens, before and after compact encoding (stage=dimension_report) or "
+    "digesting the dimension reports for the final report (stage=final_digest)",
+    ["stage", "encoding"]
+)
+search_queries = registry.counter(
+    "pestel_search_queries_total",
+    "Web searches by how they were served: cached result of the same canonical query (cached), "
+    "shared with a running search of it (inflight), or searched (miss)", ["served"]
+)
+deduplicated_pages = registry.counter(
+    "pestel_near_duplicate_pages_total", "Extracted pages left out of summarization as near duplicates", ["node"]
+)
+speculative_queries = registry.counter(
+    "pestel_speculative_queries_total",
+    "Search queries served by a speculative template search (hit) or searched after query generation (miss), "
+    "and speculative searches no generated query used (wasted)", ["outcome"]
+)
+inflight_runs = registry.gauge(
+    "pestel_inflight_runs", "PESTEL analyses currently running"
+)
+
+
+def timed_node(name, fn):
+    """Wrap a graph node so its latency is recorded under `name`"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with node_seconds.time(node=name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def record_cache(cache, hit):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_llm_usage(model, usage, node=None):
+    """Record token counts from a LangChain `usage_metadata` dictionary"""
+    if not usage:
+        return
+    if node is not None:
+        cached = (usage.get('input_token_details') or {}).get('cache_read', 0) or 0
+        prompt_cache_tokens.inc(cached, node=node, cache="hit")
+        prompt_cache_tokens.inc(max((usage.get('input_tokens', 0) or 0) - cached, 0), node=node, cache="miss")
+    llm_tokens.inc(usage.get('input_tokens', 0), model=model, type="prompt")
+    llm_tokens.inc(usage.get('output_tokens', 0), model=model, type="completion")
+    reasoning = (usage.get('output_token_details') or {}).get('reasoning', 0)
+    if reasoning:
+        llm_tokens.inc(reasoning, model=model, type="reasoning")
+    cached = (usage.get('input_token_details') or {}).get('cache_read', 0)
+    if cached:
+        llm_tokens.inc(cached, model=model, type="cached")
+
+
+def record_context_tokens(original_tokens, encoded_tokens, stage="dimension_report"):
+    context_tokens.inc(original_tokens, stage=stage, encoding="original")
+    context_tokens.inc(encoded_tokens, stage=stage, encoding="encoded")
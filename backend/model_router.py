@@ -0,0 +1,422 @@
+"""
+Latency-aware choice of the model behind each LLM call, with failover.
+
+Every call belongs to a kind (query, summarize, report, final_report, score) that has an ordered
+list of candidate models and a latency SLO. For each call the router takes, in order, the
+first candidate that
+  - accepts the prompt size (max_prompt_tokens),
+  - is not degraded (its circuit opens for PESTEL_ROUTER_COOLDOWN seconds after
+    PESTEL_ROUTER_FAILURES consecutive errors), and
+  - is predicted to answer within the SLO. The prediction is the moving average of
+    the candidate's recent latencies for this kind, scaled by the prompt size. A candidate
+    without recent data (none yet, or older than PESTEL_ROUTER_STALE_AFTER seconds) is
+    assumed to meet the SLO, so the primary is tried again once it has been idle.
+When no candidate is predicted to meet the SLO, the fastest healthy one is used. When all
+are degraded, the one whose circuit closes first is probed. A failed call is retried on
+the next choice, excluding the candidates already tried.
+
+Routes and SLOs can be replaced with JSON in PESTEL_MODEL_ROUTES and PESTEL_MODEL_SLOS:
+
+    PESTEL_MODEL_ROUTES='{"report": [{"provider": "openai", "model": "o4-mini",
+                                       "reasoning_effort": "medium", "max_prompt_tokens": 190000},
+                                      {"provider": "stub", "model": "stub-fast", "latency": 0.5}]}'
+    PESTEL_MODEL_SLOS='{"report": 60}'
+
+Candidate keys other than provider, model and max_prompt_tokens are passed to the client.
+The "stub" provider is a local model (StubChatModel) for exercising routing offline.
+"""
+import os
+import copy
+import json
+import time
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from metrics import llm_routes
+from content_store import estimate_tokens
+
+# Call kinds
+QUERY = "query"
+SUMMARIZE = "summarize"
+REPORT = "report"
+FINAL_REPORT = "final_report"
+SCORE = "score"
+
+# Latency SLO of each kind, in seconds
+DEFAULT_SLOS = {QUERY: 30.0, SUMMARIZE: 20.0, REPORT: 180.0, FINAL_REPORT: 300.0, SCORE: 60.0}
+
+_O4_MINI = {"provider": "openai", "model": "o4-mini", "reasoning_effort": "medium", "max_prompt_tokens": 190000}
+_GPT_41_MINI = {"provider": "openai", "model": "gpt-4.1-mini", "temperature": 0.0, "max_prompt_tokens": 1000000}
+_GPT_4O_MINI = {"provider": "openai", "model": "gpt-4o-mini", "temperature": 0.0, "max_prompt_tokens": 120000}
+_GROQ_LLAMA = {"provider": "groq", "model": "llama-3.3-70b-versatile", "temperature": 0.0, "max_prompt_tokens": 120000}
+
+# Candidates of each kind, preferred first
+DEFAULT_ROUTES = {
+    QUERY: [_O4_MINI, _GPT_41_MINI],
+    SUMMARIZE: [_GPT_4O_MINI, _GPT_41_MINI],
+    REPORT: [_O4_MINI, _GPT_41_MINI],
+    FINAL_REPORT: [_O4_MINI, _GPT_41_MINI],
+    SCORE: [_O4_MINI, _GPT_41_MINI],
+}
+
+# Providers whose clients can stream JSON-schema output (see tavily_functions.json_mode)
+JSON_STREAMING_PROVIDERS = {"openai", "stub"}
+
+# Moving-average weight of the newest latency sample
+EWMA_ALPHA = 0.3
+
+
+def prompt_tokens(prompt):
+    """Estimated tokens of a prompt string or message list"""
+    if isinstance(prompt, str):
+        return estimate_tokens(prompt)
+    return sum(estimate_tokens(str(content)) for _, content in prompt)
+
+
+def _require_env(name):
+    value = os.environ.get(name)
+    if not value:
+        raise RuntimeError(f"Environment variable {name} is not set")
+    return value
+
+
+def _openai_chat(model, **options):
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model=model, max_tokens=None, timeout=options.pop("timeout", None), max_retries=2,
+        api_key=_require_env("OPENAI_API_KEY"), **options
+    )
+
+
+def _groq_chat(model, **options):
+    # Optional provider: langchain_groq is only needed when a route uses it
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        model=model, max_tokens=None, timeout=options.pop("timeout", None), max_retries=2,
+        api_key=_require_env("GROQ_API_KEY"), **options
+    )
+
+
+def _stub_chat(model, **options):
+    return StubChatModel(model, **options)
+
+
+PROVIDERS = {"openai": _openai_chat, "groq": _groq_chat, "stub": _stub_chat}
+
+
+@dataclass(frozen=True)
+class ModelCandidate:
+    provider: str
+    model: str
+    max_prompt_tokens: int
+    options: tuple = ()
+
+    @classmethod
+    def from_spec(cls, spec):
+        options = {k: v for k, v in spec.items() if k not in ("provider", "model", "max_prompt_tokens")}
+        return cls(
+            provider=spec["provider"],
+            model=spec["model"],
+            max_prompt_tokens=int(spec.get("max_prompt_tokens", 100000)),
+            options=tuple(sorted(options.items()))
+        )
+
+    @property
+    def key(self):
+        return f"{self.provider}:{self.model}"
+
+
+class _LatencyStats:
+    def __init__(self):
+        self.seconds = None
+        self.prompt_tokens = None
+        self.updated_at = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def observe(self, seconds, prompt_tokens):
+        if self.seconds is None:
+            self.seconds, self.prompt_tokens = seconds, float(max(prompt_tokens, 1))
+        else:
+            self.seconds += EWMA_ALPHA * (seconds - self.seconds)
+            self.prompt_tokens += EWMA_ALPHA * (max(prompt_tokens, 1) - self.prompt_tokens)
+        self.updated_at = time.monotonic()
+
+    def predict(self, prompt_tokens, stale_after):
+        if self.seconds is None or time.monotonic() - self.updated_at > stale_after:
+            return None
+        scale = min(max(prompt_tokens / self.prompt_tokens, 0.5), 2.0)
+        return self.seconds * scale
+
+
+class _Health:
+    def __init__(self):
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+
+class ModelRouter:
+    """Thread-safe router; one per process (see tavily_functions.get_model_router)"""
+
+    def __init__(self, routes=None, slos=None, providers=None, failure_threshold=3, cooldown=60.0,
+                 stale_after=600.0):
+        routes = routes or DEFAULT_ROUTES
+        self.routes = {kind: [ModelCandidate.from_spec(spec) for spec in specs] for kind, specs in routes.items()}
+        self.slos = {**DEFAULT_SLOS, **(slos or {})}
+        self.providers = providers or PROVIDERS
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.stale_after = stale_after
+
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._latency = {}
+        self._health = {}
+        self._decisions = deque(maxlen=200)
+
+    def primary(self, kind):
+        return self.routes[kind][0]
+
+    def client(self, candidate, variant=None, wrap=None):
+        """
+        The candidate's chat model, built once per process. `variant` names a derived client
+        (e.g. one bound to an output schema) that `wrap(base_client)` builds.
+        """
+        key = (candidate.key, candidate.options, variant)
+        client = self._clients.get(key)
+        if client is None:
+            base_key = (candidate.key, candidate.options, None)
+            base = self._clients.get(base_key)
+            if base is None:
+                base = self.providers[candidate.provider](candidate.model, **dict(candidate.options))
+            with self._lock:
+                base = self._clients.setdefault(base_key, base)
+                client = self._clients.setdefault(key, wrap(base) if wrap is not None else base)
+        return client
+
+    def choose(self, kind, prompt_tokens, exclude=()):
+        """Pick a candidate for a call; returns (candidate, predicted seconds, reason) or None"""
+        slo = self.slos[kind]
+        now = time.monotonic()
+        with self._lock:
+            eligible = [
+                candidate for candidate in self.routes[kind]
+                if candidate.key not in exclude and prompt_tokens <= candidate.max_prompt_tokens
+            ]
+            predictions = {
+                candidate.key: self._latency.get((kind, candidate.key), _LatencyStats()).predict(
+                    prompt_tokens, self.stale_after
+                )
+                for candidate in eligible
+            }
+            healthy = [c for c in eligible if self._health.get(c.key, _Health()).open_until <= now]
+
+        for candidate in healthy:
+            predicted = predictions[candidate.key]
+            if predicted is None:
+                return candidate, None, "no recent latency data"
+            if predicted <= slo:
+                return candidate, predicted, f"predicted within the {slo:g}s SLO"
+        if healthy:
+            candidate = min(healthy, key=lambda c: predictions[c.key])
+            return candidate, predictions[candidate.key], f"fastest, none predicted within the {slo:g}s SLO"
+        if eligible:
+            candidate = min(eligible, key=lambda c: self._health.get(c.key, _Health()).open_until)
+            return candidate, predictions[candidate.key], "all candidates degraded, probing"
+        return None
+
+    def record(self, kind, candidate, seconds, prompt_tokens, error=None):
+        """Record the outcome of a routed call"""
+        with self._lock:
+            stats = self._latency.setdefault((kind, candidate.key), _LatencyStats())
+            health = self._health.setdefault(candidate.key, _Health())
+            stats.calls += 1
+            if error is None:
+                stats.observe(seconds, prompt_tokens)
+                health.consecutive_failures = 0
+                health.open_until = 0.0
+            else:
+                stats.errors += 1
+                health.consecutive_failures += 1
+                if health.consecutive_failures >= self.failure_threshold:
+                    health.open_until = time.monotonic() + self.cooldown
+        llm_routes.inc(kind=kind, model=candidate.key, outcome="ok" if error is None else "error")
+
+    def run(self, kind, node, prompt_tokens, call):
+        """
+        Run `call(candidate)` on the chosen candidate, failing over to the next choice when it
+        raises. Returns (result, candidate); re-raises the last error when every candidate failed.
+        """
+        tried = set()
+        last_error = None
+        while True:
+            decision = self.choose(kind, prompt_tokens, exclude=tried)
+            if decision is None:
+                if last_error is None:
+                    raise RuntimeError(f"No model configured for {kind} prompts of {prompt_tokens} tokens")
+                raise last_error
+            candidate, predicted, reason = decision
+            tried.add(candidate.key)
+            predicted_text = f"{predicted:.1f}s" if predicted is not None else "unknown"
+            print(f"Routing {node} ({prompt_tokens} prompt tokens) to {candidate.key}: "
+                  f"{reason}, predicted {predicted_text}")
+
+            started = time.perf_counter()
+            try:
+                result = call(candidate)
+            except Exception as e:
+                seconds = time.perf_counter() - started
+                self.record(kind, candidate, seconds, prompt_tokens, error=e)
+                self._log(kind, node, candidate, reason, predicted, seconds, prompt_tokens, str(e))
+                print(f"{node} failed on {candidate.key} after {seconds:.1f}s: {str(e)}; failing over")
+                last_error = e
+                continue
+            seconds = time.perf_counter() - started
+            self.record(kind, candidate, seconds, prompt_tokens)
+            self._log(kind, node, candidate, reason, predicted, seconds, prompt_tokens, None)
+            return result, candidate
+
+    def _log(self, kind, node, candidate, reason, predicted, seconds, prompt_tokens, error):
+        with self._lock:
+            self._decisions.append({
+                'at': time.time(),
+                'kind': kind,
+                'node': node,
+                'model': candidate.key,
+                'reason': reason,
+                'prompt_tokens': prompt_tokens,
+                'predicted_seconds': round(predicted, 2) if predicted is not None else None,
+                'seconds': round(seconds, 2),
+                'error': error
+            })
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'slos': dict(self.slos),
+                'routes': {
+                    kind: [
+                        {
+                            'model': candidate.key,
+                            'degraded': self._health.get(candidate.key, _Health()).open_until > now,
+                            **self._latency_summary(kind, candidate)
+                        }
+                        for candidate in candidates
+                    ]
+                    for kind, candidates in self.routes.items()
+                },
+                'recent_decisions': list(self._decisions)[-50:]
+            }
+
+    def _latency_summary(self, kind, candidate):
+        stats = self._latency.get((kind, candidate.key))
+        if stats is None:
+            return {'calls': 0, 'errors': 0, 'avg_seconds': None}
+        return {
+            'calls': stats.calls,
+            'errors': stats.errors,
+            'avg_seconds': round(stats.seconds, 2) if stats.seconds is not None else None
+        }
+
+
+def create_model_router():
+    """Build the router from environment configuration"""
+    routes = json.loads(os.environ['PESTEL_MODEL_ROUTES']) if os.environ.get('PESTEL_MODEL_ROUTES') else None
+    if routes is not None:
+        routes = {**DEFAULT_ROUTES, **routes}
+    elif os.environ.get('GROQ_API_KEY'):
+        # A second provider is configured: fail over to it after the OpenAI models
+        routes = {kind: specs + [_GROQ_LLAMA] for kind, specs in DEFAULT_ROUTES.items()}
+    slos = json.loads(os.environ['PESTEL_MODEL_SLOS']) if os.environ.get('PESTEL_MODEL_SLOS') else None
+    return ModelRouter(
+        routes=routes,
+        slos=slos,
+        failure_threshold=int(os.environ.get('PESTEL_ROUTER_FAILURES', 3)),
+        cooldown=float(os.environ.get('PESTEL_ROUTER_COOLDOWN', 60)),
+        stale_after=float(os.environ.get('PESTEL_ROUTER_STALE_AFTER', 600))
+    )
+
+
+######################## STUB PROVIDER ########################
+
+class StubProviderError(Exception):
+    pass
+
+
+class StubMessage:
+    """The parts of a LangChain AI message the pipeline reads"""
+
+    def __init__(self, content, usage_metadata=None):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+
+def example_from_schema(schema):
+    """A minimal document following a JSON schema"""
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: example_from_schema(prop) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [example_from_schema(schema.get("items", {"type": "string"}))]
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    return f"Stub {schema.get('description', 'text')}"
+
+
+class StubChatModel:
+    """
+    Local stand-in for a chat model: answers after `latency` seconds (plus up to `jitter`)
+    and fails with probability `error_rate`. Structured and JSON-mode outputs follow the
+    schema they are bound to (see example_from_schema). Bound clients share the behaviour
+    of the client they were derived from, so it can be changed while a simulation runs.
+    """
+
+    def __init__(self, model, latency=0.0, jitter=0.0, error_rate=0.0, **_ignored):
+        self.model = model
+        self.behaviour = {'latency': latency, 'jitter': jitter, 'error_rate': error_rate}
+        self.schema = None
+        self.include_raw = False
+
+    def _derive(self, schema, include_raw):
+        derived = copy.copy(self)
+        derived.schema = schema
+        derived.include_raw = include_raw
+        return derived
+
+    def with_structured_output(self, schema, include_raw=False):
+        return self._derive(schema, include_raw)
+
+    def bind(self, response_format=None, **_kwargs):
+        return self._derive((response_format or {}).get("json_schema", {}).get("schema"), False)
+
+    def _answer(self, prompt):
+        time.sleep(self.behaviour['latency'] + random.random() * self.behaviour['jitter'])
+        if random.random() < self.behaviour['error_rate']:
+            raise StubProviderError(f"{self.model} failed (stub error rate {self.behaviour['error_rate']})")
+        document = example_from_schema(self.schema) if self.schema else None
+        content = json.dumps(document) if document is not None else f"Stub answer from {self.model}"
+        usage = {
+            'input_tokens': prompt_tokens(prompt),
+            'output_tokens': len(content) // 4,
+            'total_tokens': prompt_tokens(prompt) + len(content) // 4
+        }
+        return document, StubMessage(content, usage)
+
+    def invoke(self, prompt):
+        document, message = self._answer(prompt)
+        if self.include_raw:
+            return {'raw': message, 'parsed': document, 'parsing_error': None}
+        return document if self.schema else message
+
+    def stream(self, prompt):
+        _, message = self._answer(prompt)
+        for i in range(0, len(message.content), 16):
+            yield StubMessage(message.content[i:i + 16])
+        yield StubMessage("", message.usage_metadata)
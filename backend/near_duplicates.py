@@ -0,0 +1,72 @@
+"""
+Near-duplicate detection of extracted web pages, before they are summarized.
+
+Syndicated news reaches several outlets almost verbatim, and searches return each copy.
+Every page is reduced to a MinHash sketch (the PAGE_SKETCH_SIZE smallest hashes of its
+word 5-shingles), and pages are clustered greedily in search order: a page joins the
+first cluster whose representative it resembles with an estimated Jaccard similarity of
+at least PESTEL_NEAR_DUPLICATE_THRESHOLD, otherwise it starts a new cluster. Only the
+representative (the first page of the cluster) is summarized and goes into the report
+context; the URLs and titles of the other copies are kept on it as `alternate_urls`, for
+the news list. Items of the same URL found by several queries are summarized once and
+all kept. PESTEL_NEAR_DUPLICATES=0 disables the detection.
+"""
+import os
+import re
+import zlib
+import heapq
+
+NEAR_DUPLICATES_ENABLED = os.environ.get('PESTEL_NEAR_DUPLICATES', '1') == '1'
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('PESTEL_NEAR_DUPLICATE_THRESHOLD', 0.5))
+
+# Words per shingle and hashes kept per page
+SHINGLE_WORDS = 5
+PAGE_SKETCH_SIZE = 128
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def page_sketch(text, size=PAGE_SKETCH_SIZE):
+    """Bottom-k MinHash sketch of a text's word shingles, as a frozenset of hashes"""
+    words = _WORD.findall((text or "").lower())
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    shingles.discard("")
+    return frozenset(heapq.nsmallest(size, {zlib.crc32(shingle.encode('utf-8')) for shingle in shingles}))
+
+
+def sketch_similarity(a, b, size=PAGE_SKETCH_SIZE):
+    """Estimated Jaccard similarity of the shingle sets behind two sketches"""
+    if not a or not b:
+        return 0.0
+    union = heapq.nsmallest(size, a | b)
+    return sum(1 for value in union if value in a and value in b) / len(union)
+
+
+def cluster_pages(items, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Group extracted pages ({query, tag, url, title, content}) into clusters of near
+    duplicates, in search order; the first item of each cluster is its representative.
+    """
+    clusters = []
+    sketches = []
+    for item in items:
+        sketch = page_sketch(item.get('content'))
+        for cluster, representative_sketch in zip(clusters, sketches):
+            if (item.get('url') and item.get('url') == cluster[0].get('url')) \
+                    or sketch_similarity(sketch, representative_sketch) >= threshold:
+                cluster.append(item)
+                break
+        else:
+            clusters.append([item])
+            sketches.append(sketch)
+    return clusters
+
+
+def with_alternates(cluster):
+    """The representative of a cluster, with the other URLs of its copies as `alternate_urls`"""
+    representative = cluster[0]
+    alternates = []
+    for item in cluster[1:]:
+        if item.get('url') != representative.get('url') and item['url'] not in [a['url'] for a in alternates]:
+            alternates.append({'title': item.get('title'), 'url': item['url']})
+    return dict(representative, alternate_urls=alternates) if alternates else representative
@@ -0,0 +1,485 @@
+import json
+import hashlib
+import uuid
+import datetime
+import contextvars
+import concurrent.futures
+from contextlib import contextmanager
+
+# all_agents and tavily_functions pull in LangGraph, LangChain and the provider SDKs;
+# they are imported inside the functions that run the workflow so that starting
+# the server does not pay for them
+from score import calculate_scores_direct, PESTEL_FACTORS as DIMENSIONS
+from singleflight import SingleFlight
+from result_store import create_result_store
+from admission import create_admission_controller, AdmissionRejected, INTERACTIVE
+from metrics import inflight_runs, record_cache
+from usage import UsageLedger, current_ledger
+from content_store import ContentStore, current_content, store_items, resolve_items
+from query_prefetch import current_speculation
+
+# PESTEL factor categories present in the submitted form
+FACTOR_CATEGORIES = [
+    "political_factors",
+    "economic_factors",
+    "social_factors",
+    "technological_factors",
+    "environmental_factors",
+    "legal_factors"
+]
+
+# Keys holding the web data for each dimension in the graph state
+FACTOR_DATA_KEYS = [
+    'political_data', 'economic_data', 'social_data',
+    'technological_data', 'environmental_data', 'legal_data'
+]
+
+# Node names in execution order, followed by the scoring stage run after the graph
+PIPELINE_STAGES = [
+    f"{dimension}_{step}"
+    for dimension in ["political", "economic", "social", "technological", "environmental", "legal"]
+    for step in ["format_query", "search", "summarize", "report"]
+] + ["generate_final_report", "scoring"]
+
+# Form fields identifying the submitter rather than the analysis itself
+IDENTITY_FIELDS = ["email"]
+
+# Identical analyses running at the same time in this process share one run
+analysis_flight = SingleFlight()
+
+# Caps concurrent pipeline runs, queueing the rest by priority lane
+admission = create_admission_controller()
+
+# Finished analyses, fetchable by id without re-running the pipeline
+result_store = create_result_store()
+
+
+def preprocess_form(form_data):
+    """
+    General preprocessing: convert all boolean values in PESTEL factor categories to "true"/"false" strings
+    """
+    processed_form_data = form_data.copy()
+    for category in FACTOR_CATEGORIES:
+        if category in processed_form_data and isinstance(processed_form_data[category], dict):
+            processed_form_data[category] = {
+                key: str(value).lower() if isinstance(value, bool) else value
+                for key, value in processed_form_data[category].items()
+            }
+    return processed_form_data
+
+
+def form_hash(processed_form_data):
+    """Canonical hash of the analysis configuration in a preprocessed form"""
+    canonical = {k: v for k, v in processed_form_data.items() if k not in IDENTITY_FIELDS}
+    payload = json.dumps(canonical, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def parallel_map(fn, items, max_workers):
+    """Map `fn` over items in threads that inherit the caller's context (and usage ledger)"""
+    if not items:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+
+def build_initial_state(processed_form_data):
+    """Initialize the state with the parsed form and empty per-dimension queries and data"""
+    from all_agents import UserForm
+
+    return {
+        'form': UserForm.from_dict(processed_form_data),
+        'political_queries': None,
+        'economic_queries': None,
+        'social_queries': None,
+        'technological_queries': None,
+        'environmental_queries': None,
+        'legal_queries': None,
+        'political_data': [],
+        'economic_data': [],
+        'social_data': [],
+        'technological_data': [],
+        'environmental_data': [],
+        'legal_data': [],
+        'reports': {},
+        'completed_reports': []
+    }
+
+
+@contextmanager
+def run_context():
+    """
+    Per-run usage ledger, content store and speculative searches, visible to every graph
+    node and worker thread of the run; yields the ledger. The page contents are freed
+    when the run ends.
+    """
+    ledger = UsageLedger()
+    ledger_token = current_ledger.set(ledger)
+    content = ContentStore()
+    content_token = current_content.set(content)
+    speculation_token = current_speculation.set({})
+    inflight_runs.inc()
+    try:
+        yield ledger
+    finally:
+        inflight_runs.dec()
+        # Pages still referenced at the end of the run (summaries kept for the report context)
+        held = content.stats()
+        print(f"Run finished: content store held {held['entries']} pages, {held['characters']} characters")
+        current_speculation.reset(speculation_token)
+        current_content.reset(content_token)
+        current_ledger.reset(ledger_token)
+
+
+def run_graph(initial_state, on_stage=None, dimensions=None):
+    """
+    Run the PESTEL workflow and return the final state.
+    `on_stage` is called with the node name each time a node finishes;
+    `dimensions` restricts the branches that run (see build_pestel_graph).
+    """
+    from all_agents import get_pestel_graph
+
+    pestel_graph = get_pestel_graph(dimensions)
+
+    if on_stage is None:
+        return pestel_graph.invoke(initial_state)
+
+    result = initial_state
+    for mode, chunk in pestel_graph.stream(initial_state, stream_mode=["updates", "values"]):
+        if mode == "values":
+            result = chunk
+        elif isinstance(chunk, dict):
+            for node_name in chunk:
+                on_stage(node_name)
+    return result
+
+
+def warm_up():
+    """Import the workflow modules and compile the full graph ahead of the first analysis"""
+    from all_agents import get_pestel_graph
+    from tavily_functions import import_provider_sdks
+
+    started = datetime.datetime.now()
+    import_provider_sdks()
+    get_pestel_graph()
+    print(f"Workflow warmed up in {(datetime.datetime.now() - started).total_seconds():.1f}s")
+
+
+def parse_reports(reports):
+    """
+    Split a state's reports into the dimension reports and the final report.
+    Reports are kept as dictionaries through the workflow; JSON strings are still parsed.
+    """
+    parsed_reports = {}
+
+    # Process individual reports
+    for report_key, report_value in reports.items():
+        if report_key != 'final_report' and report_value:
+            try:
+                # Parse the JSON string into a Python dictionary
+                if isinstance(report_value, str):
+                    parsed_reports[report_key] = json.loads(report_value)
+                else:
+                    parsed_reports[report_key] = report_value
+            except json.JSONDecodeError:
+                print(f"Error parsing {report_key} as JSON")
+                parsed_reports[report_key] = report_value
+
+    # Parse the final report separately
+    final_report = reports.get('final_report', '')
+    if final_report and isinstance(final_report, str):
+        try:
+            parsed_final_report = json.loads(final_report)
+        except json.JSONDecodeError:
+            print("Error parsing final_report as JSON")
+            parsed_final_report = final_report
+    else:
+        parsed_final_report = final_report
+
+    return parsed_reports, parsed_final_report
+
+
+def extract_news(result):
+    """Extract news data from each factor's data arrays"""
+    news_data = {}
+    for data_key in FACTOR_DATA_KEYS:
+        news_key = data_key.replace('_data', '_news')
+        news_data[news_key] = []
+
+        data_array = result.get(data_key, [])
+        for item in data_array:
+            if isinstance(item, dict) and 'title' in item and 'url' in item:
+                news_item = {
+                    'title': item['title'],
+                    'url': item['url']
+                }
+                # Other outlets that published the same story (see near_duplicates.py)
+                if item.get('alternate_urls'):
+                    news_item['alternate_urls'] = item['alternate_urls']
+                news_data[news_key].append(news_item)
+    return news_data
+
+
+def score_reports(processed_form_data, parsed_reports, factors=None):
+    """Calculate PESTEL similarity and impact scores, never failing the analysis"""
+    print("Starting PESTEL scoring calculation...")
+    try:
+        pestel_scores = calculate_scores_direct(processed_form_data, parsed_reports, factors=factors)
+        print(f"PESTEL scoring completed successfully. Calculated scores for {len(pestel_scores)} factors.")
+    except Exception as e:
+        print(f"Error calculating PESTEL scores: {str(e)}")
+        pestel_scores = {}
+    return pestel_scores
+
+
+def run_analysis(processed_form_data, on_stage=None):
+    """
+    Run the full PESTEL analysis (graph plus scoring) for a preprocessed form
+    and return the response structure expected by the frontend.
+    """
+    print("Starting PESTEL analysis workflow for submitted form data...")
+
+    with run_context() as ledger:
+        result = run_graph(build_initial_state(processed_form_data), on_stage=on_stage)
+        return finish_analysis(processed_form_data, result, ledger, on_stage=on_stage)
+
+
+def retrieval_snapshot(result):
+    """Per-dimension web data and search queries of a finished run, kept for re-analysis and refreshes"""
+    data, queries = {}, {}
+    for dimension in DIMENSIONS:
+        data[dimension] = resolve_items(result.get(f'{dimension}_data', []))
+        queries[dimension] = result.get(f'{dimension}_queries')
+    return {'data': data, 'queries': queries}
+
+
+def finish_analysis(processed_form_data, result, ledger, on_stage=None,
+                    score_dimensions=None, previous_scores=None, extra_response=None, snapshot=None):
+    """
+    Score the reports of a finished workflow state, build the response
+    expected by the frontend and store it.
+    Only `score_dimensions` are re-scored when given; the others keep `previous_scores`.
+    `snapshot` overrides the data and queries stored with the record.
+    """
+    # The state holds plain dicts and lists apart from the LangChain messages, which are
+    # not part of the response; it is serialized once, at the HTTP and storage boundaries
+    parsed_reports, parsed_final_report = parse_reports(result.get('reports', {}))
+
+    pestel_scores = {
+        dimension: score for dimension, score in (previous_scores or {}).items()
+        if score_dimensions is not None and dimension not in score_dimensions
+    }
+    pestel_scores.update(score_reports(processed_form_data, parsed_reports, factors=score_dimensions))
+    if on_stage is not None:
+        on_stage("scoring")
+
+    news_data = extract_news(result)
+
+    print("PESTEL analysis complete!")
+
+    # Structure the response according to the expected format
+    response_data = {
+        'success': True,
+        'analysis_id': uuid.uuid4().hex,
+        'individual_reports': parsed_reports,
+        'report': parsed_final_report,
+        'news': news_data,
+        'pestel_scores': pestel_scores,
+        'usage': ledger.summary(),
+        'timestamp': datetime.datetime.now().isoformat(),
+        **(extra_response or {})
+    }
+
+    totals = response_data['usage']['totals']
+    print(f"Analysis used {totals['llm']['prompt_tokens']} prompt ({totals['llm']['cached_prompt_tokens']} cached) / "
+          f"{totals['llm']['completion_tokens']} completion tokens and {totals['tavily']['credits']} Tavily credits "
+          f"(~${totals['estimated_cost_usd']:.4f})")
+
+    store_result(processed_form_data, response_data, snapshot or retrieval_snapshot(result))
+
+    return response_data
+
+
+def store_result(processed_form_data, response_data, snapshot=None):
+    """Persist a finished analysis; a storage failure never fails the analysis"""
+    try:
+        result_store.save(
+            form_hash(processed_form_data), processed_form_data, response_data,
+            analysis_id=response_data['analysis_id'], extra=snapshot
+        )
+        print(f"Stored analysis {response_data['analysis_id']}")
+    except Exception as e:
+        print(f"Error storing analysis result: {str(e)}")
+
+
+def run_analysis_coalesced(processed_form_data, on_stage=None, lane=INTERACTIVE, bounded=True):
+    """
+    Run the analysis, attaching to an identical in-flight run when there is one.
+    Only the leading request goes through admission control; coalesced callers
+    receive the leader's response (or its AdmissionRejected) and no stage callbacks.
+    """
+    user = processed_form_data.get('email')
+
+    def admitted_run():
+        with admission.admit(user=user, lane=lane, bounded=bounded):
+            return run_analysis(processed_form_data, on_stage=on_stage)
+
+    while True:
+        try:
+            response_data, shared = analysis_flight.do(form_hash(processed_form_data), admitted_run)
+            break
+        except AdmissionRejected:
+            # An unbounded caller is only rejected through a bounded leader it attached to
+            if bounded:
+                raise
+    record_cache("inflight_analysis", shared)
+    if shared:
+        print("Attached to an identical in-flight PESTEL analysis")
+    return response_data
+
+
+def changed_dimensions(previous_form, processed_form_data):
+    """
+    Dimensions whose inputs differ between two forms. A dimension depends on its own
+    factor selection and on every non-factor field (industry, geography, notes, ...).
+    """
+    ignored = set(FACTOR_CATEGORIES) | set(IDENTITY_FIELDS)
+    keys = (set(previous_form) | set(processed_form_data)) - ignored
+    if any(previous_form.get(key) != processed_form_data.get(key) for key in keys):
+        return list(DIMENSIONS)
+    return [
+        dimension for dimension in DIMENSIONS
+        if previous_form.get(f"{dimension}_factors") != processed_form_data.get(f"{dimension}_factors")
+    ]
+
+
+def run_reanalysis(previous_analysis_id, processed_form_data, on_stage=None):
+    """
+    Re-run a stored analysis for a modified form, recomputing only the dimensions whose
+    inputs changed. Unchanged dimensions reuse the stored data, reports and scores;
+    the final report is always re-synthesized. Raises KeyError for an unknown analysis.
+    """
+    record = result_store.get(previous_analysis_id)
+    if record is None:
+        raise KeyError(previous_analysis_id)
+
+    changed = changed_dimensions(record['form'], processed_form_data)
+    reused = [dimension for dimension in DIMENSIONS if dimension not in changed]
+    reanalysis_info = {
+        'reanalysis': {
+            'previous_analysis_id': previous_analysis_id,
+            'changed_dimensions': changed,
+            'reused_dimensions': reused
+        }
+    }
+    print(f"Re-analysis of {previous_analysis_id}: recomputing {changed or 'nothing'}, reusing {reused}")
+
+    previous_response = record['response']
+    if not changed:
+        return {**previous_response, **reanalysis_info}
+
+    with run_context() as ledger:
+        # Seed the state with everything the unchanged dimensions already produced
+        initial_state = build_initial_state(processed_form_data)
+        previous_reports = previous_response.get('individual_reports', {})
+        for dimension in reused:
+            initial_state[f'{dimension}_data'] = store_items(record.get('data', {}).get(dimension, []))
+            initial_state[f'{dimension}_queries'] = record.get('queries', {}).get(dimension)
+            report_key = f'{dimension}_report'
+            if report_key in previous_reports:
+                initial_state['reports'][report_key] = previous_reports[report_key]
+            initial_state['completed_reports'].append(report_key)
+
+        result = run_graph(initial_state, on_stage=on_stage, dimensions=changed)
+        return finish_analysis(
+            processed_form_data, result, ledger, on_stage=on_stage,
+            score_dimensions=changed,
+            previous_scores=previous_response.get('pestel_scores', {}),
+            extra_response=reanalysis_info
+        )
+
+
+def _is_general(item, general_queries):
+    if 'tag' in item:
+        return item['tag'] == "general"
+    # Records stored before results carried their tag: match on the query text
+    return item.get('query') in general_queries
+
+
+def run_news_refresh(analysis_id):
+    """
+    Refresh a stored analysis by re-running only its news-tagged queries.
+    Fresh news is merged with the stored general research of each dimension and the
+    affected reports, the final report and their scores are regenerated. Without news
+    queries the stored analysis is returned as is.
+    Raises KeyError for an unknown analysis.
+    """
+    from all_agents import get_selected_factors, generate_dimension_report, build_final_report
+    from tavily_functions import tavily_search, summarize_extracted_content
+
+    record = result_store.get(analysis_id)
+    if record is None:
+        raise KeyError(analysis_id)
+
+    processed_form_data = record['form']
+    previous_response = record['response']
+    stored_data = record.get('data', {})
+    stored_queries = record.get('queries', {})
+
+    def news_queries(dimension):
+        queries = stored_queries.get(dimension) or {'search_queries': []}
+        return [q for q in queries['search_queries'] if q['tag'] == "news"]
+
+    # Dimensions without news queries keep their stored data and report
+    dimensions = [
+        dimension for dimension in DIMENSIONS
+        if get_selected_factors(processed_form_data, dimension) and news_queries(dimension)
+    ]
+    if not dimensions:
+        print(f"Refresh of {analysis_id}: no news queries, nothing to refresh")
+        return {
+            **previous_response,
+            'refresh': {'previous_analysis_id': analysis_id, 'refreshed_dimensions': []}
+        }
+
+    with run_context() as ledger:
+        def refresh_dimension(dimension):
+            queries = stored_queries[dimension]
+            general_queries = {q['query'] for q in queries['search_queries'] if q['tag'] == "general"}
+            general_items = [item for item in stored_data.get(dimension, []) if _is_general(item, general_queries)]
+
+            fresh = tavily_search({'search_queries': news_queries(dimension)}, node=f"{dimension}_refresh_search")
+            known_urls = {item['url'] for item in general_items}
+            fresh = [item for item in fresh if item['url'] not in known_urls]
+            summarized = summarize_extracted_content(fresh, node=f"{dimension}_refresh_summarize")
+            merged = general_items + summarized
+
+            report = generate_dimension_report(dimension, processed_form_data, merged)
+            print(f"{dimension.title()} news refreshed: {len(summarized)} fresh items, {len(general_items)} reused")
+            return merged, report
+
+        refreshed = dict(zip(dimensions, parallel_map(refresh_dimension, dimensions, len(DIMENSIONS))))
+
+        reports = dict(previous_response.get('individual_reports', {}))
+        data = dict(stored_data)
+        for dimension, (merged, report) in refreshed.items():
+            data[dimension] = merged
+            reports[f'{dimension}_report'] = report
+        reports['final_report'] = build_final_report(json.dumps(processed_form_data), reports)
+
+        result = {f'{dimension}_data': data.get(dimension, []) for dimension in DIMENSIONS}
+        result['reports'] = reports
+
+        return finish_analysis(
+            processed_form_data, result, ledger,
+            score_dimensions=list(refreshed),
+            previous_scores=previous_response.get('pestel_scores', {}),
+            extra_response={
+                'refresh': {
+                    'previous_analysis_id': analysis_id,
+                    'refreshed_dimensions': list(refreshed)
+                }
+            },
+            snapshot={'data': data, 'queries': stored_queries}
+        )
@@ -311,4 +311,62 @@ final_report_schema = {
     }
   },
   "required": ["executive_summary", "introduction", "pestel_analysis", "strategic_implications", "opportunities_threats_matrix", "strategic_recommendations", "conclusion"]
-}
\ No newline at end of file
+}
+
+# Parts of report_schema generated by separate calls in fan-out mode (see report_fanout)
+factor_analysis_schema = {
+  "title": "PESTELFactorAnalysisSchema",
+  "description": "Analysis of one factor selected by the user, for a PESTEL dimension report",
+  **report_schema["properties"]["factors_analysis"]["items"]
+}
+
+report_summary_schema = {
+  "title": "PESTELReportSummarySchema",
+  "description": "The fields of a PESTEL dimension report written from its factor analyses",
+  "type": "object",
+  "properties": {
+    name: prop for name, prop in report_schema["properties"].items() if name != "factors_analysis"
+  },
+  "required": [name for name in report_schema["required"] if name != "factors_analysis"]
+}
+
+# Parts of final_report_schema generated by separate calls in sectioned mode (see report_fanout)
+def _final_report_part(title, description, fields):
+  return {
+    "title": title,
+    "description": description,
+    "type": "object",
+    "properties": {field: final_report_schema["properties"][field] for field in fields},
+    "required": list(fields)
+  }
+
+_matrix_entry = final_report_schema["properties"]["opportunities_threats_matrix"]["properties"]["dimensions"]["items"]
+
+dimension_synthesis_schema = {
+  "title": "PESTELDimensionSynthesisSchema",
+  "description": "Synthesis of one PESTEL dimension report for the comprehensive final report",
+  "type": "object",
+  "properties": {
+    "synthesis": {
+      "type": "string",
+      "description": "Synthesis of the key insights from the dimension's report"
+    },
+    "opportunities": _matrix_entry["properties"]["opportunities"],
+    "threats": _matrix_entry["properties"]["threats"]
+  },
+  "required": ["synthesis", "opportunities", "threats"]
+}
+
+final_introduction_schema = _final_report_part(
+  "PESTELIntroductionSchema", "Introduction of the comprehensive PESTEL report", ["introduction"]
+)
+final_implications_schema = _final_report_part(
+  "PESTELStrategicImplicationsSchema", "Cross-dimensional strategic implications", ["strategic_implications"]
+)
+final_recommendations_schema = _final_report_part(
+  "PESTELStrategicRecommendationsSchema", "Strategic recommendations", ["strategic_recommendations"]
+)
+final_summary_schema = _final_report_part(
+  "PESTELSummarySchema", "Executive summary and conclusion of the comprehensive PESTEL report",
+  ["executive_summary", "conclusion"]
+)
@@ -0,0 +1,142 @@
+"""
+Speculative web search while the query LLM writes a dimension's queries
+(PESTEL_SPECULATIVE_SEARCH=1).
+
+Searching cannot start until the query model has answered, and that call reasons before
+it writes anything. In speculative mode the format_query node first starts searches for
+deterministic template queries built from the form, "<industry> <factor> <geography>"
+for each selected factor (tagged general, then news, up to PESTEL_SPECULATIVE_QUERIES),
+in the background, and only then asks the model for its queries.
+
+The search node matches each generated query with at most one speculative query of the
+same tag when the terms of the shorter one are mostly found in the other (overlap of
+at least PESTEL_SPECULATION_MATCH). Matched queries take the speculative pages; the
+others are searched as before. Speculative searches that no generated query matched
+are cancelled if they have not started yet, and counted as wasted.
+"""
+import os
+import threading
+import contextvars
+import concurrent.futures
+
+from context_selection import tokenize
+from metrics import speculative_queries
+from usage import record_speculation
+
+SPECULATIVE_SEARCH = os.environ.get('PESTEL_SPECULATIVE_SEARCH', '0') == '1'
+
+# Template queries searched per dimension
+SPECULATIVE_QUERIES = int(os.environ.get('PESTEL_SPECULATIVE_QUERIES', 5))
+
+# Share of the shorter query's terms the other must contain for the two to match
+SPECULATION_MATCH = float(os.environ.get('PESTEL_SPECULATION_MATCH', 0.7))
+
+# Speculative searches running at once, across all analyses of the process
+SPECULATIVE_WORKERS = int(os.environ.get('PESTEL_SPECULATIVE_WORKERS', 12))
+
+# Pending speculative searches of the analysis in the current context, by dimension
+# (None outside a run: no speculation)
+current_speculation = contextvars.ContextVar("pestel_speculation", default=None)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=SPECULATIVE_WORKERS, thread_name_prefix="speculative-search"
+                )
+    return _executor
+
+
+def template_queries(user_form, selected_factors, limit=SPECULATIVE_QUERIES):
+    """Tagged queries built from the form alone, general ones first"""
+    industry = (user_form.get("industry") or "").strip()
+    geography = (user_form.get("geographical_focus") or "").strip()
+    queries = []
+    for tag in ("general", "news"):
+        for factor in selected_factors:
+            text = " ".join(part for part in (industry, factor.replace('_', ' '), geography) if part)
+            queries.append({'query': text, 'tag': tag})
+    return queries[:limit]
+
+
+def start_speculation(dimension, user_form, selected_factors):
+    """Start the template searches of a dimension in the background; no-op when disabled"""
+    speculation = current_speculation.get()
+    if not SPECULATIVE_SEARCH or speculation is None:
+        return
+    from tavily_functions import search_and_extract
+
+    node = f"{dimension}_speculative_search"
+    executor = _get_executor()
+    speculation[dimension] = [
+        (query, executor.submit(contextvars.copy_context().run, search_and_extract, query, node))
+        for query in template_queries(user_form, selected_factors)
+    ]
+
+
+def query_overlap(a, b):
+    """Share of the terms of the shorter query found in the other"""
+    a, b = set(tokenize(a)), set(tokenize(b))
+    return len(a & b) / min(len(a), len(b)) if a and b else 0.0
+
+
+def match_queries(generated, speculative, threshold=SPECULATION_MATCH):
+    """Generated query index -> speculative query index, one-to-one, best overlaps first"""
+    candidates = sorted(
+        (
+            (query_overlap(query['query'], template['query']), i, j)
+            for i, query in enumerate(generated)
+            for j, template in enumerate(speculative)
+            if query.get('tag') == template['tag']
+        ),
+        key=lambda candidate: (-candidate[0], candidate[1], candidate[2])
+    )
+    pairs, matched = {}, set()
+    for overlap, i, j in candidates:
+        if overlap < threshold:
+            break
+        if i not in pairs and j not in matched:
+            pairs[i] = j
+            matched.add(j)
+    return pairs
+
+
+def take_speculation(dimension, queries):
+    """
+    Pages of the dimension's speculative searches that match its generated `queries`,
+    by query index (see tavily_search). Unmatched speculative searches are cancelled.
+    """
+    speculation = current_speculation.get()
+    pending = speculation.pop(dimension, None) if speculation is not None else None
+    if not pending:
+        return {}
+
+    generated = (queries or {}).get('search_queries') or []
+    pairs = match_queries(generated, [query for query, _ in pending])
+    prefetched = {}
+    for i, j in pairs.items():
+        template, future = pending[j]
+        try:
+            prefetched[i] = future.result()
+        except Exception as e:
+            print(f"Speculative search for '{template['query']}' failed ({str(e)}), "
+                  f"searching '{generated[i]['query']}' instead")
+    for j, (_, future) in enumerate(pending):
+        if j not in pairs.values():
+            future.cancel()
+
+    hits = len(prefetched)
+    wasted = len(pending) - hits
+    speculative_queries.inc(hits, outcome="hit")
+    speculative_queries.inc(len(generated) - hits, outcome="miss")
+    speculative_queries.inc(wasted, outcome="wasted")
+    record_speculation(f"{dimension}_search", len(pending), len(generated), hits, wasted)
+    print(f"{dimension.title()} speculative search: {hits} of {len(generated)} queries served from "
+          f"prefetched results, {wasted} of {len(pending)} prefetched queries unused")
+    return prefetched
@@ -0,0 +1,112 @@
+"""
+Cache of generated dimension reports.
+
+Two analyses whose report prompt for a dimension would be built from the same inputs get
+the same report: the cache key covers the dimension, the selected factors (order-free),
+industry, geography, the rest of the business context, the user's notes, a fingerprint of
+the web context that went into the prompt, the model and the prompt version. A hit skips
+the report LLM call; the cached report continues into the final report and scoring like a
+freshly generated one. Entries expire after PESTEL_REPORT_CACHE_TTL seconds
+(default one week); PESTEL_REPORT_CACHE=0 disables the cache.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import closing
+
+import json_codec
+
+REPORT_CACHE_ENABLED = os.environ.get('PESTEL_REPORT_CACHE', '1') == '1'
+REPORT_CACHE_TTL = float(os.environ.get('PESTEL_REPORT_CACHE_TTL', 7 * 24 * 3600))
+
+
+def fingerprint(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def report_cache_key(dimension, selected_factors, industry, geography, business_context, notes,
+                     context, model, prompt_version):
+    """Cache key of a dimension report prompt; the long texts enter as fingerprints"""
+    parts = {
+        'dimension': dimension,
+        'factors': sorted(selected_factors),
+        'industry': (industry or "").strip().lower(),
+        'geography': (geography or "").strip().lower(),
+        'business_context': fingerprint(business_context),
+        'notes': fingerprint((notes or "").strip()),
+        'context': fingerprint(context),
+        'model': model,
+        'prompt_version': prompt_version
+    }
+    return fingerprint(json.dumps(parts, sort_keys=True, separators=(',', ':')))
+
+
+class ReportCache:
+    """Local report cache backed by SQLite, shared by the processes of one host"""
+
+    def __init__(self, path, ttl=REPORT_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    key TEXT PRIMARY KEY,
+                    dimension TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    report TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_created ON reports (created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def get(self, key):
+        """The cached report for a key, or None when missing or expired"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT report FROM reports WHERE key = ? AND created_at >= ?", (key, time.time() - self.ttl)
+            ).fetchone()
+        return json_codec.loads(row['report']) if row is not None else None
+
+    def put(self, key, dimension, report):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports (key, dimension, created_at, report) VALUES (?, ?, ?, ?)",
+                (key, dimension, time.time(), json_codec.dumps_str(report))
+            )
+
+    def purge_expired(self):
+        """Delete expired entries; returns how many were removed"""
+        with closing(self._connect()) as conn:
+            return conn.execute("DELETE FROM reports WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+
+
+_report_cache = None
+_report_cache_lock = threading.Lock()
+
+
+def get_report_cache():
+    """The process's report cache, opened on first use; None when caching is disabled"""
+    global _report_cache
+    if not REPORT_CACHE_ENABLED:
+        return None
+    if _report_cache is None:
+        with _report_cache_lock:
+            if _report_cache is None:
+                db_path = os.environ.get(
+                    'PESTEL_REPORT_CACHE_DB',
+                    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report_cache.db')
+                )
+                report_cache = ReportCache(db_path)
+                purged = report_cache.purge_expired()
+                if purged:
+                    print(f"Purged {purged} expired cached report(s)")
+                _report_cache = report_cache
+    return _report_cache
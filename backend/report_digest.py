@@ -0,0 +1,110 @@
+"""
+Compact digests of the dimension reports for the final report prompt
+(PESTEL_FINAL_REPORT_INPUT=digest).
+
+The final report synthesizes the dimension reports, so it does not need the full factor
+analyses, scenarios and recommendations of each. A digest keeps what the synthesis
+works from:
+
+    Executive summary: <the report's executive summary>
+    Factors:
+    - Tax Regulations (indicators: corporate tax rate; subsidy volume)
+    Top risks:
+    - [Critical] Export controls on battery materials
+    Top opportunities:
+    - [Transformative] Public charging infrastructure programs
+
+Risks and opportunities are ranked by impact level, highest first. Each digest is
+rendered within a token budget (PESTEL_DIGEST_TOKENS split between the available
+reports): the lists are shortened first, then the executive summary is cut at a word
+boundary, so the same report always gives the same digest.
+"""
+import os
+import json
+
+from context_encoder import count_tokens, truncate_tokens
+
+# "full": the final report prompt embeds whole reports; "digest": digests of them
+FINAL_REPORT_INPUT = os.environ.get('PESTEL_FINAL_REPORT_INPUT', 'full')
+
+# Token budget of all the digests of one final report prompt
+DIGEST_TOKENS = int(os.environ.get('PESTEL_DIGEST_TOKENS', 6000))
+
+# Risks and opportunities kept per digest before the budget shortens the lists
+DIGEST_TOP_ITEMS = 5
+
+# The executive summary is only cut when at least this many tokens of it would remain
+MIN_SUMMARY_TOKENS = 60
+
+RISK_LEVELS = ["Critical", "High", "Medium", "Low"]
+BENEFIT_LEVELS = ["Transformative", "High", "Medium", "Low"]
+
+# (top items, indicators per factor) tried in turn until a digest fits its budget
+_DIGEST_LIMITS = [(DIGEST_TOP_ITEMS, None), (3, 3), (2, 2), (1, 1)]
+
+
+def _ranked(items, level_field, levels):
+    """Items by level, highest first; items of the same level keep the report's order"""
+    return sorted(items, key=lambda item: levels.index(item.get(level_field))
+                  if item.get(level_field) in levels else len(levels))
+
+
+def digest_report(report):
+    """The digest fields of a report_schema object"""
+    risks_opportunities = report.get('risks_opportunities') or {}
+    return {
+        'report_type': report.get('report_type'),
+        'executive_summary': report.get('executive_summary') or "",
+        'factors': [
+            {'factor_name': factor.get('factor_name'), 'key_indicators': factor.get('key_indicators') or []}
+            for factor in report.get('factors_analysis') or []
+        ],
+        'risks': [
+            {'title': risk.get('risk_title'), 'level': risk.get('impact_level')}
+            for risk in _ranked(risks_opportunities.get('risks') or [], 'impact_level', RISK_LEVELS)
+        ],
+        'opportunities': [
+            {'title': opportunity.get('opportunity_title'), 'level': opportunity.get('potential_benefit')}
+            for opportunity in _ranked(risks_opportunities.get('opportunities') or [],
+                                       'potential_benefit', BENEFIT_LEVELS)
+        ]
+    }
+
+
+def _digest_lines(digest, top_items, indicators):
+    lines = ["Factors:"]
+    for factor in digest['factors']:
+        listed = factor['key_indicators'][:indicators]
+        lines.append(f"- {factor['factor_name']}" + (f" (indicators: {'; '.join(listed)})" if listed else ""))
+    for heading, field in (("Top risks:", 'risks'), ("Top opportunities:", 'opportunities')):
+        if digest[field]:
+            lines.append(heading)
+            lines.extend(f"- [{item['level']}] {item['title']}" for item in digest[field][:top_items])
+    return "\n".join(lines)
+
+
+def render_digest(digest, budget):
+    """A digest as text within `budget` tokens"""
+    for top_items, indicators in _DIGEST_LIMITS:
+        body = _digest_lines(digest, top_items, indicators)
+        remaining = budget - count_tokens(body) - count_tokens("Executive summary: ") - 1
+        if remaining >= MIN_SUMMARY_TOKENS:
+            return f"Executive summary: {truncate_tokens(digest['executive_summary'], remaining)}\n{body}"
+    return truncate_tokens(f"Executive summary: {digest['executive_summary']}\n{body}", budget)
+
+
+def report_digests(reports, dimensions, budget=DIGEST_TOKENS):
+    """
+    Digest text of each dimension with a report, sharing `budget` tokens equally. Reports
+    that are not report_schema objects (e.g. plain text) are cut to their share instead.
+    """
+    available = [dimension for dimension in dimensions if reports.get(f'{dimension}_report') is not None]
+    share = budget // max(1, len(available))
+    digests = {}
+    for dimension in available:
+        report = reports[f'{dimension}_report']
+        if isinstance(report, dict):
+            digests[dimension] = render_digest(digest_report(report), share)
+        else:
+            digests[dimension] = truncate_tokens(report if isinstance(report, str) else json.dumps(report), share)
+    return digests
@@ -0,0 +1,276 @@
+"""
+Fan-out generation of dimension reports (PESTEL_REPORT_MODE=fanout) and of the final
+report (PESTEL_FINAL_REPORT_MODE=sectioned).
+
+A single report call writes the executive summary, every factor analysis and the rest of
+the report one after the other, so its latency is dominated by output tokens. In fan-out
+mode each selected factor's factors_analysis entry is written by its own call, all
+concurrently, from the pages most relevant to that factor. A final, lighter call then
+writes the remaining fields of report_schema (executive summary, risks and opportunities,
+regional dynamics, scenarios, recommendations) from those analyses, without the web
+context. The assembled report is validated against report_schema.
+
+The sectioned final report is built in two rounds of concurrent calls. First each
+available dimension's synthesis (its pestel_analysis section and its row of the
+opportunities/threats matrix) is written from that dimension's report alone, alongside
+the introduction. Then the cross-cutting sections (strategic implications, strategic
+recommendations, executive summary with conclusion) are written from those syntheses.
+The assembled report is validated against final_report_schema.
+"""
+import os
+import contextvars
+import concurrent.futures
+
+from tavily_functions import invoke_routed, structured_output, cacheable_prompt
+from model_router import REPORT, FINAL_REPORT
+from context_selection import select_context
+from context_encoder import encode_context
+from report_stream import publish_report_events, publish_report
+from prompts import (
+    report_schema, factor_analysis_schema, report_summary_schema,
+    final_report_schema, dimension_synthesis_schema, final_introduction_schema,
+    final_implications_schema, final_recommendations_schema, final_summary_schema
+)
+
+# "single": one call per report; "fanout": one call per factor plus a summary call
+REPORT_MODE = os.environ.get('PESTEL_REPORT_MODE', 'single')
+
+# "single": one call for the final report; "sectioned": concurrent calls per section
+FINAL_REPORT_MODE = os.environ.get('PESTEL_FINAL_REPORT_MODE', 'single')
+
+# Token budget of the web context of each factor call
+FACTOR_CONTEXT_TOKENS = int(os.environ.get('PESTEL_FACTOR_CONTEXT_TOKENS', 4000))
+
+# Factor calls running at once for one report
+FANOUT_WORKERS = int(os.environ.get('PESTEL_FANOUT_WORKERS', 6))
+
+
+def parallel_calls(fn, items, max_workers=FANOUT_WORKERS):
+    """Map `fn` over items in threads that inherit the caller's context (ledger, listener)"""
+    if not items:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+
+def validate(document, schema):
+    """Raise jsonschema.ValidationError when `document` does not follow `schema`"""
+    import jsonschema
+    jsonschema.validate(document, schema)
+
+
+def factor_title(factor):
+    return factor.replace('_', ' ').title()
+
+
+def render_factor_analyses(analyses):
+    """Factor analyses as plain sections for the summary prompt"""
+    blocks = []
+    for analysis in analyses:
+        indicators = "; ".join(analysis.get('key_indicators') or [])
+        blocks.append(f"## {analysis['factor_name']}\n{analysis['analysis']}"
+                      + (f"\nKey indicators: {indicators}" if indicators else ""))
+    return "\n\n".join(blocks)
+
+
+def generate_fanout_report(dimension, selected_factors, additional_notes, form_text, data, sections):
+    """
+    Generate a dimension report with one call per selected factor and a summary call.
+    Returns the report and the candidates (see model_router) that served the calls.
+    """
+    article = "an" if dimension[0] in "aeiou" else "a"
+    node = f"{dimension}_report"
+    report_key = f"{dimension}_report"
+
+    factor_instructions = f"""
+    You are {article} {dimension.upper()} analyst specializing in PESTEL framework analysis. Write the analysis
+    of ONE {dimension} factor for the user's industry (300-500 words), with supporting evidence and detailed
+    examples from the provided context, and list the key indicators or metrics to watch for it.
+
+    Analyze only the factor named in the request; other factors are analyzed separately.
+    """
+
+    def analyze(indexed_factor):
+        index, factor = indexed_factor
+        # The pages that cover this factor best, within the factor's own budget
+        factor_data, _ = select_context(data, [factor], budget=FACTOR_CONTEXT_TOKENS)
+        context, _ = encode_context(factor_data, budget=FACTOR_CONTEXT_TOKENS)
+        request = f"""
+    Factor: {factor_title(factor)}
+
+    Additional notes from user:
+    {additional_notes}
+
+    Business context:
+{form_text}
+
+    Context (sources found by the queries listed first):
+{context}
+    """
+        analysis, candidate = invoke_routed(
+            REPORT, cacheable_prompt(factor_instructions, request), node,
+            variant="factor_analysis_structured", wrap=structured_output(factor_analysis_schema)
+        )
+        publish_report_events(report_key, ('factors_analysis', index), analysis)
+        return analysis, candidate
+
+    factor_results = parallel_calls(analyze, list(enumerate(selected_factors)))
+    analyses = [analysis for analysis, _ in factor_results]
+
+    summary_sections = "\n    ".join(
+        f"{i}. {section}" for i, section in enumerate([s for j, s in enumerate(sections) if j != 1], 1)
+    )
+    summary_instructions = f"""
+    You are {article} {dimension.upper()} analyst specializing in PESTEL framework analysis. The analyses of the
+    {dimension} factors selected by the user are given in the request. Complete the {dimension.title()} Report
+    around them with the following sections, drawing only on those analyses and the business context:
+    {summary_sections}
+
+    Set report_type to "{dimension.title()}". The executive summary should be 250-350 words.
+    """
+    summary_request = f"""
+    Additional notes from user:
+    {additional_notes}
+
+    Business context:
+{form_text}
+
+    Factor analyses:
+{render_factor_analyses(analyses)}
+    """
+    summary, summary_candidate = invoke_routed(
+        REPORT, cacheable_prompt(summary_instructions, summary_request), node,
+        variant="report_summary_structured", wrap=structured_output(report_summary_schema)
+    )
+    publish_report(report_key, summary)
+
+    # Assemble in the schema's field order
+    parts = dict(summary, factors_analysis=analyses)
+    report = {name: parts[name] for name in report_schema["properties"] if name in parts}
+    validate(report, report_schema)
+    return report, [candidate for _, candidate in factor_results] + [summary_candidate]
+
+
+def render_syntheses(syntheses):
+    """Dimension syntheses as plain sections for the cross-cutting prompts"""
+    blocks = []
+    for dimension, synthesis in syntheses.items():
+        blocks.append(
+            f"## {dimension.title()}\n{synthesis['synthesis']}\n"
+            f"Opportunities: {'; '.join(synthesis['opportunities'])}\n"
+            f"Threats: {'; '.join(synthesis['threats'])}"
+        )
+    return "\n\n".join(blocks)
+
+
+def generate_sectioned_final_report(dimension_reports, additional_notes, form_text):
+    """
+    Generate the final report section by section. `dimension_reports` maps each dimension
+    with a report to the report's prompt text. Returns the report and the candidates
+    (see model_router) that served the calls.
+    """
+    node = "generate_final_report"
+    report_key = "final_report"
+    role = "You are a strategic business consultant specializing in comprehensive PESTEL analysis."
+    available = ", ".join(dimension.title() for dimension in dimension_reports)
+
+    def call(schema, instructions, request):
+        return invoke_routed(
+            FINAL_REPORT, cacheable_prompt(instructions, request), node,
+            variant=f"{schema['title']}_structured", wrap=structured_output(schema)
+        )
+
+    # Round 1: sections that need one dimension report, or only the business context
+    def first_round(task):
+        kind, dimension = task
+        if kind == "introduction":
+            return call(final_introduction_schema, f"""
+    {role} Write the introduction (200-300 words) of a comprehensive PESTEL report: brief context
+    about the industry, the geographical focus and the scope of the analysis.
+    """, f"""
+    Dimensions analyzed: {available}
+
+    Additional notes from user:
+    {additional_notes}
+
+    Business context:
+{form_text}
+    """)
+        return call(dimension_synthesis_schema, f"""
+    {role} Synthesize the {dimension.upper()} report given in the request for the {dimension.title()}
+    Factors section of a comprehensive PESTEL report: its key insights, examples and implications for
+    the user's business, without repeating the report. Also list the key opportunities and threats
+    the report identifies for this dimension.
+    """, f"""
+    Additional notes from user:
+    {additional_notes}
+
+    Business context:
+{form_text}
+
+    {dimension.title()} Report: {dimension_reports[dimension]}
+    """)
+
+    tasks = [("introduction", None)] + [("dimension", dimension) for dimension in dimension_reports]
+    first = parallel_calls(first_round, tasks, max_workers=len(tasks))
+    introduction = first[0][0]['introduction']
+    syntheses = {dimension: output for (_, dimension), (output, _) in zip(tasks[1:], first[1:])}
+    pestel_analysis = {f"{dimension}_factors": synthesis['synthesis'] for dimension, synthesis in syntheses.items()}
+    matrix = {'dimensions': [
+        {'dimension': dimension.title(), 'opportunities': synthesis['opportunities'], 'threats': synthesis['threats']}
+        for dimension, synthesis in syntheses.items()
+    ]}
+    publish_report(report_key, {
+        'introduction': introduction, 'pestel_analysis': pestel_analysis, 'opportunities_threats_matrix': matrix
+    })
+
+    # Round 2: cross-cutting sections written from the syntheses
+    synthesis_text = render_syntheses(syntheses)
+    request = f"""
+    Additional notes from user:
+    {additional_notes}
+
+    Business context:
+{form_text}
+
+    Dimension syntheses:
+{synthesis_text}
+    """
+    second_round = {
+        'strategic_implications': (final_implications_schema, f"""
+    {role} From the PESTEL dimension syntheses in the request, analyze how factors of different
+    dimensions interact and the strategic implications of those interactions for the user's business.
+    """),
+        'strategic_recommendations': (final_recommendations_schema, f"""
+    {role} From the PESTEL dimension syntheses in the request, give 10-15 specific, actionable strategic
+    recommendations for the user's business, each with the dimensions it addresses and its priority.
+    """),
+        'summary': (final_summary_schema, f"""
+    {role} From the PESTEL dimension syntheses in the request, write the executive summary (350-500 words,
+    a concise overview of the key findings across all dimensions) and the conclusion (200-300 words,
+    final observations on the overall business environment and strategic outlook) of the report.
+    """),
+    }
+    second = dict(zip(second_round, parallel_calls(
+        lambda section: call(second_round[section][0], second_round[section][1], request), list(second_round)
+    )))
+    recommendations = second['strategic_recommendations'][0]['strategic_recommendations']
+    for number, recommendation in enumerate(recommendations, 1):
+        recommendation['recommendation_number'] = number
+
+    parts = {
+        'introduction': introduction,
+        'pestel_analysis': pestel_analysis,
+        'opportunities_threats_matrix': matrix,
+        'strategic_implications': second['strategic_implications'][0]['strategic_implications'],
+        'strategic_recommendations': recommendations,
+        **second['summary'][0]
+    }
+    publish_report(report_key, {
+        name: parts[name] for name in ('strategic_implications', 'strategic_recommendations',
+                                       'executive_summary', 'conclusion')
+    })
+    report = {name: parts[name] for name in final_report_schema["properties"] if name in parts}
+    validate(report, final_report_schema)
+    return report, [candidate for _, candidate in first] + [candidate for _, candidate in second.values()]
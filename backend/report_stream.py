@@ -0,0 +1,222 @@
+"""
+Streaming delivery of structured reports while the model is still writing them.
+
+The report models answer with one JSON object. When a listener is set for the run
+(see report_listener), report nodes stream the model output through PartialJSONParser
+and publish each part of the report as soon as its JSON value is closed: top-level
+fields as a whole (executive_summary first) and the items of top-level arrays one by one
+(each factors_analysis entry). Events look like
+
+    {'report': 'political_report', 'field': 'executive_summary', 'index': None, 'value': "..."}
+    {'report': 'political_report', 'field': 'factors_analysis', 'index': 0, 'value': {...}}
+
+Without a listener the reports are generated with a single blocking call, as before.
+"""
+import json
+import contextvars
+from contextlib import contextmanager
+
+# Listener of the analysis running in the current context (None: no streaming)
+current_report_listener = contextvars.ContextVar("pestel_report_listener", default=None)
+
+_WHITESPACE = " \t\n\r"
+_LITERALS = {"true": True, "false": False, "null": None}
+_NUMBER_CHARS = set("0123456789+-.eE")
+
+
+class PartialJSONParser:
+    """
+    Incremental JSON parser. `feed` takes the next piece of the document and returns the
+    (path, value) of every value closed by it, innermost first, for values at most
+    `max_depth` levels below the root (path is a tuple of keys and array indexes).
+    """
+
+    def __init__(self, max_depth=2):
+        self.max_depth = max_depth
+        self._buffer = ""
+        self._pos = 0
+        self._string_scan = None
+        # Open containers: [container, path, state, pending key]
+        self._stack = []
+        self._done = False
+        self._result = None
+
+    def feed(self, text):
+        self._buffer += text
+        completed = []
+        while self._pos < len(self._buffer):
+            char = self._buffer[self._pos]
+            if char in _WHITESPACE:
+                self._pos += 1
+                continue
+            if self._done:
+                raise ValueError(f"Unexpected data after the JSON document at {self._buffer[self._pos:][:20]!r}")
+            if not self._step(char, completed):
+                break
+        # Drop what has been consumed so the buffer only holds the unfinished token
+        self._buffer = self._buffer[self._pos:]
+        if self._string_scan is not None:
+            self._string_scan -= self._pos
+        self._pos = 0
+        return completed
+
+    def result(self):
+        """The complete document; raises ValueError while it is unfinished"""
+        if not self._done:
+            raise ValueError("Incomplete JSON document")
+        return self._result
+
+    def _state(self):
+        return self._stack[-1][2] if self._stack else "value"
+
+    def _step(self, char, completed):
+        """Consume one token; returns False when the buffer ends inside it"""
+        state = self._state()
+        if state in ("comma_or_end", "key_or_end", "value_or_end"):
+            closing = "}" if isinstance(self._stack[-1][0], dict) else "]"
+            if char == closing:
+                self._pos += 1
+                container, path, _, _ = self._stack.pop()
+                self._close(container, path, completed)
+                return True
+            if state == "comma_or_end":
+                if char != ",":
+                    raise ValueError(f"Expected ',' or '{closing}', got {char!r}")
+                self._pos += 1
+                self._stack[-1][2] = "key" if closing == "}" else "value"
+                return True
+            self._stack[-1][2] = "key" if state == "key_or_end" else "value"
+            return True
+
+        if state == "colon":
+            if char != ":":
+                raise ValueError(f"Expected ':', got {char!r}")
+            self._pos += 1
+            self._stack[-1][2] = "value"
+            return True
+
+        if state == "key":
+            if char != '"':
+                raise ValueError(f"Expected an object key, got {char!r}")
+            key = self._read_string()
+            if key is None:
+                return False
+            self._stack[-1][3] = key
+            self._stack[-1][2] = "colon"
+            return True
+
+        # A value
+        if char in "{[":
+            self._pos += 1
+            container = {} if char == "{" else []
+            self._stack.append([container, self._child_path(), "key_or_end" if char == "{" else "value_or_end", None])
+            return True
+        if char == '"':
+            value = self._read_string()
+            if value is None:
+                return False
+        elif char in _NUMBER_CHARS:
+            end = self._pos
+            while end < len(self._buffer) and self._buffer[end] in _NUMBER_CHARS:
+                end += 1
+            if end == len(self._buffer):
+                # The number may continue in the next piece
+                return False
+            value = json.loads(self._buffer[self._pos:end])
+            self._pos = end
+        else:
+            for literal, literal_value in _LITERALS.items():
+                if self._buffer.startswith(literal, self._pos):
+                    self._pos += len(literal)
+                    value = literal_value
+                    break
+                if literal.startswith(self._buffer[self._pos:]):
+                    return False
+            else:
+                raise ValueError(f"Unexpected character {char!r}")
+        self._close(value, self._child_path(), completed)
+        return True
+
+    def _child_path(self):
+        if not self._stack:
+            return ()
+        container, path, _, key = self._stack[-1]
+        return path + ((key,) if isinstance(container, dict) else (len(container),))
+
+    def _close(self, value, path, completed):
+        """Attach a finished value to its parent and report it"""
+        if len(path) <= self.max_depth:
+            completed.append((path, value))
+        if not self._stack:
+            self._done = True
+            self._result = value
+            return
+        parent = self._stack[-1]
+        if isinstance(parent[0], dict):
+            parent[0][parent[3]] = value
+        else:
+            parent[0].append(value)
+        parent[2] = "comma_or_end"
+
+    def _read_string(self):
+        """Decode the string starting at the current position, or None if it is unterminated"""
+        scan = self._string_scan if self._string_scan is not None else self._pos + 1
+        while True:
+            end = self._buffer.find('"', scan)
+            if end == -1:
+                # Resume after the last complete escape next time
+                self._string_scan = max(len(self._buffer) - 1, self._pos + 1)
+                return None
+            backslashes = 0
+            while self._buffer[end - 1 - backslashes] == "\\":
+                backslashes += 1
+            if backslashes % 2 == 0:
+                break
+            scan = end + 1
+        value = json.loads(self._buffer[self._pos:end + 1])
+        self._pos = end + 1
+        self._string_scan = None
+        return value
+
+
+def report_events(report, path, value):
+    """Listener events for a value closed at `path` in a report document"""
+    if len(path) == 1 and not isinstance(value, list):
+        return [{'report': report, 'field': path[0], 'index': None, 'value': value}]
+    if len(path) == 2 and isinstance(path[1], int):
+        return [{'report': report, 'field': path[0], 'index': path[1], 'value': value}]
+    return []
+
+
+@contextmanager
+def report_listener(listener):
+    """Stream the reports of analyses run in this context to `listener(event)`"""
+    token = current_report_listener.set(listener)
+    try:
+        yield
+    finally:
+        current_report_listener.reset(token)
+
+
+def publish_report(report, document):
+    """Publish every field of an already complete report (e.g. one served from a cache)"""
+    if current_report_listener.get() is None:
+        return
+    for field, value in document.items():
+        if isinstance(value, list):
+            for index, item in enumerate(value):
+                publish_report_events(report, (field, index), item)
+        else:
+            publish_report_events(report, (field,), value)
+
+
+def publish_report_events(report, path, value):
+    """Send the events of a closed value to the current listener; listener errors are logged"""
+    listener = current_report_listener.get()
+    if listener is None:
+        return
+    for event in report_events(report, path, value):
+        try:
+            listener(event)
+        except Exception as e:
+            print(f"Report listener failed on {report}.{event['field']}: {str(e)}")
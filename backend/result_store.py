@@ -0,0 +1,136 @@
+import os
+import zlib
+import uuid
+import sqlite3
+import datetime
+from contextlib import closing
+
+import json_codec
+
+# zstandard is faster and smaller than zlib; fall back to zlib when it is not installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_ZSTD = "zstd"
+CODEC_ZLIB = "zlib"
+
+
+def _compress(data):
+    if zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=6).compress(data)
+    return CODEC_ZLIB, zlib.compress(data, 6)
+
+
+def _decompress(codec, blob):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Stored analysis is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+class ResultStore:
+    """
+    Local store of finished analyses.
+    Each record holds the processed form and the response sent to the client,
+    compressed, with industry/geography/timestamp columns indexed for listing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analyses (
+                    id TEXT PRIMARY KEY,
+                    form_hash TEXT NOT NULL,
+                    industry TEXT,
+                    geography TEXT,
+                    created_at TEXT NOT NULL,
+                    codec TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    payload BLOB NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_analyses_listing ON analyses (industry, geography, created_at)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_form_hash ON analyses (form_hash, created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def save(self, form_hash, processed_form_data, response_data, analysis_id=None, extra=None):
+        """
+        Compress and store an analysis record; returns its id.
+        `extra` holds additional record fields (e.g. the per-dimension web data) kept for re-analysis.
+        """
+        analysis_id = analysis_id or uuid.uuid4().hex
+        record = {
+            'id': analysis_id,
+            'form_hash': form_hash,
+            'form': processed_form_data,
+            'response': response_data,
+            **(extra or {})
+        }
+        raw = json_codec.dumps(record)
+        codec, blob = _compress(raw)
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses "
+                "(id, form_hash, industry, geography, created_at, codec, size_bytes, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    analysis_id,
+                    form_hash,
+                    processed_form_data.get('industry'),
+                    processed_form_data.get('geographical_focus'),
+                    datetime.datetime.now().isoformat(),
+                    codec,
+                    len(raw),
+                    blob
+                )
+            )
+        return analysis_id
+
+    def get(self, analysis_id):
+        """Return the full stored record, or None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT codec, payload FROM analyses WHERE id = ?", (analysis_id,)).fetchone()
+        if row is None:
+            return None
+        return json_codec.loads(_decompress(row['codec'], row['payload']))
+
+    def list(self, industry=None, geography=None, form_hash=None, limit=50, offset=0):
+        """List stored analyses (metadata only), newest first"""
+        clauses, params = [], []
+        if industry:
+            clauses.append("industry = ?")
+            params.append(industry)
+        if geography:
+            clauses.append("geography = ?")
+            params.append(geography)
+        if form_hash:
+            clauses.append("form_hash = ?")
+            params.append(form_hash)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT id, form_hash, industry, geography, created_at, size_bytes FROM analyses {where} "
+                "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def create_result_store():
+    """Build the result store from environment configuration"""
+    db_path = os.environ.get(
+        'PESTEL_RESULT_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.db')
+    )
+    return ResultStore(db_path)
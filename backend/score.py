@@ -1,14 +1,11 @@
 import json
-import os
-from openai import OpenAI
-import time
 from dotenv import load_dotenv
 
+from model_router import SCORE
+
 # Load .env into os.environ
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 # PESTEL factors list
 PESTEL_FACTORS = [
     "political", "economic", "social",
@@ -16,28 +13,14 @@ PESTEL_FACTORS = [
 ]
 
 
-def build_prompt(factor, user_factor_data, report_text):
-    """
-    Builds a detailed and structured PESTEL scoring prompt for similarity and impact using custom logic.
-    """
-
-    # Format sub-factors for readable display
-    subfactor_list = "\n".join(
-        f"- {subfactor}: {'IMPORTANT' if value.lower() == 'true' else 'NOT IMPORTANT'}"
-        for subfactor, value in user_factor_data.items()
-    )
-
-    return f"""
+# Static scoring instructions, identical for every category so that all scoring calls share
+# one prompt prefix the provider can cache; the category's data follows in build_prompt
+SCORING_INSTRUCTIONS = """
 You are an expert in business analysis and PESTEL evaluation.
 
 You will receive:
-1. A user-defined configuration of sub-factors under the **{factor.upper()}** category. Each sub-factor is marked as either IMPORTANT (true) or NOT IMPORTANT (false).
-2. A detailed report for the same **{factor.upper()}** category, generated from real-world, web-sourced content.
-
----
-
-### Sub-Factor Importance:
-{subfactor_list}
+1. A user-defined configuration of sub-factors under one PESTEL category. Each sub-factor is marked as either IMPORTANT (true) or NOT IMPORTANT (false).
+2. A detailed report for the same category, generated from real-world, web-sourced content.
 
 ---
 
@@ -96,14 +79,45 @@ impact_score = round(((raw_impact + 50) / 100) * 100)
 ---
 ### STEP 3: Return Output as JSON
 After scoring, return your result in the following JSON structure:
-{{
-  "similarity_score": {{integer between 0 and 100}},
-  "impact_score": {{integer between 0 and 100}},
-  "justification": "{{2–4 sentence breakdown: raw points summary and rationale}}"
-}}
+{
+  "similarity_score": {integer between 0 and 100},
+  "impact_score": {integer between 0 and 100},
+  "justification": "{2–4 sentence breakdown: raw points summary and rationale}"
+}
 Output ONLY the raw JSON structure. Do not include markdown formatting, bullet points, or any extra text.
+""".strip()
 
-```
+# Structured output of a scoring call
+score_schema = {
+    "title": "FactorScore",
+    "description": "Similarity and impact scores of one PESTEL category with their justification",
+    "type": "object",
+    "properties": {
+        "similarity_score": {"type": "integer", "description": "Similarity score between 0 and 100"},
+        "impact_score": {"type": "integer", "description": "Impact score between 0 and 100"},
+        "justification": {"type": "string", "description": "2-4 sentence breakdown of the raw points and rationale"}
+    },
+    "required": ["similarity_score", "impact_score", "justification"]
+}
+
+
+def build_prompt(factor, user_factor_data, report_text):
+    """
+    Builds the variable part of the scoring prompt for one category: its sub-factor
+    importance, the user's input and the report. Sent after SCORING_INSTRUCTIONS.
+    """
+
+    # Format sub-factors for readable display
+    subfactor_list = "\n".join(
+        f"- {subfactor}: {'IMPORTANT' if value.lower() == 'true' else 'NOT IMPORTANT'}"
+        for subfactor, value in user_factor_data.items()
+    )
+
+    return f"""
+### Category: {factor.upper()}
+
+### Sub-Factor Importance:
+{subfactor_list}
 
 ### User Input for {factor.upper()}:
 {json.dumps(user_factor_data, indent=2)}
@@ -113,13 +127,14 @@ Output ONLY the raw JSON structure. Do not include markdown formatting, bullet p
 """.strip()
 
 
-def calculate_scores_direct(form_data, reports):
+def calculate_scores_direct(form_data, reports, factors=None):
     """
     Calculate similarity and impact scores for PESTEL factors using direct data inputs.
     
     Args:
         form_data (dict): The processed form data containing PESTEL factor preferences
         reports (dict): Dictionary containing individual PESTEL reports
+        factors (list): PESTEL factors to score (defaults to all of them)
     
     Returns:
         dict: Dictionary containing scores for each PESTEL factor
@@ -132,12 +147,17 @@ def calculate_scores_direct(form_data, reports):
             ...
         }
     """
+    # Scoring calls go through the model router (imported here: it pulls in the provider helpers)
+    from tavily_functions import invoke_routed, structured_output, cacheable_prompt
+
     # print(f"[INFO] Starting direct PESTEL scoring calculation...")
     
     # Prepare dictionary for scores
     scores = {}
 
-    for factor in PESTEL_FACTORS:
+    factors = PESTEL_FACTORS if factors is None else factors
+
+    for factor in factors:
         # print(f"[INFO] Processing {factor} factor...")
 
         # Extract user subfactor data
@@ -171,43 +191,29 @@ def calculate_scores_direct(form_data, reports):
         # Build the prompt
         prompt = build_prompt(factor, user_factor_data, report_text)
 
-        # Call OpenAI GPT-4
+        # Call the routed scoring model (metrics and usage are recorded by invoke_routed)
         try:
-            # start_time = time.time()
-            response = client.chat.completions.create(
-                model="o4-mini",
-                messages=[
-                    {"role": "system", "content": "You are an expert in PESTEL analysis and scoring."},
-                    {"role": "user", "content": prompt}
-                ],
-                reasoning_effort="medium",
+            result, candidate = invoke_routed(
+                SCORE, cacheable_prompt(SCORING_INSTRUCTIONS, prompt), f"{factor}_scoring",
+                variant="score", wrap=structured_output(score_schema)
             )
-            # duration = time.time() - start_time
-            # print(f"[INFO] OpenAI API call for {factor} completed in {duration:.2f}s")
         except Exception as e:
-            print(f"[ERROR] OpenAI API call failed for {factor}: {e}")
+            print(f"[ERROR] Scoring call failed for {factor}: {e}")
             continue
 
-        # Parse the assistant response
-        assistant_msg = response.choices[0].message.content.strip()
+        if not isinstance(result, dict):
+            print(f"[ERROR] Unparseable scoring output from {candidate.model} for {factor}: {result}")
+            continue
+        similarity = result.get('similarity_score')
+        impact = result.get('impact_score')
+        justification = result.get('justification')
 
-        try:
-            result = json.loads(assistant_msg)
-            similarity = result.get('similarity_score')
-            impact = result.get('impact_score')
-            justification = result.get('justification')
-            
-            # Validate scores are integers between 0-100
-            if not (isinstance(similarity, int) and 0 <= similarity <= 100):
-                print(f"[WARNING] Invalid similarity score for {factor}: {similarity}")
-                continue
-            if not (isinstance(impact, int) and 0 <= impact <= 100):
-                print(f"[WARNING] Invalid impact score for {factor}: {impact}")
-                continue
-                
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] Failed to parse JSON from GPT-4 for {factor}: {e}")
-            print(f"[DEBUG] Raw response: {assistant_msg}")
+        # Validate scores are integers between 0-100
+        if not (isinstance(similarity, int) and 0 <= similarity <= 100):
+            print(f"[WARNING] Invalid similarity score for {factor}: {similarity}")
+            continue
+        if not (isinstance(impact, int) and 0 <= impact <= 100):
+            print(f"[WARNING] Invalid impact score for {factor}: {impact}")
             continue
 
         # Store scores
@@ -218,5 +224,5 @@ def calculate_scores_direct(form_data, reports):
         }
         print(f"[SUCCESS] Scored {factor}: similarity={similarity}, impact={impact}")
 
-    print(f"[INFO] Scoring completed. Processed {len(scores)} out of {len(PESTEL_FACTORS)} factors.")
+    print(f"[INFO] Scoring completed. Processed {len(scores)} out of {len(factors)} factors.")
     return scores
\ No newline at end of file
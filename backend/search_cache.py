@@ -0,0 +1,127 @@
+"""
+Process-wide cache of web search results, keyed by canonical query.
+
+Query models word the same search many ways ("Electric Vehicles government policies
+Europe", "EU government policy electric vehicles"), within one run and across runs.
+Before a search runs, its query is canonicalized: lowercased, stopwords dropped, words
+stemmed, common abbreviations expanded and the terms sorted. Queries with the same tag
+and the same canonical terms share one search: its cached result, or the search itself
+while it is still running. Queries differing by any term (another country, "import"
+and "export") never share results.
+
+Only the search results (URL, title, score) are cached, not page contents: pages are
+extracted for each run, and their text lives in the run's content store. Results are
+kept for PESTEL_SEARCH_CACHE_TTL seconds (default six hours), at most
+PESTEL_SEARCH_CACHE_SIZE searches; PESTEL_SEARCH_CACHE=0 disables the cache.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from context_selection import tokenize
+from singleflight import SingleFlight
+from metrics import record_cache, search_queries
+
+SEARCH_CACHE_ENABLED = os.environ.get('PESTEL_SEARCH_CACHE', '1') == '1'
+SEARCH_CACHE_TTL = float(os.environ.get('PESTEL_SEARCH_CACHE_TTL', 6 * 3600))
+SEARCH_CACHE_SIZE = int(os.environ.get('PESTEL_SEARCH_CACHE_SIZE', 2000))
+
+# Abbreviations expanded before comparison (after tokenization)
+QUERY_ALIASES = {
+    "eu": "europe",
+    "european": "europe",
+    "ev": "electric vehicle",
+    "evs": "electric vehicle",
+    "us": "united state",
+    "usa": "united state",
+    "uk": "united kingdom",
+    "ai": "artificial intelligence",
+    "esg": "environmental social governance",
+}
+
+
+def canonical_query(text):
+    """Sorted, deduplicated, stemmed terms of a query, abbreviations expanded"""
+    terms = set()
+    for term in tokenize(text):
+        terms.update(QUERY_ALIASES.get(term, term).split())
+    return " ".join(sorted(terms))
+
+
+class SearchCache:
+    """Cached and in-flight searches of this process, by tag and canonical query"""
+
+    def __init__(self, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (tag, canonical query) -> {'created_at', 'results'}, least recently used first
+        self._entries = OrderedDict()
+        self._flight = SingleFlight()
+        self.served = {'cached': 0, 'inflight': 0, 'miss': 0}
+
+    def _cached_results(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry['created_at'] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry['results']
+
+    def search(self, q, fetch):
+        """
+        Search results for a tagged query: cached, shared with a running search of the
+        same canonical query, or fetched with `fetch(q)`. Results are copies.
+        """
+        key = (q['tag'], canonical_query(q['query']))
+        results = self._cached_results(key)
+        if results is not None:
+            served = "cached"
+        else:
+            results, shared = self._flight.do(key, lambda: self._fetch(key, q, fetch))
+            served = "inflight" if shared else "miss"
+
+        with self._lock:
+            self.served[served] += 1
+        search_queries.inc(served=served)
+        record_cache("search", served != "miss")
+        return [dict(result) for result in results]
+
+    def _fetch(self, key, q, fetch):
+        results = fetch(q)
+        with self._lock:
+            self._entries[key] = {'created_at': time.time(), 'results': results}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return results
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self.served.values())
+            return {
+                'entries': len(self._entries),
+                'in_flight': self._flight.in_flight(),
+                'served': dict(self.served),
+                'hit_rate': (lookups - self.served['miss']) / lookups if lookups else 0.0
+            }
+
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """The process's search cache, created on first use; None when caching is disabled"""
+    global _search_cache
+    if not SEARCH_CACHE_ENABLED:
+        return None
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                _search_cache = SearchCache()
+    return _search_cache
@@ -0,0 +1,113 @@
+import time
+import threading
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, INTERACTIVE, BATCH
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.005)
+
+
+def queued(controller):
+    return sum(controller.stats()['queue_depth'].values())
+
+
+def start_waiter(controller, order, name, **kwargs):
+    """Acquire a slot in a thread, recording `name` in `order` once admitted"""
+    def run():
+        controller.acquire(**kwargs)
+        order.append(name)
+
+    before = queued(controller)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    wait_until(lambda: queued(controller) == before + 1)
+    return thread
+
+
+def test_interactive_lane_is_served_before_batch():
+    controller = AdmissionController(max_concurrent=1, max_queued=10, per_user_limit=5)
+    controller.acquire()
+    order = []
+    threads = [
+        start_waiter(controller, order, "batch-1", lane=BATCH),
+        start_waiter(controller, order, "interactive-1", lane=INTERACTIVE),
+        start_waiter(controller, order, "batch-2", lane=BATCH),
+        start_waiter(controller, order, "interactive-2", lane=INTERACTIVE),
+    ]
+    for expected in range(1, len(threads) + 1):
+        controller.release()
+        wait_until(lambda: len(order) == expected)
+    assert order == ["interactive-1", "interactive-2", "batch-1", "batch-2"]
+
+
+def test_full_queue_rejects_with_retry_after():
+    controller = AdmissionController(max_concurrent=1, max_queued=1, max_wait=5.0)
+    controller.acquire()
+    start_waiter(controller, [], "queued")
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire()
+    assert rejected.value.reason == "Analysis queue is full"
+    assert rejected.value.retry_after >= 1
+    assert controller.stats()['rejected'] == 1
+
+
+def test_unbounded_requests_bypass_the_queue_limit():
+    controller = AdmissionController(max_concurrent=1, max_queued=0)
+    controller.acquire()
+    order = []
+    start_waiter(controller, order, "job", lane=BATCH, bounded=False)
+    controller.release()
+    wait_until(lambda: order == ["job"])
+
+
+def test_waiting_times_out():
+    controller = AdmissionController(max_concurrent=1, max_queued=5, max_wait=0.05)
+    controller.acquire()
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire()
+    assert time.monotonic() - started >= 0.05
+    assert rejected.value.reason == "Timed out waiting for an analysis slot"
+    assert queued(controller) == 0
+
+
+def test_per_user_limit_lets_other_users_pass():
+    controller = AdmissionController(max_concurrent=3, max_queued=5, per_user_limit=1)
+    controller.acquire(user="a")
+    order = []
+    start_waiter(controller, order, "a-2", user="a")
+    controller.acquire(user="b")
+    assert controller.stats()['running'] == 2
+    controller.release(user="a")
+    wait_until(lambda: order == ["a-2"])
+
+
+def test_raising_the_limit_admits_waiters_immediately():
+    controller = AdmissionController(max_concurrent=1, max_queued=5)
+    controller.acquire()
+    order = []
+    start_waiter(controller, order, "waiting")
+    controller.configure(max_concurrent=2)
+    wait_until(lambda: order == ["waiting"], timeout=1.0)
+    assert controller.stats()['running'] == 2
+
+
+def test_admit_releases_the_slot_on_errors():
+    controller = AdmissionController(max_concurrent=1)
+    with pytest.raises(RuntimeError):
+        with controller.admit(user="a"):
+            raise RuntimeError("analysis failed")
+    stats = controller.stats()
+    assert stats['running'] == 0
+    assert stats['running_users'] == 0
+
+
+def test_unknown_lane_is_refused():
+    with pytest.raises(ValueError):
+        AdmissionController().acquire(lane="bulk")
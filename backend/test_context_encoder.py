@@ -0,0 +1,73 @@
+from context_encoder import encode_context, encode_form, truncate_tokens, count_tokens, MIN_TRUNCATED_TOKENS
+
+
+def page(url, content, query="EV subsidies Europe", tag="general", title="Title"):
+    return {'query': query, 'tag': tag, 'url': url, 'title': title, 'content': content}
+
+
+def words(count, word="subsidy"):
+    return " ".join(f"{word}{i}" for i in range(count))
+
+
+def test_queries_and_duplicate_pages_appear_once():
+    items = [
+        page("https://a.example", "Summary A"),
+        page("https://a.example", "Summary A", query="EV tax credit", tag="news"),
+        page("https://mirror.example", "Summary A", query="EV tax credit", tag="news"),
+        page("https://b.example", "Summary B"),
+    ]
+    text, stats = encode_context(items, budget=1000)
+    assert text.count("EV subsidies Europe") == 1
+    assert "Q1 [general] EV subsidies Europe" in text
+    assert "Q2 [news] EV tax credit" in text
+    assert "S1 (Q1, Q2) Title | https://a.example\nSummary A" in text
+    assert "S2 (Q1) Title | https://b.example\nSummary B" in text
+    assert "mirror.example" not in text
+    assert stats == {'tokens': count_tokens(text), 'sources': 2, 'truncated': 0, 'dropped': 0, 'duplicates': 2}
+
+
+def test_the_source_over_budget_is_truncated_and_the_rest_dropped():
+    items = [page(f"https://{i}.example", words(400, word=f"page{i}word")) for i in range(4)]
+    text, stats = encode_context(items, budget=1600)
+    assert stats['tokens'] <= 1600
+    assert stats['truncated'] == 1
+    assert stats['sources'] + stats['dropped'] == 4
+    assert stats['dropped'] >= 1
+    assert text.rstrip().endswith("...")
+    # The same input always gives the same prompt
+    assert encode_context(items, budget=1600) == (text, stats)
+
+
+def test_a_short_remainder_is_dropped_instead_of_truncated():
+    first = page("https://1.example", words(100))
+    first_text, first_stats = encode_context([first], budget=10000)
+    budget = first_stats['tokens'] + MIN_TRUNCATED_TOKENS // 2
+    text, stats = encode_context([first, page("https://2.example", words(400))], budget=budget)
+    assert stats == {'tokens': count_tokens(text), 'sources': 1, 'truncated': 0, 'dropped': 1, 'duplicates': 0}
+    assert text == first_text
+
+
+def test_no_items():
+    assert encode_context([]) == ("No web research available.", {
+        'tokens': count_tokens("No web research available."), 'sources': 0, 'truncated': 0, 'dropped': 0, 'duplicates': 0
+    })
+
+
+def test_truncate_tokens_cuts_at_a_word_boundary():
+    text = words(500)
+    cut = truncate_tokens(text, 50)
+    assert cut.endswith(" ...")
+    assert text.startswith(cut[:-len(" ...")] + " ")
+    assert count_tokens(cut[:-len(" ...")]) <= 50
+    assert truncate_tokens("short text", 50) == "short text"
+
+
+def test_encode_form_leaves_out_factors_email_and_empty_values():
+    form = {
+        'email': "someone@example.com",
+        'industry': "Electric Vehicles",
+        'market_analysis': {'key_competitors': ["Tesla", "BYD"], 'analysis_time_frame': ""},
+        'political_factors': {'tax_regulations': "true"},
+        'additional_notes': "notes",
+    }
+    assert encode_form(form) == "industry: Electric Vehicles\nmarket_analysis.key_competitors: Tesla; BYD"
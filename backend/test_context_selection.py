@@ -0,0 +1,87 @@
+from context_selection import select_context, bm25_scores, tokenize, factor_terms, SOURCE_OVERHEAD_TOKENS
+from context_encoder import count_tokens
+
+
+def page(url, content, query="EV policy Europe"):
+    return {'query': query, 'tag': "general", 'url': url, 'title': "", 'content': content}
+
+
+def filler(words):
+    return " ".join(f"filler{i}" for i in range(words))
+
+
+def cost(item):
+    return count_tokens(f"{item['title']} {item['url']}\n{item['content']}") + SOURCE_OVERHEAD_TOKENS
+
+
+def test_tokenize_stems_and_drops_stopwords():
+    assert tokenize("The tax regulations of industries in Europe") == ["tax", "regulation", "industry", "europe"]
+    assert factor_terms("tax_regulations") == ["tax", "regulation"]
+    assert factor_terms("r_and_d_activity") == ["r", "d", "activity", "research", "development", "innovation"]
+
+
+def test_bm25_prefers_the_more_specific_document():
+    documents = [tokenize("tax tax tax policy"), tokenize("policy news"), tokenize("tax " + filler(50))]
+    scores = bm25_scores(documents, [["tax"], ["policy"], ["missing"]])
+    assert scores[0][0] > scores[2][0] > 0
+    assert scores[1][0] == 0
+    assert all(row[2] == 0 for row in scores)
+    assert bm25_scores([], [["tax"]]) == []
+
+
+def test_every_factor_gets_a_page_before_any_gets_a_second():
+    items = [
+        page("https://tax-1.example", "tax tax tax regulation " + filler(40)),
+        page("https://tax-2.example", "tax regulation " + filler(40)),
+        page("https://tax-3.example", "tax " + filler(40)),
+        page("https://trade-1.example", "trade agreement trade " + filler(40)),
+    ]
+    budget = (
+        count_tokens("EV policy Europe") + 4 + SOURCE_OVERHEAD_TOKENS
+        + cost(items[0]) + cost(items[3]) + cost(items[1])
+    )
+    selected, stats = select_context(items, ["tax_regulations", "global_trade_agreements"], budget=budget)
+    # Round one: the best tax page, then the trade page; round two: the next tax page
+    assert [item['url'] for item in selected] == [
+        "https://tax-1.example", "https://trade-1.example", "https://tax-2.example"
+    ]
+    assert stats == {'candidates': 4, 'selected': 3, 'irrelevant': 0, 'uncovered_factors': []}
+
+
+def test_irrelevant_pages_are_left_out_and_uncovered_factors_reported():
+    items = [
+        page("https://tax.example", "tax regulation " + filler(20)),
+        page("https://sport.example", "football results " + filler(20)),
+    ]
+    selected, stats = select_context(items, ["tax_regulations", "political_stability"], budget=10000)
+    assert [item['url'] for item in selected] == ["https://tax.example"]
+    assert stats == {'candidates': 2, 'selected': 1, 'irrelevant': 1, 'uncovered_factors': ["political_stability"]}
+
+
+def test_a_page_packed_for_one_factor_covers_the_others():
+    items = [
+        page("https://both.example", "tax trade " + filler(20)),
+        page("https://tax.example", "tax " + filler(200)),
+    ]
+    budget = count_tokens("EV policy Europe") + 4 + SOURCE_OVERHEAD_TOKENS + cost(items[0])
+    selected, stats = select_context(items, ["tax", "trade"], budget=budget)
+    assert [item['url'] for item in selected] == ["https://both.example"]
+    assert stats['uncovered_factors'] == []
+
+
+def test_items_of_the_same_page_stay_together():
+    items = [
+        page("https://tax.example", "tax " + filler(10), query="EV tax"),
+        page("https://other.example", "weather " + filler(10)),
+        page("https://tax.example", "tax " + filler(10), query="EV tax news"),
+    ]
+    selected, stats = select_context(items, ["tax"], budget=10000)
+    assert [item['query'] for item in selected] == ["EV tax", "EV tax news"]
+    assert stats['candidates'] == 2
+
+
+def test_search_order_is_kept_when_nothing_matches():
+    items = [page("https://a.example", "texte en français"), page("https://b.example", "autre page")]
+    selected, stats = select_context(items, ["tax_regulations"], budget=10000)
+    assert selected == items
+    assert stats['selected'] == 2
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from model_router import (
+    ModelRouter, StubChatModel, StubProviderError, example_from_schema, create_model_router, REPORT, SCORE
+)
+
+FAST = {"provider": "stub", "model": "fast", "max_prompt_tokens": 1000}
+SLOW = {"provider": "stub", "model": "slow", "max_prompt_tokens": 100000}
+
+
+def make_router(**kwargs):
+    return ModelRouter(routes={REPORT: [FAST, SLOW]}, slos={REPORT: 10.0}, **kwargs)
+
+
+def chosen(router, prompt_tokens=100):
+    return router.choose(REPORT, prompt_tokens)[0].model
+
+
+def failing(candidate):
+    raise StubProviderError(f"{candidate.model} down")
+
+
+def test_primary_is_used_until_it_misses_the_slo():
+    router = make_router()
+    assert router.choose(REPORT, 100)[2] == "no recent latency data"
+    router.record(REPORT, router.primary(REPORT), 5.0, 100)
+    assert chosen(router) == "fast"
+
+    router.record(REPORT, router.primary(REPORT), 30.0, 100)
+    # Moving average 5 + 0.3 * (30 - 5) = 12.5s, over the 10s SLO: the slow model has no data yet
+    assert chosen(router) == "slow"
+
+
+def test_fastest_is_used_when_none_meets_the_slo():
+    router = make_router()
+    fast, slow = router.routes[REPORT]
+    router.record(REPORT, fast, 20.0, 100)
+    router.record(REPORT, slow, 40.0, 100)
+    candidate, predicted, reason = router.choose(REPORT, 100)
+    assert candidate is fast and predicted == 20.0
+    assert reason.startswith("fastest")
+
+
+def test_predictions_scale_with_prompt_size():
+    router = make_router()
+    fast, _ = router.routes[REPORT]
+    router.record(REPORT, fast, 6.0, 100)
+    assert router.choose(REPORT, 150)[1] == pytest.approx(9.0)
+    assert chosen(router, 190) == "slow"
+
+
+def test_prompts_over_the_size_limit_skip_the_candidate():
+    router = make_router()
+    assert chosen(router, 5000) == "slow"
+    assert router.choose(REPORT, 500000) is None
+    with pytest.raises(RuntimeError):
+        router.run(REPORT, "political_report", 500000, lambda candidate: candidate.model)
+
+
+def test_failures_fail_over_and_open_the_circuit():
+    router = make_router(failure_threshold=2, cooldown=60.0)
+    calls = []
+
+    def call(candidate):
+        calls.append(candidate.model)
+        if candidate.model == "fast":
+            raise StubProviderError("fast down")
+        return "report"
+
+    assert router.run(REPORT, "political_report", 100, call) == ("report", router.routes[REPORT][1])
+    assert calls == ["fast", "slow"]
+    assert chosen(router) == "fast"
+
+    router.run(REPORT, "political_report", 100, call)
+    stats = router.stats()['routes'][REPORT]
+    assert stats[0]['degraded'] and stats[0]['errors'] == 2
+    assert not stats[1]['degraded']
+    calls.clear()
+    router.run(REPORT, "political_report", 100, call)
+    assert calls == ["slow"]
+
+
+def test_the_last_error_is_raised_when_every_candidate_fails():
+    router = make_router()
+    with pytest.raises(StubProviderError, match="slow down"):
+        router.run(REPORT, "political_report", 100, failing)
+
+
+def test_degraded_candidates_are_probed_and_recover():
+    router = make_router(failure_threshold=1, cooldown=0.05)
+    with pytest.raises(StubProviderError):
+        router.run(REPORT, "political_report", 100, failing)
+    candidate, _, reason = router.choose(REPORT, 100)
+    assert reason == "all candidates degraded, probing"
+
+    time.sleep(0.06)
+    assert router.choose(REPORT, 100)[2] == "no recent latency data"
+    router.run(REPORT, "political_report", 100, lambda candidate: "ok")
+    assert not any(route['degraded'] for route in router.stats()['routes'][REPORT])
+
+
+def test_stale_latency_data_lets_the_primary_be_tried_again():
+    router = make_router(stale_after=0.05)
+    fast, slow = router.routes[REPORT]
+    router.record(REPORT, fast, 30.0, 100)
+    router.record(REPORT, slow, 2.0, 100)
+    assert chosen(router) == "slow"
+    time.sleep(0.06)
+    assert router.choose(REPORT, 100)[:2] == (fast, None)
+
+
+def test_stub_clients_follow_their_schema():
+    router = make_router()
+    schema = {
+        "type": "object",
+        "properties": {
+            "score": {"type": "integer"},
+            "tag": {"type": "string", "enum": ["general", "news"]},
+            "items": {"type": "array", "items": {"type": "boolean"}},
+        }
+    }
+    fast = router.routes[REPORT][0]
+    structured = router.client(fast, "schema", lambda llm: llm.with_structured_output(schema, include_raw=True))
+    assert router.client(fast, "schema") is structured
+    assert isinstance(router.client(fast), StubChatModel)
+
+    response = structured.invoke("prompt")
+    assert response['parsed'] == example_from_schema(schema) == {"score": 0, "tag": "general", "items": [False]}
+    assert response['raw'].usage_metadata['input_tokens'] > 0
+
+
+def test_environment_configuration(monkeypatch):
+    monkeypatch.setenv('PESTEL_MODEL_ROUTES', '{"score": [{"provider": "stub", "model": "stub-score"}]}')
+    monkeypatch.setenv('PESTEL_MODEL_SLOS', '{"score": 5}')
+    router = create_model_router()
+    assert router.primary(SCORE).model == "stub-score"
+    assert router.primary(REPORT).model == "o4-mini"
+    assert router.slos[SCORE] == 5
@@ -0,0 +1,67 @@
+import random
+
+from near_duplicates import page_sketch, sketch_similarity, cluster_pages, with_alternates
+
+rng = random.Random(7)
+VOCABULARY = [f"word{i}" for i in range(5000)]
+
+
+def article(length=400):
+    return [rng.choice(VOCABULARY) for _ in range(length)]
+
+
+def edited(words, fraction):
+    """A copy of `words` with about `fraction` of them replaced"""
+    copy = list(words)
+    for i in rng.sample(range(len(copy)), int(len(copy) * fraction)):
+        copy[i] = rng.choice(VOCABULARY) + "x"
+    return copy
+
+
+def item(url, words, title="Title"):
+    return {'query': "EV news", 'tag': "news", 'url': url, 'title': title, 'content': " ".join(words)}
+
+
+def test_similarity_estimates():
+    words = article()
+    sketch = page_sketch(" ".join(words))
+    assert sketch_similarity(sketch, page_sketch(" ".join(words).upper())) == 1.0
+    assert sketch_similarity(sketch, page_sketch(" ".join(article()))) < 0.05
+    assert sketch_similarity(sketch, page_sketch(" ".join(edited(words, 0.02)))) > 0.7
+    assert sketch_similarity(sketch, page_sketch("")) == 0.0
+
+
+def test_threshold_separates_syndicated_copies_from_rewrites():
+    original = article()
+    pages = [
+        item("https://wire.example", original),
+        item("https://outlet.example", edited(original, 0.02)),
+        item("https://rewrite.example", edited(original, 0.3)),
+        item("https://other.example", article()),
+    ]
+    clusters = cluster_pages(pages, threshold=0.5)
+    assert [[page['url'] for page in cluster] for cluster in clusters] == [
+        ["https://wire.example", "https://outlet.example"], ["https://rewrite.example"], ["https://other.example"]
+    ]
+    # Nothing is similar enough at a threshold of 1.0 apart from identical text
+    assert len(cluster_pages(pages, threshold=1.0)) == 4
+
+
+def test_same_url_joins_its_cluster_regardless_of_content():
+    pages = [item("https://a.example", article()), item("https://a.example", article())]
+    assert len(cluster_pages(pages)) == 1
+
+
+def test_with_alternates_lists_other_urls_once():
+    words = article()
+    cluster = [
+        item("https://wire.example", words),
+        item("https://wire.example", words),
+        item("https://outlet.example", words, title="Outlet"),
+        item("https://outlet.example", words, title="Outlet"),
+    ]
+    representative = with_alternates(cluster)
+    assert representative['url'] == "https://wire.example"
+    assert representative['alternate_urls'] == [{'title': "Outlet", 'url': "https://outlet.example"}]
+    assert 'alternate_urls' not in cluster[0]
+    assert with_alternates(cluster[:2]) is cluster[0]
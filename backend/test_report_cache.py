@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from report_cache import ReportCache, report_cache_key
+
+KEY_INPUTS = {
+    'dimension': "political",
+    'selected_factors': ["tax_regulations", "political_stability"],
+    'industry': "Electric Vehicles",
+    'geography': "Europe",
+    'business_context': "industry: Electric Vehicles\ngeographical_focus: Europe",
+    'notes': "Watch EU subsidy rules",
+    'context': "Queries:\nQ1 [general] EV policy Europe\n\nSources:\nS1 (Q1) Title | https://a.example\nSummary",
+    'model': "o4-mini",
+    'prompt_version': "3",
+}
+
+
+def key(**changes):
+    return report_cache_key(**{**KEY_INPUTS, **changes})
+
+
+def test_key_ignores_factor_order_case_and_surrounding_whitespace():
+    assert key() == key(selected_factors=["political_stability", "tax_regulations"])
+    assert key() == key(industry="  electric vehicles ", geography="EUROPE")
+    assert key() == key(notes="Watch EU subsidy rules\n")
+    assert key(notes=None) == key(notes="")
+
+
+@pytest.mark.parametrize("field, value", [
+    ('dimension', "legal"),
+    ('selected_factors', ["tax_regulations"]),
+    ('industry', "Batteries"),
+    ('geography', "Asia"),
+    ('business_context', "industry: Electric Vehicles\ngeographical_focus: Asia"),
+    ('notes', "Watch US subsidy rules"),
+    ('context', KEY_INPUTS['context'] + " updated"),
+    ('model', "gpt-4.1-mini"),
+    ('prompt_version', "4"),
+])
+def test_any_prompt_input_changes_the_key(field, value):
+    assert key(**{field: value}) != key()
+
+
+def test_reports_round_trip_and_expire(tmp_path):
+    cache = ReportCache(str(tmp_path / "report_cache.db"), ttl=0.1)
+    report = {'executive_summary': "Stable — for now", 'factors_analysis': [{'factor': "tax", 'score': 3}]}
+    assert cache.get(key()) is None
+    cache.put(key(), "political", report)
+    assert cache.get(key()) == report
+    assert cache.get(key(model="gpt-4.1-mini")) is None
+
+    time.sleep(0.15)
+    assert cache.get(key()) is None
+    assert cache.purge_expired() == 1
+    assert cache.purge_expired() == 0
+
+
+def test_entries_are_shared_through_the_database_file(tmp_path):
+    path = str(tmp_path / "report_cache.db")
+    ReportCache(path).put(key(), "political", {'executive_summary': "first"})
+    ReportCache(path).put(key(), "political", {'executive_summary': "second"})
+    assert ReportCache(path).get(key()) == {'executive_summary': "second"}
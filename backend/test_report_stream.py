@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from report_stream import PartialJSONParser, report_events, report_listener, publish_report
+
+DOCUMENT = {
+    "executive_summary": "Quotes \"inside\", a backslash \\ and a tab\t, café and — dashes",
+    "factors_analysis": [
+        {"factor": "Tax \\\"regime\\\"", "score": -12.5e1, "relevant": True},
+        {"factor": "Trade", "score": 7, "relevant": False, "notes": None},
+    ],
+    "sources": ["a\\", "\\\\", ""],
+}
+
+
+def parse_in_chunks(text, size):
+    parser = PartialJSONParser()
+    completed = []
+    for i in range(0, len(text), size):
+        completed.extend(parser.feed(text[i:i + size]))
+    return parser.result(), completed
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_every_split_point_gives_the_same_document(ensure_ascii):
+    text = json.dumps(DOCUMENT, ensure_ascii=ensure_ascii)
+    for split in range(1, len(text)):
+        parser = PartialJSONParser()
+        completed = parser.feed(text[:split]) + parser.feed(text[split:])
+        assert parser.result() == DOCUMENT, f"split at {split}: {text[:split]!r}"
+        assert completed[-1] == ((), DOCUMENT)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_small_chunks_inside_strings_and_escapes(size):
+    text = json.dumps(DOCUMENT)
+    document, _ = parse_in_chunks(text, size)
+    assert document == DOCUMENT
+
+
+def test_values_are_reported_when_closed_innermost_first():
+    text = json.dumps(DOCUMENT)
+    parser = PartialJSONParser()
+    summary_end = text.index('"factors_analysis"')
+    assert parser.feed(text[:summary_end]) == [(("executive_summary",), DOCUMENT["executive_summary"])]
+
+    first_item_end = text.index('{"factor": "Trade"')
+    closed = parser.feed(text[summary_end:first_item_end])
+    assert closed == [(("factors_analysis", 0), DOCUMENT["factors_analysis"][0])]
+
+    closed = parser.feed(text[first_item_end:])
+    paths = [path for path, _ in closed]
+    assert paths == [
+        ("factors_analysis", 1), ("factors_analysis",),
+        ("sources", 0), ("sources", 1), ("sources", 2), ("sources",), ()
+    ]
+
+
+def test_numbers_split_across_chunks_are_not_closed_early():
+    parser = PartialJSONParser()
+    assert parser.feed('{"score": 12') == []
+    assert parser.feed('34, "x": 1}') == [(("score",), 1234), (("x",), 1), ((), {"score": 1234, "x": 1})]
+
+
+def test_values_below_max_depth_are_not_reported():
+    parser = PartialJSONParser(max_depth=1)
+    closed = parser.feed('{"a": [{"b": 1}]}')
+    assert [path for path, _ in closed] == [("a",), ()]
+
+
+def test_incomplete_and_trailing_data():
+    parser = PartialJSONParser()
+    parser.feed('{"a": "unterminated \\"')
+    with pytest.raises(ValueError):
+        parser.result()
+    parser.feed('"}  ')
+    assert parser.result() == {"a": 'unterminated "'}
+    with pytest.raises(ValueError):
+        parser.feed("{}")
+
+
+def test_report_events_for_fields_and_array_items():
+    assert report_events("political_report", ("executive_summary",), "text") == [
+        {'report': "political_report", 'field': "executive_summary", 'index': None, 'value': "text"}
+    ]
+    assert report_events("political_report", ("factors_analysis", 2), {"factor": "Tax"}) == [
+        {'report': "political_report", 'field': "factors_analysis", 'index': 2, 'value': {"factor": "Tax"}}
+    ]
+    # Whole arrays and nested values are published through their items
+    assert report_events("political_report", ("factors_analysis",), []) == []
+    assert report_events("political_report", ("factors_analysis", 0, "factor"), "Tax") == []
+
+
+def test_publish_report_sends_events_to_the_listener():
+    events = []
+    publish_report("legal_report", {"summary": "s", "items": [1, 2]})
+    with report_listener(events.append):
+        publish_report("legal_report", {"summary": "s", "items": [1, 2]})
+    assert [(event['field'], event['index']) for event in events] == [("summary", None), ("items", 0), ("items", 1)]
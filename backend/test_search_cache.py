@@ -0,0 +1,103 @@
+import time
+import threading
+
+import pytest
+
+from search_cache import SearchCache, canonical_query
+
+
+def query(text, tag="general"):
+    return {'query': text, 'tag': tag}
+
+
+class CountingFetch:
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+
+    def __call__(self, q):
+        self.calls.append(q['query'])
+        time.sleep(self.delay)
+        return [{'url': f"https://example.com/{len(self.calls)}", 'title': q['query'], 'score': 0.9}]
+
+
+def test_canonical_query_ignores_wording():
+    assert canonical_query("Electric Vehicles government policies Europe") \
+        == canonical_query("EU government policy on EVs") \
+        == "electric europe government policy vehicle"
+    assert canonical_query("US import tariffs") == canonical_query("tariffs on imports, USA")
+
+
+def test_canonical_query_keeps_every_term():
+    assert canonical_query("EV import tariffs Germany") != canonical_query("EV import tariffs France")
+    assert canonical_query("EV import tariffs") != canonical_query("EV export tariffs")
+    assert canonical_query("EV tariffs") != canonical_query("EV tariffs 2025")
+
+
+def test_equivalent_queries_share_cached_results():
+    cache = SearchCache()
+    fetch = CountingFetch()
+    first = cache.search(query("Electric Vehicles government policies Europe"), fetch)
+    second = cache.search(query("EU government policy on EVs"), fetch)
+    assert fetch.calls == ["Electric Vehicles government policies Europe"]
+    assert second == first
+    # Callers get copies they may modify
+    second[0]['content'] = "page text"
+    assert 'content' not in cache.search(query("EU government policy on EVs"), fetch)[0]
+    assert cache.stats()['served'] == {'cached': 2, 'inflight': 0, 'miss': 1}
+
+
+def test_tags_are_cached_separately():
+    cache = SearchCache()
+    fetch = CountingFetch()
+    cache.search(query("EV policy", tag="general"), fetch)
+    cache.search(query("EV policy", tag="news"), fetch)
+    assert len(fetch.calls) == 2
+
+
+def test_expired_and_evicted_entries_are_fetched_again():
+    fetch = CountingFetch()
+    cache = SearchCache(ttl=0.05)
+    cache.search(query("EV policy"), fetch)
+    time.sleep(0.06)
+    cache.search(query("EV policy"), fetch)
+    assert len(fetch.calls) == 2
+
+    cache = SearchCache(max_entries=2)
+    for text in ["EV policy", "EV tariffs", "EV policy", "EV subsidies", "EV tariffs"]:
+        cache.search(query(text), fetch)
+    # "EV tariffs" was the least recently used entry when "EV subsidies" was added
+    assert fetch.calls[2:] == ["EV policy", "EV tariffs", "EV subsidies", "EV tariffs"]
+    assert cache.stats()['entries'] == 2
+
+
+def test_concurrent_equivalent_searches_run_once():
+    cache = SearchCache()
+    fetch = CountingFetch(delay=0.1)
+    results = []
+    threads = [
+        threading.Thread(target=lambda text=text: results.append(cache.search(query(text), fetch)))
+        for text in ["EV policy Europe", "Europe EV policies", "european EV policy"]
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(fetch.calls) == 1
+    assert len(results) == 3 and all(result == results[0] for result in results)
+    served = cache.stats()['served']
+    assert served['miss'] == 1 and served['inflight'] + served['cached'] == 2
+
+
+def test_failed_searches_are_not_cached():
+    cache = SearchCache()
+
+    def fail(q):
+        raise RuntimeError("Tavily unavailable")
+
+    with pytest.raises(RuntimeError):
+        cache.search(query("EV policy"), fail)
+    fetch = CountingFetch()
+    cache.search(query("EV policy"), fetch)
+    assert fetch.calls == ["EV policy"]
+    assert cache.stats()['in_flight'] == 0
@@ -0,0 +1,81 @@
+import time
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def join_flight(flight, key, fn, followers):
+    """Start a leader running `fn` and `followers` callers joining it; returns their outcomes"""
+    release = threading.Event()
+    outcomes = []
+    outcomes_lock = threading.Lock()
+
+    def leader_fn():
+        release.wait(5)
+        return fn()
+
+    def call(target):
+        try:
+            outcome = ("result", flight.do(key, target))
+        except Exception as e:
+            outcome = ("error", e)
+        with outcomes_lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=call, args=(leader_fn,))]
+    threads[0].start()
+    while flight.in_flight() == 0:
+        time.sleep(0.005)
+    for _ in range(followers):
+        threads.append(threading.Thread(target=call, args=(lambda: pytest.fail("follower ran the function"),)))
+        threads[-1].start()
+    while flight.stats()['coalesced_requests'] < followers:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    outcomes = join_flight(flight, "key", lambda: {"value": 1}, followers=3)
+    results = [value for kind, value in outcomes if kind == "result"]
+    assert len(results) == 4
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert all(result is results[0][0] for result, _ in results)
+    assert flight.stats() == {'executions': 1, 'coalesced_requests': 3, 'in_flight': 0}
+
+
+def test_errors_reach_every_caller_that_joined():
+    flight = SingleFlight()
+    error = RuntimeError("search failed")
+
+    def fail():
+        raise error
+
+    outcomes = join_flight(flight, "key", fail, followers=2)
+    assert outcomes and all(kind == "error" and value is error for kind, value in outcomes)
+    assert len(outcomes) == 3
+    assert flight.in_flight() == 0
+
+
+def test_a_failed_key_runs_again_on_the_next_call():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("first")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: 2) == (2, False)
+    assert flight.stats()['executions'] == 2
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == (1, False)
+    assert flight.do("b", lambda: 2) == (2, False)
+    assert flight.stats()['coalesced_requests'] == 0
@@ -0,0 +1,213 @@
+import math
+import threading
+import contextvars
+
+# USD per million tokens: (prompt, cached prompt, completion). Reasoning tokens are billed as completion.
+MODEL_PRICES = {
+    "o4-mini": (1.10, 0.275, 4.40),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "llama-3.3-70b-versatile": (0.59, 0.59, 0.79),
+}
+
+# USD per Tavily API credit (pay-as-you-go rate)
+TAVILY_CREDIT_PRICE = 0.008
+
+# Tavily credits: a basic search costs 1, an advanced search 2; extraction costs 1 per 5 pages
+SEARCH_CREDITS = {"basic": 1, "advanced": 2}
+EXTRACT_PAGES_PER_CREDIT = 5
+
+# Ledger of the analysis running in the current context (None outside a run)
+current_ledger = contextvars.ContextVar("pestel_usage_ledger", default=None)
+
+
+def _empty_llm_totals():
+    return {
+        'calls': 0,
+        'prompt_tokens': 0,
+        'cached_prompt_tokens': 0,
+        'completion_tokens': 0,
+        'reasoning_tokens': 0,
+        'latency_seconds': 0.0,
+        'estimated_cost_usd': 0.0
+    }
+
+
+def _empty_tavily_totals():
+    return {
+        'search_calls': 0,
+        'extract_calls': 0,
+        'credits': 0,
+        'latency_seconds': 0.0,
+        'estimated_cost_usd': 0.0
+    }
+
+
+def _empty_context_totals():
+    return {
+        'prompts': 0,
+        'original_tokens': 0,
+        'encoded_tokens': 0,
+        'saved_tokens': 0
+    }
+
+
+def _empty_speculation_totals():
+    return {
+        'prefetched_queries': 0,
+        'queries': 0,
+        'hits': 0,
+        'wasted_queries': 0
+    }
+
+
+def llm_cost(model, prompt_tokens, cached_prompt_tokens, completion_tokens):
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    prompt_price, cached_price, completion_price = prices
+    uncached = max(prompt_tokens - cached_prompt_tokens, 0)
+    return (uncached * prompt_price + cached_prompt_tokens * cached_price
+            + completion_tokens * completion_price) / 1_000_000
+
+
+class UsageLedger:
+    """Thread-safe per-analysis accounting of LLM tokens, Tavily credits, latency and cost"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_node = {}
+        self.by_model = {}
+        self.tavily_by_node = {}
+        self.context_by_node = {}
+        self.speculation_by_node = {}
+
+    def record_llm(self, node, model, usage, seconds):
+        usage = usage or {}
+        prompt_tokens = usage.get('input_tokens', 0) or 0
+        completion_tokens = usage.get('output_tokens', 0) or 0
+        reasoning_tokens = (usage.get('output_token_details') or {}).get('reasoning', 0) or 0
+        cached_tokens = (usage.get('input_token_details') or {}).get('cache_read', 0) or 0
+        cost = llm_cost(model, prompt_tokens, cached_tokens, completion_tokens)
+
+        with self._lock:
+            for totals in (
+                self.by_node.setdefault(node, {}).setdefault(model, _empty_llm_totals()),
+                self.by_model.setdefault(model, _empty_llm_totals())
+            ):
+                totals['calls'] += 1
+                totals['prompt_tokens'] += prompt_tokens
+                totals['cached_prompt_tokens'] += cached_tokens
+                totals['completion_tokens'] += completion_tokens
+                totals['reasoning_tokens'] += reasoning_tokens
+                totals['latency_seconds'] += seconds
+                totals['estimated_cost_usd'] += cost
+
+    def record_tavily(self, node, operation, credits, seconds):
+        with self._lock:
+            totals = self.tavily_by_node.setdefault(node, _empty_tavily_totals())
+            totals[f"{operation}_calls"] += 1
+            totals['credits'] += credits
+            totals['latency_seconds'] += seconds
+            totals['estimated_cost_usd'] += credits * TAVILY_CREDIT_PRICE
+
+    def record_context(self, node, original_tokens, encoded_tokens):
+        with self._lock:
+            totals = self.context_by_node.setdefault(node, _empty_context_totals())
+            totals['prompts'] += 1
+            totals['original_tokens'] += original_tokens
+            totals['encoded_tokens'] += encoded_tokens
+            totals['saved_tokens'] += original_tokens - encoded_tokens
+
+    def record_speculation(self, node, prefetched, queries, hits, wasted):
+        with self._lock:
+            totals = self.speculation_by_node.setdefault(node, _empty_speculation_totals())
+            totals['prefetched_queries'] += prefetched
+            totals['queries'] += queries
+            totals['hits'] += hits
+            totals['wasted_queries'] += wasted
+
+    def summary(self):
+        """JSON-ready breakdown by node and model plus run totals"""
+        with self._lock:
+            llm_totals = _empty_llm_totals()
+            for totals in self.by_model.values():
+                for key in llm_totals:
+                    llm_totals[key] += totals[key]
+            tavily_totals = _empty_tavily_totals()
+            for totals in self.tavily_by_node.values():
+                for key in tavily_totals:
+                    tavily_totals[key] += totals[key]
+
+            context_totals = _empty_context_totals()
+            for totals in self.context_by_node.values():
+                for key in context_totals:
+                    context_totals[key] += totals[key]
+
+            return _rounded({
+                'totals': {
+                    'llm': llm_totals,
+                    'tavily': tavily_totals,
+                    'context': context_totals,
+                    'estimated_cost_usd': llm_totals['estimated_cost_usd'] + tavily_totals['estimated_cost_usd']
+                },
+                'by_model': self.by_model,
+                'by_node': self.by_node,
+                'tavily_by_node': self.tavily_by_node,
+                'context_by_node': self.context_by_node,
+                'prompt_cache_hit_rate': {
+                    node: _cache_hit_rate(models.values()) for node, models in self.by_node.items()
+                },
+                'speculation_by_node': {
+                    node: dict(totals, hit_rate=totals['hits'] / totals['queries'] if totals['queries'] else 0.0)
+                    for node, totals in self.speculation_by_node.items()
+                }
+            })
+
+
+def _cache_hit_rate(totals_list):
+    """Share of prompt tokens served from the provider's prompt cache"""
+    prompt = sum(totals['prompt_tokens'] for totals in totals_list)
+    cached = sum(totals['cached_prompt_tokens'] for totals in totals_list)
+    return cached / prompt if prompt else 0.0
+
+
+def _rounded(obj):
+    if isinstance(obj, dict):
+        return {k: _rounded(v) for k, v in obj.items()}
+    if isinstance(obj, float):
+        return round(obj, 6)
+    return obj
+
+
+def record_llm_call(node, model, usage, seconds):
+    """Add an LLM call to the current analysis's ledger, if any"""
+    ledger = current_ledger.get()
+    if ledger is not None:
+        ledger.record_llm(node, model, usage, seconds)
+
+
+def record_tavily_call(node, operation, seconds, search_depth="basic", pages=0):
+    """Add a Tavily call to the current analysis's ledger, if any"""
+    ledger = current_ledger.get()
+    if ledger is None:
+        return
+    if operation == "search":
+        credits = SEARCH_CREDITS.get(search_depth, 1)
+    else:
+        credits = math.ceil(pages / EXTRACT_PAGES_PER_CREDIT)
+    ledger.record_tavily(node, operation, credits, seconds)
+
+
+def record_context_encoding(node, original_tokens, encoded_tokens):
+    """Add the prompt context size of a node, before and after compact encoding, to the current ledger"""
+    ledger = current_ledger.get()
+    if ledger is not None:
+        ledger.record_context(node, original_tokens, encoded_tokens)
+
+
+def record_speculation(node, prefetched, queries, hits, wasted):
+    """Add the outcome of a node's speculative searches to the current ledger"""
+    ledger = current_ledger.get()
+    if ledger is not None:
+        ledger.record_speculation(node, prefetched, queries, hits, wasted)